@@ -0,0 +1,23 @@
+from fastapi import HTTPException, UploadFile, File, Form
+from typing import Optional
+
+from ..services.upload_store import upload_store, UploadEntry
+
+async def get_upload(
+    file: Optional[UploadFile] = File(None),
+    upload_token: Optional[str] = Form(None)
+) -> UploadEntry:
+    """获取上传的Excel文件：优先使用预览返回的上传令牌，否则保存本次上传的文件"""
+    if upload_token:
+        entry = upload_store.get(upload_token)
+        if entry is not None:
+            return entry
+        if file is None:
+            raise HTTPException(status_code=410, detail="上传文件已过期，请重新上传")
+    
+    if file is None:
+        raise HTTPException(status_code=400, detail="请上传Excel文件")
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="只支持Excel文件格式")
+    
+    return await upload_store.save(file)
@@ -1,102 +1,100 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Header
+from sqlalchemy import select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
-import tempfile
+from typing import List, Optional
+import asyncio
 import os
-import pandas as pd
-from datetime import datetime
+import shutil
+import tempfile
+from datetime import datetime, date, time
 
 from ..database import get_db, Exam
-from ..schemas.exam import ExamResponse, FilePreviewResponse, GradeImportRequest, StandardTemplateImportRequest, ExamType, ExamLevel
+from ..database.models import AsyncSessionLocal, ExamType as ModelExamType, ScoreType as ModelScoreType
+from ..schemas.exam import ExamResponse, FilePreviewResponse, GradeImportRequest, StandardTemplateImportRequest, ExamType, ExamLevel, ScoreType, BatchImportRequest, BatchExamEntry
 from ..services.excel_service import ExcelService
-from ..services.grade_service import GradeService
+from ..services.grade_service import GradeService, ReimportTargetNotFound, SCORE_SHEET_DEFAULT_SORT
+from ..services.stats_service import ExamStatsService
+from ..services.comparison_service import ExamComparisonService
+from ..services.ranking_service import RankingService, DEFAULT_TIE_RULE
+from ..services.scaling_service import ScalingService
+from ..services.report_stream import stream_rows_response, EXAM_REPORT_SCHEMA
+from ..services.parse_tasks import parse_standard_template, preview_upload, parse_archive, collect_batch_sources, validate_standard_template
+from ..services.batch_import_service import BatchImportService
+from ..services.process_pool import run_in_process
+from ..services.archive_service import ArchiveService
+from ..services.upload_store import upload_store, UploadEntry
+from .deps import get_upload
 
 router = APIRouter(prefix="/exams", tags=["exams"])
 
 excel_service = ExcelService()
+batch_import_service = BatchImportService()
 
 @router.post("/preview", response_model=FilePreviewResponse)
-async def preview_excel_file(file: UploadFile = File(...)):
-    """预览Excel文件，返回列名和样本数据"""
+async def preview_excel_file(
+    file: UploadFile = File(...),
+    mode: str = Query("sample", description="sample: 只读取表头和前若干行; full: 完整解析并缓存供导入使用"),
+    sample_rows: Optional[int] = Query(None, ge=1, le=10000, description="样本行数")
+):
+    """预览Excel文件，返回列名、样本数据、总行数和上传令牌"""
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="只支持Excel文件格式")
+    if mode not in ("sample", "full"):
+        raise HTTPException(status_code=400, detail="预览方式只能是sample或full")
     
-    # 保存临时文件
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_file_path = tmp_file.name
+    # 按内容哈希缓存上传文件，同一文件同一预览方式只解析一次
+    upload = await upload_store.save(file)
     
     try:
-        preview_data = excel_service.preview_excel(tmp_file_path)
-        
-        # 检测成绩表结构
-        df = pd.read_excel(tmp_file_path)
-        structure = excel_service.detect_grade_structure(df)
+        with upload_store.pinned(upload):
+            if mode == "sample":
+                sample_rows = sample_rows or ExcelService.PREVIEW_SAMPLE_ROWS
+                preview_key = f"sample:{sample_rows}"
+            else:
+                sample_rows = None
+                preview_key = "full"
+            
+            preview = upload.previews.get(preview_key)
+            if preview is None:
+                # 在子进程中解析Excel并检测成绩表结构，完整解析的结果留给导入复用
+                preview, frame_path = await run_in_process(
+                    preview_upload, upload.file_path, upload_store.directory, sample_rows
+                )
+                upload_store.attach(upload, preview_key, preview, frame_path)
         
         return {
-            **preview_data,
-            "structure": structure
+            **preview,
+            "upload_token": upload.token
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
-    finally:
-        os.unlink(tmp_file_path)
 
 @router.post("/import-grades")
 async def import_grade_data(
-    file: UploadFile = File(...),
+    upload: UploadEntry = Depends(get_upload),
     import_data: str = Form(...),
     db: AsyncSession = Depends(get_db)
 ):
-    """导入成绩数据到数据库"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="只支持Excel文件格式")
-    
+    """导入成绩数据到数据库，可以上传文件或使用预览返回的上传令牌"""
     try:
         # 解析导入配置
         import_request = GradeImportRequest.parse_raw(import_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"导入配置解析失败: {str(e)}")
     
-    # 保存临时文件
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_file_path = tmp_file.name
-    
     try:
-        # 备份原始文件
-        backup_path = excel_service.backup_file(tmp_file_path, import_request.exam_name)
-        
-        # 创建考试记录
-        grade_service = GradeService(db)
-        exam = await grade_service.create_exam(
-            import_request.exam_name, 
-            import_request.exam_date,
-            import_request.exam_type,
-            import_request.exam_level,
-            backup_path
-        )
-        
-        # 读取Excel数据
-        df = pd.read_excel(tmp_file_path)
-        
-        # 批量导入数据
-        imported_count = await grade_service.bulk_import_grades(
-            exam.id, df, import_request.column_mappings
-        )
-        
-        return {
-            "message": "成绩导入成功",
-            "exam_id": exam.id,
-            "imported_records": imported_count
-        }
-    
+        result = await GradeService(db).import_mapped_upload(upload, import_request)
+    except ReimportTargetNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
-    finally:
-        os.unlink(tmp_file_path)
+    
+    if result.get("duplicate"):
+        return _duplicate_import_response(result)
+    return {
+        "message": "成绩重新导入成功" if import_request.reimport else "成绩导入成功",
+        **result
+    }
 
 @router.get("/", response_model=List[ExamResponse])
 async def get_exams(db: AsyncSession = Depends(get_db)):
@@ -117,6 +115,143 @@ async def get_exam_report(exam_id: int, db: AsyncSession = Depends(get_db)):
     
     return report
 
+@router.get("/{exam_id}/report/stream")
+async def stream_exam_report(
+    exam_id: int,
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    流式输出考试的全部成绩行，默认为NDJSON（每行一条成绩），
+    Accept为application/vnd.apache.arrow.stream时输出Arrow IPC流
+    """
+    if await db.get(Exam, exam_id) is None:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    async def batches():
+        # 输出期间使用独立的数据库会话，不依赖请求依赖项的生命周期
+        async with AsyncSessionLocal() as stream_db:
+            async for rows in GradeService(stream_db).stream_exam_grade_report(exam_id):
+                yield rows
+    
+    return stream_rows_response(batches(), EXAM_REPORT_SCHEMA, accept)
+
+@router.get("/{exam_id}/score-sheet")
+async def get_exam_score_sheet(
+    exam_id: int,
+    search: Optional[str] = Query(None, description="按姓名或学校模糊搜索"),
+    school: Optional[str] = Query(None),
+    current_class: Optional[str] = Query(None),
+    exam_type: Optional[ExamType] = Query(None, description="学生的考试类型"),
+    sort_by: str = Query(SCORE_SHEET_DEFAULT_SORT, description="name，或“科目.成绩列”，如 总分.rank_province、数学.original_score"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="上一页返回的next_cursor"),
+    db: AsyncSession = Depends(get_db)
+):
+    """考试成绩单：每名学生一行，服务端筛选、排序，按游标分页"""
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    try:
+        return await GradeService(db).get_exam_score_sheet(
+            exam_id, search, school, current_class,
+            ModelExamType(exam_type.value) if exam_type else None,
+            sort_by, order == "desc", limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/{exam_id}/stats")
+async def get_exam_stats(
+    exam_id: int,
+    subject: Optional[str] = Query(None, description="科目名称，不指定时返回全部科目"),
+    score_type: Optional[ScoreType] = Query(None, description="成绩类型，不指定时返回原始成绩和赋分成绩"),
+    scope: str = Query("exam", pattern="^(exam|school|class)$", description="统计范围：整场考试、各学校、各班级"),
+    school: Optional[str] = Query(None, description="只返回某所学校的统计，scope为school或class时有效"),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取考试各科目的预计算统计：人数、平均分、标准差、最值、分位数和分段人数"""
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    stats = await ExamStatsService(db).get_exam_stats(
+        exam_id, subject, ModelScoreType(score_type.value) if score_type else None, scope, school
+    )
+    return {"exam_id": exam_id, "scope": scope, "stats": stats}
+
+@router.post("/{exam_id}/ranks")
+async def recompute_exam_ranks(
+    exam_id: int,
+    tie_rule: str = Query(DEFAULT_TIE_RULE, pattern="^(competition|dense)$",
+                          description="并列规则：competition并列后跳过名次（1,1,3），dense名次连续（1,1,2）"),
+    overwrite: bool = Query(False, description="是否重新计算已有的排名，否则只填补空缺的排名"),
+    db: AsyncSession = Depends(get_db)
+):
+    """按考试中的分数计算各科目的校、市、省排名（原始成绩和赋分成绩），写回成绩表"""
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    try:
+        counts = await RankingService(db).rank_exam(exam_id, tie_rule=tie_rule, overwrite=overwrite)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"排名计算失败: {str(e)}")
+    return {"exam_id": exam_id, "tie_rule": tie_rule, **counts}
+
+@router.post("/{exam_id}/scaled-scores")
+async def recompute_scaled_scores(
+    exam_id: int,
+    overwrite: bool = Query(False, description="是否重新计算已有的赋分成绩，否则只填补空缺的赋分成绩"),
+    db: AsyncSession = Depends(get_db)
+):
+    """按等级赋分规则计算选考科目的赋分成绩和总分的赋分成绩，并更新赋分排名和考试统计"""
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    try:
+        counts = await ScalingService(db).scale_exam(exam_id, overwrite=overwrite)
+        await RankingService(db).rank_exam(exam_id, overwrite=overwrite)
+        await ExamStatsService(db).refresh_exam(exam_id)
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"赋分计算失败: {str(e)}")
+    return {"exam_id": exam_id, **counts}
+
+@router.get("/{exam_id}/distribution")
+async def get_score_distribution(
+    exam_id: int,
+    subject: str = Query("总分", description="科目名称"),
+    score_type: ScoreType = Query(ScoreType.ORIGINAL, description="成绩类型"),
+    bins: Optional[str] = Query(None, description="分段边界，逗号分隔且递增，如0,450,525,600,675,750"),
+    bin_width: Optional[float] = Query(None, gt=0, description="分段宽度，从0等分到满分，指定bins时忽略"),
+    group_by: Optional[str] = Query(None, pattern="^(school|class)$", description="按学校或班级分组，不指定时为整场考试"),
+    school: Optional[str] = Query(None, description="只统计某所学校"),
+    db: AsyncSession = Depends(get_db)
+):
+    """获取考试某科目的成绩分布（各分段人数），默认按满分等分为10段"""
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    try:
+        edges = [float(edge) for edge in bins.split(",")] if bins else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="分段边界必须是逗号分隔的数字")
+    
+    try:
+        return await ExamStatsService(db).get_score_distribution(
+            exam_id, subject, ModelScoreType(score_type.value), edges, bin_width, group_by, school
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"分段参数无效: {str(e)}")
+
 @router.get("/{exam_id}/previous")
 async def get_previous_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
     """获取上一次考试ID用于对比"""
@@ -128,6 +263,120 @@ async def get_previous_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
     
     return {"previous_exam_id": previous_exam_id}
 
+@router.get("/{exam_id}/comparison")
+async def get_exam_comparison(
+    exam_id: int,
+    previous_exam_id: Optional[int] = Query(None, description="对比的考试ID，不指定时为同类型的上一次考试"),
+    subject: Optional[str] = Query(None, description="科目名称，不指定时对比所有科目"),
+    school: Optional[str] = None,
+    current_class: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """与另一场考试对比：每名学生各科的分数和排名变化（本次减上次），以及各班级的平均变化"""
+    if await db.get(Exam, exam_id) is None:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    if previous_exam_id is None:
+        previous_exam_id = await GradeService(db).get_previous_exam_for_comparison(exam_id)
+        if previous_exam_id is None:
+            raise HTTPException(status_code=404, detail="没有可以对比的上一次考试")
+    elif await db.get(Exam, previous_exam_id) is None:
+        raise HTTPException(status_code=404, detail="对比的考试不存在")
+    
+    comparison_service = ExamComparisonService(db)
+    return await comparison_service.compare_exams(
+        exam_id, previous_exam_id, subject_name=subject, school=school, current_class=current_class
+    )
+
+def _duplicate_import_response(result: dict) -> dict:
+    """同一文件重复导入同名考试时的响应"""
+    return {
+        "message": "该文件已导入，未重复导入",
+        **result
+    }
+
+def _get_archive_path(exam: Exam) -> Optional[str]:
+    """考试备份对应的Parquet归档，不存在时返回None"""
+    if not exam.raw_file_path:
+        return None
+    archive_path = ArchiveService.archive_path(exam.raw_file_path)
+    return archive_path if os.path.exists(archive_path) else None
+
+@router.post("/{exam_id}/rebuild")
+async def rebuild_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
+    """从Parquet归档重建考试成绩数据"""
+    exam = await db.get(Exam, exam_id)
+    if not exam:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    archive_path = _get_archive_path(exam)
+    if not archive_path:
+        raise HTTPException(status_code=404, detail="该考试没有可用的归档文件")
+    
+    try:
+        # 在子进程中读取归档并按导入时的方式重新处理
+        metadata, parsed = await run_in_process(parse_archive, archive_path)
+        
+        grade_service = GradeService(db)
+        result = await grade_service.rebuild_exam(exam_id, metadata, parsed)
+        
+        return {
+            "message": "考试数据重建成功",
+            **result
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"重建失败: {str(e)}")
+
+@router.post("/rebuild")
+async def rebuild_exams(
+    start_date: date = Query(..., description="开始日期"),
+    end_date: date = Query(..., description="结束日期（包含）"),
+    db: AsyncSession = Depends(get_db)
+):
+    """从Parquet归档批量重建日期范围内的考试，各考试的归档在进程池中并行解析"""
+    result = await db.execute(
+        select(Exam)
+        .where(and_(
+            Exam.exam_date >= datetime.combine(start_date, time.min),
+            Exam.exam_date <= datetime.combine(end_date, time.max)
+        ))
+        .order_by(Exam.exam_date)
+    )
+    exams = result.scalars().all()
+    
+    archived = []
+    skipped = []
+    for exam in exams:
+        archive_path = _get_archive_path(exam)
+        if archive_path:
+            archived.append((exam.id, archive_path))
+        else:
+            skipped.append(exam.id)
+    
+    # 并行解析归档，再依次写入数据库
+    parse_results = await asyncio.gather(
+        *(run_in_process(parse_archive, archive_path) for _, archive_path in archived),
+        return_exceptions=True
+    )
+    
+    grade_service = GradeService(db)
+    rebuilt = []
+    failed = []
+    for (exam_id, _), parse_result in zip(archived, parse_results):
+        try:
+            if isinstance(parse_result, Exception):
+                raise parse_result
+            rebuilt.append(await grade_service.rebuild_exam(exam_id, *parse_result))
+        except Exception as e:
+            failed.append({"exam_id": exam_id, "error": str(e)})
+    
+    return {
+        "message": f"已重建 {len(rebuilt)} 场考试",
+        "rebuilt": rebuilt,
+        "skipped_exam_ids": skipped,
+        "failed": failed
+    }
+
 @router.delete("/{exam_id}")
 async def delete_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
     """删除考试及其相关数据"""
@@ -144,6 +393,7 @@ async def delete_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
         # 删除相关成绩数据
         from ..database.models import Grade
         await db.execute(delete(Grade).where(Grade.exam_id == exam_id))
+        await ExamStatsService(db).delete_exam_stats(exam_id)
         
         # 删除考试记录
         await db.execute(delete(Exam).where(Exam.id == exam_id))
@@ -156,59 +406,157 @@ async def delete_exam(exam_id: int, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"删除失败: {str(e)}")
 @router.post("/import-standard-template")
 async def import_standard_template(
-    file: UploadFile = File(...),
+    upload: UploadEntry = Depends(get_upload),
     import_data: str = Form(...),
     db: AsyncSession = Depends(get_db)
 ):
-    """标准模板导入成绩数据"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="只支持Excel文件格式")
-    
+    """标准模板导入成绩数据，可以上传文件或使用预览返回的上传令牌"""
     try:
         # 解析导入配置
         import_request = StandardTemplateImportRequest.parse_raw(import_data)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"导入配置解析失败: {str(e)}")
     
-    # 保存临时文件
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_file_path = tmp_file.name
-    
     try:
-        # 备份原始文件
-        backup_path = excel_service.backup_file(tmp_file_path, import_request.exam_name)
-        
-        # 读取Excel数据
-        df = pd.read_excel(tmp_file_path)
-        print(f"Excel columns: {df.columns.tolist()}")  # 调试信息
-        print(f"Excel shape: {df.shape}")  # 调试信息
-        
-        # 使用标准模板导入
-        grade_service = GradeService(db)
-        result = await grade_service.import_standard_template(
-            import_request.exam_name,
-            import_request.exam_date,
-            import_request.exam_type,
-            import_request.exam_level,
-            df,
-            backup_path,
-            import_request.subject_combination
-        )
-        
-        return {
-            "message": "标准模板导入成功",
-            **result
-        }
-    
+        result = await GradeService(db).import_template_upload(upload, import_request)
+    except ReimportTargetNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         import traceback
         print(f"Import error: {str(e)}")  # 调试信息
         print(f"Traceback: {traceback.format_exc()}")  # 调试信息
         raise HTTPException(status_code=500, detail=f"导入失败: {str(e)}")
+    
+    if result.get("duplicate"):
+        return _duplicate_import_response(result)
+    return {
+        "message": "标准模板重新导入成功" if import_request.reimport else "标准模板导入成功",
+        **result
+    }
+
+@router.post("/validate-standard-template")
+async def validate_standard_template_file(
+    upload: UploadEntry = Depends(get_upload),
+    max_errors: int = Query(1000, ge=0, le=100000, description="返回的错误行数上限")
+):
+    """
+    试运行标准模板的校验阶段，不写入数据库：检查成绩是否为数字、是否超出满分，
+    排名是否有效以及学生是否重复，返回逐单元格的错误表
+    """
+    try:
+        with upload_store.pinned(upload):
+            return await run_in_process(
+                validate_standard_template, upload.file_path, upload.frame_path, max_errors
+            )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"校验失败: {str(e)}")
+
+@router.post("/import-batch")
+async def import_batch(
+    file: UploadFile = File(...),
+    import_data: str = Form(...),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    批量导入标准模板：多工作表Excel的每个工作表、或ZIP中的每个Excel文件导入为一场考试
+    各考试在进程池中并行解析，解析完成的考试依次写入数据库，写入与其余考试的解析同时进行
+    """
+    if not file.filename.lower().endswith(('.xlsx', '.xls', '.zip')):
+        raise HTTPException(status_code=400, detail="只支持Excel文件或ZIP压缩包")
+
+    try:
+        batch_request = BatchImportRequest.parse_raw(import_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"导入配置解析失败: {str(e)}")
+
+    work_dir = tempfile.mkdtemp(prefix="grade_batch_")
+    tasks = []
+    try:
+        file_path = await excel_service.save_upload(file, work_dir)
+        try:
+            sources, manifest = await run_in_process(collect_batch_sources, file_path, file.filename, work_dir)
+            entries = batch_request.exams
+            if entries is None and manifest is not None:
+                entries = [BatchExamEntry.parse_obj(entry) for entry in manifest]
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"读取批量导入文件失败: {str(e)}")
+
+        plans, skipped_sources = batch_import_service.plan_exams(sources, entries, batch_request)
+
+        # 同一来源已导入过的同名考试不再重复导入
+        grade_service = GradeService(db)
+        for plan in plans:
+            if plan.error is None:
+                duplicate = await grade_service.find_duplicate_import(plan.batch_source.content_hash, plan.exam_name)
+                if duplicate:
+                    plan.duplicate_exam_id = duplicate.id
+        await db.commit()
+        
+        # 备份每场考试的数据来源，并提交全部解析任务
+        for plan in plans:
+            task = None
+            if plan.error is None and plan.duplicate_exam_id is None:
+                source = plan.batch_source
+                plan.backup_path = excel_service.backup_file(source.file_path, plan.exam_name)
+                task = asyncio.ensure_future(run_in_process(
+                    parse_standard_template, source.file_path, plan.subject_combination,
+                    None, ArchiveService.archive_path(plan.backup_path), source.sheet_name
+                ))
+            tasks.append(task)
+
+        # 按顺序写入已解析的考试，每场考试单独提交，失败不影响其他考试
+        results = []
+        for index, (plan, task) in enumerate(zip(plans, tasks)):
+            summary = plan.summary()
+            if plan.duplicate_exam_id is not None:
+                results.append({**summary, "status": "duplicate", "exam_id": plan.duplicate_exam_id})
+                continue
+            if task is None:
+                results.append({**summary, "status": "failed", "error": plan.error})
+                continue
+
+            tasks[index] = None
+            try:
+                parsed = await task
+                result = await grade_service.import_standard_template(
+                    plan.exam_name,
+                    plan.exam_date,
+                    plan.exam_type or parsed.detected_type,
+                    plan.exam_level,
+                    parsed,
+                    plan.backup_path,
+                    plan.subject_combination,
+                    content_hash=plan.batch_source.content_hash
+                )
+                results.append({
+                    **summary,
+                    "status": "imported",
+                    "exam_id": result["exam_id"],
+                    "exam_type": (plan.exam_type or parsed.detected_type).value,
+                    "detected_type": result["detected_type"],
+                    "imported_students": result["imported_students"],
+                    "imported_grades": result["imported_grades"]
+                })
+            except Exception as e:
+                results.append({**summary, "status": "failed", "error": str(e)})
+
+        imported = sum(1 for result in results if result["status"] == "imported")
+        failed = sum(1 for result in results if result["status"] == "failed")
+        return {
+            "message": f"已导入 {imported} 场考试，失败 {failed} 场",
+            "exams": results,
+            "skipped_sources": skipped_sources
+        }
     finally:
-        os.unlink(tmp_file_path)
+        # 中途取消时，丢弃尚未写入的解析结果
+        for task in tasks:
+            if task is not None:
+                task.add_done_callback(_discard_parsed)
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def _discard_parsed(task: asyncio.Future) -> None:
+    if not task.cancelled() and task.exception() is None:
+        task.result().chunks.discard()
 
 @router.get("/template-example/{exam_type}")
 async def get_template_example(exam_type: ExamType):
@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Header
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
-from ..database import get_db
-from ..services.grade_service import GradeService
-from ..services.student_service import StudentService
-from ..schemas.student import StudentCreate
+from ..database import get_db, Exam, Student
+from ..database.models import AsyncSessionLocal
+from ..services.grade_service import GradeService, STUDENT_HISTORY_QUERY
+from ..services.report_stream import stream_rows_response, STUDENT_HISTORY_SCHEMA
 
 router = APIRouter(prefix="/grades", tags=["grades"])
 
@@ -22,73 +22,54 @@ class ManualGradeImportRequest(BaseModel):
     student: Dict[str, Any]
     grades: List[ManualGradeData]
 
+class ManualStudentGrades(BaseModel):
+    student: Dict[str, Any]
+    grades: List[ManualGradeData]
+
+class BatchManualGradeImportRequest(BaseModel):
+    exam_id: int
+    students: List[ManualStudentGrades]
+
+async def _import_manual_grades(db: AsyncSession, exam_id: int,
+                                entries: List[ManualStudentGrades]) -> Dict[str, Any]:
+    """批量解析学生和科目后写入成绩，已有成绩时更新"""
+    if await db.get(Exam, exam_id) is None:
+        raise HTTPException(status_code=404, detail="考试不存在")
+    
+    try:
+        grade_service = GradeService(db)
+        return await grade_service.import_manual_grades(exam_id, [
+            (entry.student, [grade.dict() for grade in entry.grades]) for entry in entries
+        ])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"成绩录入失败: {str(e)}")
+
 @router.post("/manual-import")
 async def manual_import_grades(
     request: ManualGradeImportRequest,
     db: AsyncSession = Depends(get_db)
 ):
     """手工导入单个学生的成绩"""
-    try:
-        grade_service = GradeService(db)
-        student_service = StudentService(db)
-        
-        # 创建或更新学生信息
-        student_create = StudentCreate(**request.student)
-        student = await student_service.upsert_student_by_class_name(student_create)
-        
-        # 导入成绩
-        imported_count = 0
-        for grade_data in request.grades:
-            # 获取或创建科目
-            subject = await grade_service.get_or_create_subject(grade_data.subject_name)
-            
-            # 检查是否已存在该学生在该考试中的该科目成绩
-            from sqlalchemy import select, and_
-            from ..database.models import Grade
-            
-            existing_grade_result = await db.execute(
-                select(Grade).where(
-                    and_(
-                        Grade.exam_id == request.exam_id,
-                        Grade.student_id == student.id,
-                        Grade.subject_id == subject.id
-                    )
-                )
-            )
-            existing_grade = existing_grade_result.scalar_one_or_none()
-            
-            if existing_grade:
-                # 更新现有成绩
-                existing_grade.original_score = grade_data.original_score
-                existing_grade.scaled_score = grade_data.scaled_score
-                existing_grade.rank_province = grade_data.rank_province
-                existing_grade.scaled_rank_province = grade_data.scaled_rank_province
-            else:
-                # 创建新成绩记录
-                new_grade = Grade(
-                    exam_id=request.exam_id,
-                    student_id=student.id,
-                    subject_id=subject.id,
-                    original_score=grade_data.original_score,
-                    scaled_score=grade_data.scaled_score,
-                    rank_province=grade_data.rank_province,
-                    scaled_rank_province=grade_data.scaled_rank_province
-                )
-                db.add(new_grade)
-            
-            imported_count += 1
-        
-        await db.commit()
-        
-        return {
-            "message": "成绩录入成功",
-            "student_name": student.name,
-            "imported_grades": imported_count
-        }
-        
-    except Exception as e:
-        await db.rollback()
-        raise HTTPException(status_code=500, detail=f"成绩录入失败: {str(e)}")
+    result = await _import_manual_grades(
+        db, request.exam_id, [ManualStudentGrades(student=request.student, grades=request.grades)]
+    )
+    return {
+        "message": "成绩录入成功",
+        "student_name": request.student.get('name'),
+        "imported_grades": result["imported_grades"]
+    }
+
+@router.post("/manual-import-batch")
+async def manual_import_grades_batch(
+    request: BatchManualGradeImportRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """手工批量录入多名学生同一场考试的成绩，一次提交"""
+    result = await _import_manual_grades(db, request.exam_id, request.students)
+    return {
+        "message": "成绩录入成功",
+        **result
+    }
 
 @router.get("/student/{student_id}/history")
 async def get_student_grade_history(
@@ -97,24 +78,8 @@ async def get_student_grade_history(
 ):
     """获取学生成绩历史"""
     try:
-        grade_service = GradeService(db)
-        
         # 通过学生ID获取成绩历史
-        from sqlalchemy import select, text
-        query = text("""
-            SELECT st.name, st.school, st.current_class,
-                   e.exam_name, e.exam_date, s.name as subject_name, 
-                   g.original_score, g.scaled_score, g.rank_school, g.rank_city, g.rank_province,
-                   g.scaled_rank_school, g.scaled_rank_city, g.scaled_rank_province
-            FROM grades g
-            JOIN exams e ON g.exam_id = e.id
-            JOIN subjects s ON g.subject_id = s.id
-            JOIN students st ON g.student_id = st.id
-            WHERE g.student_id = :student_id
-            ORDER BY e.exam_date DESC, s.name
-        """)
-        
-        result = await db.execute(query, {"student_id": student_id})
+        result = await db.execute(STUDENT_HISTORY_QUERY, {"student_id": student_id})
         grades = [dict(row._mapping) for row in result]
         
         if not grades:
@@ -129,4 +94,25 @@ async def get_student_grade_history(
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"获取学生成绩历史失败: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"获取学生成绩历史失败: {str(e)}")
+
+@router.get("/student/{student_id}/history/stream")
+async def stream_student_grade_history(
+    student_id: int,
+    accept: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    流式输出学生的成绩历史，默认为NDJSON（每行一条成绩），
+    Accept为application/vnd.apache.arrow.stream时输出Arrow IPC流
+    """
+    if await db.get(Student, student_id) is None:
+        raise HTTPException(status_code=404, detail="学生不存在")
+    
+    async def batches():
+        # 输出期间使用独立的数据库会话，不依赖请求依赖项的生命周期
+        async with AsyncSessionLocal() as stream_db:
+            async for rows in GradeService(stream_db).stream_student_grade_history(student_id):
+                yield rows
+    
+    return stream_rows_response(batches(), STUDENT_HISTORY_SCHEMA, accept)
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Depends, HTTPException, Form
+from typing import List
+
+from ..database.models import AsyncSessionLocal
+from ..schemas.exam import GradeImportRequest, StandardTemplateImportRequest
+from ..schemas.job import ImportJobResponse
+from ..services.grade_service import GradeService
+from ..services.job_service import import_job_manager, ImportJob
+from ..services.upload_store import upload_store, UploadEntry
+from .deps import get_upload
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+def _submit(kind: str, run, description: str, upload: UploadEntry) -> ImportJob:
+    # 任务执行期间上传缓存不会被淘汰，任务结束后释放
+    upload_store.acquire(upload)
+    try:
+        return import_job_manager.submit(kind, run, description, cleanup=lambda: upload_store.release(upload))
+    except RuntimeError as e:
+        upload_store.release(upload)
+        raise HTTPException(status_code=429, detail=str(e))
+
+@router.post("/import-standard-template", response_model=ImportJobResponse, status_code=202)
+async def submit_standard_template_import(
+    upload: UploadEntry = Depends(get_upload),
+    import_data: str = Form(...)
+):
+    """提交标准模板导入任务，立即返回任务ID，可以上传文件或使用预览返回的上传令牌"""
+    try:
+        import_request = StandardTemplateImportRequest.parse_raw(import_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"导入配置解析失败: {str(e)}")
+    
+    async def run(job: ImportJob):
+        # 任务使用独立的数据库会话，不依赖请求的生命周期
+        async with AsyncSessionLocal() as db:
+            return await GradeService(db).import_template_upload(upload, import_request, progress=job.advance)
+    
+    job = _submit("standard_template", run, import_request.exam_name, upload)
+    return job.to_dict()
+
+@router.post("/import-grades", response_model=ImportJobResponse, status_code=202)
+async def submit_grade_import(
+    upload: UploadEntry = Depends(get_upload),
+    import_data: str = Form(...)
+):
+    """提交按列映射导入成绩的任务，立即返回任务ID，可以上传文件或使用预览返回的上传令牌"""
+    try:
+        import_request = GradeImportRequest.parse_raw(import_data)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"导入配置解析失败: {str(e)}")
+    
+    async def run(job: ImportJob):
+        async with AsyncSessionLocal() as db:
+            return await GradeService(db).import_mapped_upload(upload, import_request, progress=job.advance)
+    
+    job = _submit("grades", run, import_request.exam_name, upload)
+    return job.to_dict()
+
+@router.get("/", response_model=List[ImportJobResponse])
+async def get_jobs():
+    """获取最近的导入任务列表"""
+    return [job.to_dict() for job in import_job_manager.list_jobs()]
+
+@router.get("/{job_id}", response_model=ImportJobResponse)
+async def get_job(job_id: str):
+    """查询导入任务的阶段、已处理行数、处理速度和错误信息"""
+    job = import_job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="导入任务不存在")
+    return job.to_dict()
@@ -1,16 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-import tempfile
 import os
-import pandas as pd
 
 from ..database import get_db
-from ..schemas.student import StudentCreate, StudentResponse, StudentImportRequest, StudentUpdate
+from ..schemas.student import StudentCreate, StudentRosterEntry, StudentResponse, StudentImportRequest, StudentUpdate
 from ..services.student_service import StudentService
+from ..services.excel_service import ExcelService
+from ..services.parse_tasks import read_student_rows
+from ..services.process_pool import run_in_process
 
 router = APIRouter(prefix="/students", tags=["students"])
 
+excel_service = ExcelService()
+
 @router.post("/import", response_model=dict)
 async def import_students(
     file: UploadFile = File(...),
@@ -20,35 +23,24 @@ async def import_students(
     if not file.filename.endswith(('.xlsx', '.xls')):
         raise HTTPException(status_code=400, detail="只支持Excel文件格式")
     
-    # 保存临时文件
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp_file:
-        content = await file.read()
-        tmp_file.write(content)
-        tmp_file_path = tmp_file.name
+    # 分块保存临时文件
+    tmp_file_path = await excel_service.save_upload(file)
     
     try:
-        # 读取Excel文件
-        df = pd.read_excel(tmp_file_path)
+        # 在子进程中读取Excel文件
+        student_rows = await run_in_process(read_student_rows, tmp_file_path)
         
         # 处理学生数据
-        students_data = []
-        for _, row in df.iterrows():
-            if pd.notna(row.get('姓名')) or pd.notna(row.get('name')):
-                student_data = StudentCreate(
-                    name=str(row.get('姓名') or row.get('name')),
-                    school=str(row.get('学校') or row.get('school', '未知学校')),
-                    current_class=str(row.get('班级') or row.get('class', '')) if pd.notna(row.get('班级') or row.get('class')) else None,
-                    grade_level=str(row.get('年级') or row.get('grade', '')) if pd.notna(row.get('年级') or row.get('grade')) else None
-                )
-                students_data.append(student_data)
+        students_data = [StudentRosterEntry(**row) for row in student_rows]
         
-        # 批量导入
+        # 批量导入，一个事务内完成新增和更新
         student_service = StudentService(db)
-        imported_count = await student_service.bulk_import_students(students_data)
+        counts = await student_service.bulk_import_students(students_data)
         
         return {
             "message": "学生信息导入成功",
-            "imported_count": imported_count
+            "imported_count": len(students_data),
+            **counts
         }
     
     except Exception as e:
@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+
+from ..database.models import engine
+
+router = APIRouter(prefix="/system", tags=["system"])
+
+@router.get("/db-pool")
+async def get_db_pool_stats():
+    """内部接口：数据库连接池的当前占用、溢出连接数和获取连接的等待时间"""
+    return engine.pool.stats()
@@ -1,3 +1,4 @@
-from .models import get_db, create_tables, Exam, Student, Subject, Grade
+from .models import get_db, Exam, Student, Subject, Grade
+from .migrations import run_migrations
 
-__all__ = ["get_db", "create_tables", "Exam", "Student", "Subject", "Grade"]
\ No newline at end of file
+__all__ = ["get_db", "run_migrations", "Exam", "Student", "Subject", "Grade"]
@@ -0,0 +1,168 @@
+"""
+数据库结构迁移
+启动时按版本顺序执行尚未应用的迁移，已应用的版本记录在schema_migrations表中
+新增表、列或索引时在MIGRATIONS末尾追加迁移，不修改已经发布的迁移
+"""
+import itertools
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, and_, bindparam, func, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.schema import AddConstraint, CreateIndex
+
+from .models import Base, Exam, ExamSubjectStats, Grade, Student, Subject, SCALABLE_SUBJECTS, engine
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+# 迁移记录表，不属于业务模型
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", migration_metadata,
+    Column("version", Integer, primary_key=True, autoincrement=False),
+    Column("name", String(100), nullable=False),
+    Column("applied_at", DateTime, nullable=False)
+)
+
+# 合并重复成绩时每条语句处理的行数
+MERGE_BATCH_SIZE = 5000
+
+def _initial_schema(connection: Connection) -> None:
+    """创建全部业务表，已有的表保持不变"""
+    Base.metadata.create_all(connection)
+
+def _exam_content_hash(connection: Connection) -> None:
+    """考试表增加导入文件的内容哈希，用于识别重复导入"""
+    exams = Exam.__table__
+    _add_column_if_missing(connection, exams, exams.c.content_hash)
+    _create_index_if_missing(connection, exams, "ix_exams_content_hash")
+
+def _grade_indexes(connection: Connection) -> None:
+    """
+    成绩表按(考试, 学生, 科目)唯一，并增加按学生、按科目查询的索引；学生表增加按学校+姓名查询的索引
+    建立唯一约束前先合并已有的重复成绩
+    """
+    grades = Grade.__table__
+    _merge_duplicate_grades(connection)
+    _create_unique_if_missing(connection, grades, "uq_grades_exam_student_subject")
+    _create_index_if_missing(connection, grades, "ix_grades_student_exam")
+    _create_index_if_missing(connection, grades, "ix_grades_subject_exam")
+    _create_index_if_missing(connection, Student.__table__, "ix_students_school_name_class")
+
+def _exam_subject_stats(connection: Connection) -> None:
+    """增加考试成绩统计表，并为已有考试计算统计"""
+    # 服务模块依赖数据库模型，在迁移执行时再导入
+    from ..services.stats_service import compute_exam_subject_stats, exam_grades_query
+
+    stats_table = ExamSubjectStats.__table__
+    stats_table.create(connection, checkfirst=True)
+    exam_ids = connection.execute(
+        select(Exam.id).where(~select(stats_table.c.id).where(stats_table.c.exam_id == Exam.id).exists())
+    ).scalars().all()
+    for exam_id in exam_ids:
+        stats_rows = compute_exam_subject_stats(exam_id, connection.execute(exam_grades_query(exam_id)).all())
+        if stats_rows:
+            connection.execute(stats_table.insert(), stats_rows)
+
+def _scalable_subjects(connection: Connection) -> None:
+    """已有的选考科目标记为需要赋分，已导入的成绩不变"""
+    subjects = Subject.__table__
+    connection.execute(
+        subjects.update().where(subjects.c.name.in_(SCALABLE_SUBJECTS)).values(is_scalable=True)
+    )
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial_schema", _initial_schema),
+    Migration(2, "exam_content_hash", _exam_content_hash),
+    Migration(3, "grade_indexes", _grade_indexes),
+    Migration(4, "exam_subject_stats", _exam_subject_stats),
+    Migration(5, "scalable_subjects", _scalable_subjects),
+]
+
+async def run_migrations(target_engine: Optional[AsyncEngine] = None,
+                         target_version: Optional[int] = None) -> List[int]:
+    """执行尚未应用的迁移（到target_version为止），返回本次应用的版本号"""
+    async with (target_engine or engine).begin() as conn:
+        return await conn.run_sync(upgrade, target_version)
+
+def upgrade(connection: Connection, target_version: Optional[int] = None) -> List[int]:
+    """在同步连接上执行尚未应用的迁移"""
+    migration_metadata.create_all(connection)
+    applied = set(connection.execute(select(schema_migrations.c.version)).scalars())
+
+    applied_now = []
+    for migration in MIGRATIONS:
+        if migration.version in applied:
+            continue
+        if target_version is not None and migration.version > target_version:
+            break
+        migration.upgrade(connection)
+        connection.execute(schema_migrations.insert().values(
+            version=migration.version, name=migration.name, applied_at=datetime.now()
+        ))
+        applied_now.append(migration.version)
+    return applied_now
+
+def _add_column_if_missing(connection: Connection, table: Table, column: Column) -> None:
+    existing = {c["name"] for c in inspect(connection).get_columns(table.name)}
+    if column.name not in existing:
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+
+def _existing_index_names(connection: Connection, table: Table) -> set:
+    inspector = inspect(connection)
+    names = {index["name"] for index in inspector.get_indexes(table.name)}
+    names.update(constraint["name"] for constraint in inspector.get_unique_constraints(table.name))
+    return names
+
+def _create_index_if_missing(connection: Connection, table: Table, name: str) -> None:
+    """按模型中声明的同名索引建立索引"""
+    if name not in _existing_index_names(connection, table):
+        index = next(index for index in table.indexes if index.name == name)
+        connection.execute(CreateIndex(index))
+
+def _create_unique_if_missing(connection: Connection, table: Table, name: str) -> None:
+    """按模型中声明的同名唯一约束建立约束，SQLite不能给已有表加约束，改用唯一索引"""
+    if name in _existing_index_names(connection, table):
+        return
+    constraint = next(c for c in table.constraints if c.name == name)
+    if connection.dialect.name == "sqlite":
+        columns = ", ".join(column.name for column in constraint.columns)
+        connection.execute(text(f"CREATE UNIQUE INDEX {name} ON {table.name} ({columns})"))
+    else:
+        connection.execute(AddConstraint(constraint))
+
+def _merge_duplicate_grades(connection: Connection) -> None:
+    """同一考试、学生、科目的多行成绩合并为ID最小的一行，各列取第一个非空值，其余行删除"""
+    grades = Grade.__table__
+    key_columns = [grades.c.exam_id, grades.c.student_id, grades.c.subject_id]
+    value_columns = [c for c in grades.columns if c.name != "id" and c not in key_columns]
+
+    duplicated = select(*key_columns).group_by(*key_columns).having(func.count() > 1).subquery()
+    rows = connection.execute(
+        select(grades.c.id, *key_columns, *value_columns)
+        .select_from(grades.join(duplicated, and_(*(c == duplicated.c[c.name] for c in key_columns))))
+        .order_by(*key_columns, grades.c.id)
+    ).all()
+
+    updates = []
+    stale_ids = []
+    for _, group in itertools.groupby(rows, key=lambda row: (row.exam_id, row.student_id, row.subject_id)):
+        first, *duplicates = group
+        values = {column.name: getattr(first, column.name) for column in value_columns}
+        for duplicate in duplicates:
+            for column in value_columns:
+                if values[column.name] is None:
+                    values[column.name] = getattr(duplicate, column.name)
+            stale_ids.append(duplicate.id)
+        updates.append({"grade_id": first.id, **values})
+
+    statement = grades.update().where(grades.c.id == bindparam("grade_id"))
+    for start in range(0, len(updates), MERGE_BATCH_SIZE):
+        connection.execute(statement, updates[start:start + MERGE_BATCH_SIZE])
+    for start in range(0, len(stale_ids), MERGE_BATCH_SIZE):
+        connection.execute(grades.delete().where(grades.c.id.in_(stale_ids[start:start + MERGE_BATCH_SIZE])))
@@ -1,10 +1,12 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
-from sqlalchemy import Column, Integer, String, DateTime, DECIMAL, BigInteger, ForeignKey, Text, Enum, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, DECIMAL, Float, BigInteger, ForeignKey, Text, Enum, Boolean, Index, UniqueConstraint
 from sqlalchemy.sql import func
 import enum
 
+from .pool import engine_options
+
 # 枚举定义
 class ExamType(enum.Enum):
     PHYSICS = "PHYSICS"
@@ -25,7 +27,8 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True)
+# 连接池大小、回收时间和SQL日志等通过环境变量配置，见pool.engine_options
+engine = create_async_engine(DATABASE_URL, **engine_options())
 AsyncSessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
@@ -39,6 +42,7 @@ class Exam(Base):
     exam_type = Column(Enum(ExamType), nullable=False)  # 物理类/历史类
     exam_level = Column(Enum(ExamLevel), nullable=False)  # 校级/市级/省级
     raw_file_path = Column(String(255))
+    content_hash = Column(String(64), index=True)  # 导入文件内容的SHA-256，用于识别重复导入
     import_time = Column(DateTime, default=func.now())
     
     # 关系
@@ -58,11 +62,15 @@ class Student(Base):
     # 关系
     grades = relationship("Grade", back_populates="student")
     
-    # 复合唯一约束：同一学校内班级+姓名唯一
+    # 按学校+姓名查找学生，同名时再按班级区分
     __table_args__ = (
+        Index('ix_students_school_name_class', 'school', 'name', 'current_class'),
         {'mysql_charset': 'utf8mb4'},
     )
 
+# 需要等级赋分的选考科目（四选二）
+SCALABLE_SUBJECTS = ('化学', '生物', '地理', '政治')
+
 class Subject(Base):
     __tablename__ = "subjects"
     
@@ -99,6 +107,14 @@ class Grade(Base):
     student = relationship("Student", back_populates="grades")
     subject = relationship("Subject", back_populates="grades")
     
+    # 同一考试中每名学生每个科目只有一行成绩；唯一约束同时用于按考试查询，
+    # 另两个索引用于按学生查询成绩历史和按科目查询排名
+    __table_args__ = (
+        UniqueConstraint('exam_id', 'student_id', 'subject_id', name='uq_grades_exam_student_subject'),
+        Index('ix_grades_student_exam', 'student_id', 'exam_id'),
+        Index('ix_grades_subject_exam', 'subject_id', 'exam_id'),
+    )
+    
     @property
     def score(self):
         """默认返回原始成绩，如果没有则返回赋分成绩"""
@@ -128,6 +144,38 @@ class Grade(Base):
                 return self.rank_province
         return None
 
+class ExamSubjectStats(Base):
+    """
+    每场考试各科目的成绩统计，导入和修改成绩后重新计算
+    school和current_class为空字符串表示全体：('', '')为整场考试，(学校, '')为一所学校，(学校, 班级)为一个班
+    """
+    __tablename__ = "exam_subject_stats"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    exam_id = Column(Integer, ForeignKey("exams.id"), nullable=False)
+    subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
+    score_type = Column(Enum(ScoreType), nullable=False)  # 原始成绩/赋分成绩
+    school = Column(String(100), nullable=False, default='')
+    current_class = Column(String(50), nullable=False, default='')
+
+    count = Column(Integer, nullable=False)  # 有成绩的人数
+    mean = Column(Float)
+    std = Column(Float)                      # 总体标准差
+    min_score = Column(Float)
+    max_score = Column(Float)
+    p10 = Column(Float)
+    p25 = Column(Float)
+    median = Column(Float)
+    p75 = Column(Float)
+    p90 = Column(Float)
+    histogram = Column(Text)                 # JSON：{"bin_width": 分段宽度, "counts": 各分段人数}
+    updated_at = Column(DateTime, default=func.now())
+
+    __table_args__ = (
+        UniqueConstraint('exam_id', 'subject_id', 'score_type', 'school', 'current_class',
+                         name='uq_exam_subject_stats'),
+    )
+
 class SubjectCombination(Base):
     __tablename__ = "subject_combinations"
     
@@ -146,7 +194,3 @@ async def get_db():
             yield session
         finally:
             await session.close()
-
-async def create_tables():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
\ No newline at end of file
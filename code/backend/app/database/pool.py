@@ -0,0 +1,78 @@
+"""
+数据库连接池配置和统计
+连接池参数从环境变量读取；InstrumentedPool在获取连接时记录等待时间和超时次数，供内部接口查看
+"""
+import os
+import threading
+import time
+from typing import Any, Dict
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+def engine_options() -> Dict[str, Any]:
+    """
+    create_async_engine的参数
+    DB_POOL_SIZE 常驻连接数，DB_MAX_OVERFLOW 高峰时额外允许的连接数，DB_POOL_TIMEOUT 等待空闲连接的秒数，
+    DB_POOL_RECYCLE 连接使用多少秒后重建（应小于MySQL的wait_timeout），DB_POOL_PRE_PING 取出连接前先检测是否可用，
+    DB_ECHO 输出执行的SQL，只用于调试，大批量导入时会严重拖慢速度
+    """
+    return {
+        "echo": _env_flag("DB_ECHO", False),
+        "poolclass": InstrumentedPool,
+        "pool_size": int(os.getenv("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", "30")),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "3600")),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+    }
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """记录连接获取次数、等待时间、超时次数和同时占用连接数的峰值，等待时间包括新建连接和pre-ping检测的时间"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.peak_checked_out = 0
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self.peak_checked_out = max(self.peak_checked_out, self.checkedout())
+        return connection
+
+    def stats(self) -> Dict[str, Any]:
+        """当前连接池状态和自启动以来的累计统计，等待时间单位为毫秒"""
+        with self._stats_lock:
+            return {
+                "pool_size": self.size(),
+                "checked_out": self.checkedout(),
+                "checked_in": self.checkedin(),
+                "peak_checked_out": self.peak_checked_out,
+                "overflow": max(self.overflow(), 0),
+                "max_overflow": self._max_overflow,
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 3),
+            }
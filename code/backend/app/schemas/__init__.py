@@ -1,9 +1,11 @@
-from .student import StudentCreate, StudentResponse, StudentImportRequest
-from .exam import ExamCreate, ExamResponse, FilePreviewResponse, ColumnMapping, GradeImportRequest
+from .student import StudentCreate, StudentRosterEntry, StudentResponse, StudentImportRequest
+from .exam import ExamCreate, ExamResponse, FilePreviewResponse, ColumnMapping, GradeImportRequest, BatchImportRequest
 from .grade import GradeCreate, GradeResponse, StudentGradeHistory, ExamGradeReport, RankTrendPoint
+from .job import ImportJobResponse
 
 __all__ = [
-    "StudentCreate", "StudentResponse", "StudentImportRequest",
-    "ExamCreate", "ExamResponse", "FilePreviewResponse", "ColumnMapping", "GradeImportRequest",
-    "GradeCreate", "GradeResponse", "StudentGradeHistory", "ExamGradeReport", "RankTrendPoint"
+    "StudentCreate", "StudentRosterEntry", "StudentResponse", "StudentImportRequest",
+    "ExamCreate", "ExamResponse", "FilePreviewResponse", "ColumnMapping", "GradeImportRequest", "BatchImportRequest",
+    "GradeCreate", "GradeResponse", "StudentGradeHistory", "ExamGradeReport", "RankTrendPoint",
+    "ImportJobResponse"
 ]
\ No newline at end of file
@@ -33,6 +33,7 @@ class ExamResponse(BaseModel):
     exam_type: ExamType
     exam_level: ExamLevel
     raw_file_path: Optional[str]
+    content_hash: Optional[str] = None
     import_time: datetime
     
     class Config:
@@ -41,6 +42,10 @@ class ExamResponse(BaseModel):
 class FilePreviewResponse(BaseModel):
     columns: List[str]
     sample_data: List[Dict[str, Any]]
+    structure: Optional[Dict[str, Any]] = None
+    total_rows: Optional[int] = None  # 数据总行数，样本预览时为估算值
+    total_rows_exact: bool = True
+    upload_token: Optional[str] = None  # 导入时可代替文件重新上传
 
 class ColumnMapping(BaseModel):
     excel_column: str
@@ -52,10 +57,28 @@ class GradeImportRequest(BaseModel):
     exam_type: ExamType
     exam_level: ExamLevel
     column_mappings: List[ColumnMapping]
+    reimport: bool = False  # 重新导入到名称和日期相同的已有考试，只更新有变化的成绩
 
 class StandardTemplateImportRequest(BaseModel):
     exam_name: str
     exam_date: datetime
     exam_type: ExamType
     exam_level: ExamLevel
-    subject_combination: Optional[str] = None  # 选科组合，如"物化生"、"史化地"等
\ No newline at end of file
+    subject_combination: Optional[str] = None  # 选科组合，如"物化生"、"史化地"等
+    reimport: bool = False  # 重新导入到名称和日期相同的已有考试，只更新有变化的成绩
+
+class BatchExamEntry(BaseModel):
+    """批量导入清单中的一场考试，未指定的字段使用批量导入请求中的默认值"""
+    source: str  # 工作表名，或ZIP中的文件名
+    exam_name: Optional[str] = None  # 默认使用工作表名或文件名
+    exam_date: Optional[datetime] = None  # 默认从名称中识别日期
+    exam_type: Optional[ExamType] = None
+    exam_level: Optional[ExamLevel] = None
+    subject_combination: Optional[str] = None
+
+class BatchImportRequest(BaseModel):
+    exam_type: Optional[ExamType] = None  # 为空时使用模板检测到的类型
+    exam_level: ExamLevel
+    exam_date: Optional[datetime] = None  # 名称中没有日期时使用
+    subject_combination: Optional[str] = None
+    exams: Optional[List[BatchExamEntry]] = None  # 导入清单，为空时使用ZIP中的manifest.json或全部工作表/文件
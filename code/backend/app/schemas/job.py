@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional, List, Dict, Any
+from datetime import datetime
+
+class ImportJobResponse(BaseModel):
+    job_id: str
+    kind: str
+    description: str
+    status: str  # pending / running / succeeded / failed
+    stage: str
+    rows_processed: int
+    grades_written: int
+    throughput: Optional[float] = None  # 行/秒
+    errors: List[str]
+    result: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
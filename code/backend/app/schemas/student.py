@@ -14,6 +14,10 @@ class StudentBase(BaseModel):
 class StudentCreate(StudentBase):
     pass
 
+class StudentRosterEntry(StudentBase):
+    """学生名单中的一名学生，名单没有班级时班级为空，不覆盖已有学生的班级"""
+    current_class: Optional[str] = None
+
 class StudentUpdate(StudentBase):
     name: Optional[str] = None
     school: Optional[str] = None
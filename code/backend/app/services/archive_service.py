@@ -0,0 +1,88 @@
+"""
+考试文件列式归档
+备份Excel的同时写一份Parquet归档，元数据中记录导入方式和列映射，
+重建考试数据时直接读取归档，不再重新解析XLSX
+"""
+import json
+import os
+from typing import Any, Dict, Iterator, List, Optional
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Parquet文件元数据中保存归档信息的键
+ARCHIVE_METADATA_KEY = b"grade_archive"
+
+class ArchiveWriter:
+    """
+    逐块写入Parquet归档
+    所有列按可空字符串存储，与Excel单元格转换成的文本一致，重新处理时结果不变
+    """
+    COMPRESSION = "zstd"
+    
+    def __init__(self, path: str, metadata: Dict[str, Any]):
+        self.path = path
+        self.metadata = metadata
+        self._tmp_path = f"{path}.tmp"
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._columns: List[Any] = []
+        self._schema: Optional[pa.Schema] = None
+    
+    def write(self, chunk: pd.DataFrame) -> None:
+        if self._writer is None:
+            # 以第一个数据块的列为准
+            self._columns = list(chunk.columns)
+            self._schema = pa.schema(
+                [pa.field(str(col), pa.string()) for col in self._columns],
+                metadata={ARCHIVE_METADATA_KEY: json.dumps(self.metadata, ensure_ascii=False)}
+            )
+            self._writer = pq.ParquetWriter(self._tmp_path, self._schema, compression=self.COMPRESSION)
+        
+        arrays = [
+            self._to_string_array(chunk[col]) if col in chunk.columns else pa.nulls(len(chunk), pa.string())
+            for col in self._columns
+        ]
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+    
+    def close(self) -> None:
+        """写完后再改名，避免留下不完整的归档"""
+        if self._writer is not None:
+            self._writer.close()
+            os.replace(self._tmp_path, self.path)
+            self._writer = None
+    
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self._tmp_path):
+            os.unlink(self._tmp_path)
+    
+    def _to_string_array(self, column: pd.Series) -> pa.Array:
+        values = [None if pd.isna(value) else str(value) for value in column.tolist()]
+        return pa.array(values, type=pa.string())
+
+class ArchiveService:
+    """读取考试归档"""
+    
+    @staticmethod
+    def archive_path(backup_path: str) -> str:
+        """归档文件与Excel备份放在一起，文件名相同"""
+        return f"{os.path.splitext(backup_path)[0]}.parquet"
+    
+    def read_metadata(self, path: str) -> Dict[str, Any]:
+        metadata = pq.read_schema(path).metadata or {}
+        if ARCHIVE_METADATA_KEY not in metadata:
+            raise ValueError(f"不是有效的考试归档文件: {path}")
+        return json.loads(metadata[ARCHIVE_METADATA_KEY])
+    
+    def iter_chunks(self, path: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+        """按块读取归档，缺失值统一为None，与流式读取Excel得到的数据块格式一致"""
+        parquet_file = pq.ParquetFile(path)
+        start = 0
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            chunk = batch.to_pandas().astype(object)
+            chunk = chunk.where(chunk.notna(), None)
+            chunk.index = pd.RangeIndex(start, start + len(chunk))
+            start += len(chunk)
+            yield chunk
@@ -0,0 +1,211 @@
+"""
+批量导入服务
+把多工作表的Excel或ZIP压缩包拆分为多场考试：每个工作表或每个Excel文件是一场考试，
+考试名称和日期取自导入清单，没有清单时取自工作表名或文件名
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..schemas.exam import BatchExamEntry, BatchImportRequest, ExamLevel, ExamType
+from .excel_service import ExcelService
+
+# ZIP中的导入清单文件名
+MANIFEST_FILENAME = "manifest.json"
+
+# 名称中的日期：2024-03-15、2024年3月15日、20240315，或只有年月的2024年3月
+DATE_PATTERN = re.compile(r'(\d{4})[-_./年]?(\d{1,2})(?:[-_./月]?(\d{1,2})日?|月)')
+
+class BatchSource:
+    """批量导入中的一个数据来源：工作簿中的一个工作表，或ZIP中的一个Excel文件"""
+
+    def __init__(self, name: str, file_path: str, sheet_name: Optional[str] = None,
+                 content_hash: Optional[str] = None):
+        self.name = name
+        self.file_path = file_path
+        self.sheet_name = sheet_name
+        # 文件内容的SHA-256，工作表为工作簿哈希与工作表名的组合
+        self.content_hash = content_hash
+
+    @property
+    def stem(self) -> str:
+        """不含目录和扩展名的名称，用作默认考试名称"""
+        if self.sheet_name is not None:
+            return self.name
+        return os.path.splitext(os.path.basename(self.name))[0]
+
+class BatchExamPlan:
+    """一场待导入考试的配置，无法导入时记录错误原因"""
+
+    def __init__(self, source: str, exam_name: Optional[str] = None,
+                 exam_date: Optional[datetime] = None,
+                 exam_type: Optional[ExamType] = None,
+                 exam_level: Optional[ExamLevel] = None,
+                 subject_combination: Optional[str] = None,
+                 batch_source: Optional[BatchSource] = None,
+                 error: Optional[str] = None):
+        self.source = source
+        self.exam_name = exam_name
+        self.exam_date = exam_date
+        self.exam_type = exam_type
+        self.exam_level = exam_level
+        self.subject_combination = subject_combination
+        self.batch_source = batch_source
+        self.error = error
+        # 数据来源的备份路径，提交解析时设置
+        self.backup_path: Optional[str] = None
+        # 同一来源已导入过的同名考试
+        self.duplicate_exam_id: Optional[int] = None
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "exam_name": self.exam_name,
+            "exam_date": self.exam_date
+        }
+
+class BatchImportService:
+    """批量导入的来源拆分和考试配置"""
+
+    # ZIP解压后的总大小上限
+    MAX_EXTRACT_BYTES = int(os.getenv("BATCH_IMPORT_MAX_MB", "500")) * 1024 * 1024
+
+    def __init__(self):
+        self.excel_service = ExcelService()
+
+    def collect_sources(self, file_path: str, filename: str,
+                        work_dir: str) -> Tuple[List[BatchSource], Optional[List[Dict[str, Any]]]]:
+        """
+        拆分上传文件，返回(数据来源列表, ZIP中的导入清单)
+        Excel文件的每个工作表是一个来源；ZIP中的每个Excel文件是一个来源，读取其第一个工作表
+        """
+        if filename.lower().endswith('.zip'):
+            return self._collect_zip_sources(file_path, work_dir)
+
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as workbook_file:
+            for block in iter(lambda: workbook_file.read(ExcelService.UPLOAD_READ_SIZE), b''):
+                hasher.update(block)
+        workbook_hash = hasher.hexdigest()
+        
+        sources = [
+            BatchSource(sheet_name, file_path, sheet_name,
+                        hashlib.sha256(f"{workbook_hash}:{sheet_name}".encode()).hexdigest())
+            for sheet_name in self.excel_service.list_sheets(file_path)
+        ]
+        return sources, None
+
+    def _collect_zip_sources(self, file_path: str,
+                             work_dir: str) -> Tuple[List[BatchSource], Optional[List[Dict[str, Any]]]]:
+        """解压ZIP中的Excel文件和清单，成员文件名只用于展示，解压路径由临时文件生成"""
+        try:
+            archive = zipfile.ZipFile(file_path)
+        except zipfile.BadZipFile:
+            raise ValueError("无法读取ZIP压缩包")
+
+        sources = []
+        manifest = None
+        with archive:
+            members = [
+                info for info in archive.infolist()
+                if not info.is_dir()
+                and not info.filename.startswith('__MACOSX/')
+                and not os.path.basename(info.filename).startswith(('.', '~$'))
+            ]
+            if sum(info.file_size for info in members) > self.MAX_EXTRACT_BYTES:
+                raise ValueError("ZIP压缩包解压后过大")
+
+            for info in sorted(members, key=lambda info: info.filename):
+                basename = os.path.basename(info.filename)
+                if basename == MANIFEST_FILENAME:
+                    with archive.open(info) as manifest_file:
+                        try:
+                            manifest = self._parse_manifest(json.load(manifest_file))
+                        except ValueError as e:
+                            raise ValueError(f"导入清单格式错误: {str(e)}")
+                    continue
+
+                suffix = os.path.splitext(basename)[1].lower()
+                if suffix not in ('.xlsx', '.xls'):
+                    continue
+                hasher = hashlib.sha256()
+                with archive.open(info) as member, tempfile.NamedTemporaryFile(
+                        delete=False, suffix=suffix, dir=work_dir) as target:
+                    for block in iter(lambda: member.read(ExcelService.UPLOAD_READ_SIZE), b''):
+                        hasher.update(block)
+                        target.write(block)
+                sources.append(BatchSource(info.filename, target.name, content_hash=hasher.hexdigest()))
+
+        if not sources:
+            raise ValueError("ZIP压缩包中没有Excel文件")
+        return sources, manifest
+
+    def _parse_manifest(self, data: Any) -> List[Dict[str, Any]]:
+        """清单可以是考试列表，也可以是{"exams": [...]}"""
+        if isinstance(data, dict):
+            data = data.get("exams")
+        if not isinstance(data, list):
+            raise ValueError("清单应为考试列表")
+        return data
+
+    def plan_exams(self, sources: List[BatchSource], entries: Optional[List[BatchExamEntry]],
+                   request: BatchImportRequest) -> Tuple[List[BatchExamPlan], List[str]]:
+        """
+        确定每场考试的名称、日期、类型和级别
+        有清单时只导入清单中的来源，返回(考试配置列表, 未导入的来源)
+        """
+        if entries is None:
+            entries = [BatchExamEntry(source=source.name) for source in sources]
+
+        sources_by_name = {}
+        for source in sources:
+            for key in (source.name, os.path.basename(source.name), source.stem):
+                sources_by_name.setdefault(key, source)
+
+        plans = []
+        used_sources = set()
+        used_names = set()
+        for entry in entries:
+            source = sources_by_name.get(entry.source)
+            plan = BatchExamPlan(
+                entry.source,
+                exam_name=entry.exam_name or (source.stem if source else entry.source),
+                exam_type=entry.exam_type or request.exam_type,
+                exam_level=entry.exam_level or request.exam_level,
+                subject_combination=entry.subject_combination or request.subject_combination,
+                batch_source=source
+            )
+            plan.exam_date = entry.exam_date or self.infer_exam_date(plan.exam_name) \
+                or (self.infer_exam_date(source.name) if source else None) or request.exam_date
+            plans.append(plan)
+
+            if source is None:
+                plan.error = "未找到对应的工作表或文件"
+            elif source.name in used_sources:
+                plan.error = "数据来源重复"
+            elif plan.exam_name in used_names:
+                plan.error = "考试名称重复"
+            elif plan.exam_date is None:
+                plan.error = "无法确定考试日期，请在清单中指定或提供默认日期"
+
+            if source is not None:
+                used_sources.add(source.name)
+            used_names.add(plan.exam_name)
+
+        skipped = [source.name for source in sources if source.name not in used_sources]
+        return plans, skipped
+
+    def infer_exam_date(self, name: str) -> Optional[datetime]:
+        """从名称中识别考试日期，只有年月时取当月1日"""
+        for match in DATE_PATTERN.finditer(name):
+            year, month, day = match.groups()
+            try:
+                return datetime(int(year), int(month), int(day or 1))
+            except ValueError:
+                continue
+        return None
@@ -0,0 +1,216 @@
+"""
+列名分类器
+用预编译的正则一次识别表头中的学生信息、科目、成绩类型和排名级别，
+分类结果按表头元组缓存，同一来源的各次考试表头相同，只需分类一次
+"""
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from ..schemas.exam import ExamType
+
+# 科目中文名 -> 英文名
+SUBJECTS = {
+    '语文': 'chinese',
+    '数学': 'math',
+    '英语': 'english',
+    '物理': 'physics',
+    '化学': 'chemistry',
+    '生物': 'biology',
+    '历史': 'history',
+    '地理': 'geography',
+    '政治': 'politics',
+    '总分': 'total_score'
+}
+
+# 表头包含多个科目名时的优先级："总分(物理)"是物理类总分，不是物理成绩
+SUBJECT_PRIORITY = ['总分', '语文', '数学', '英语', '物理', '化学', '生物', '历史', '地理', '政治']
+
+# 科目英文关键词，只用于预览时的映射建议
+SUBJECT_ENGLISH_KEYWORDS = {
+    '语文': 'chinese',
+    '数学': 'math',
+    '英语': 'english',
+    '物理': 'physics',
+    '化学': 'chemistry',
+    '生物': 'biology',
+    '历史': 'history',
+    '地理': 'geography',
+    '政治': 'politics',
+    '总分': 'total'
+}
+
+# 学生信息字段，按顺序优先匹配
+STUDENT_PATTERNS = {
+    'name': r'姓名|学生',
+    'school': r'学校',
+    'current_class': r'班级',
+    'grade_level': r'年级'
+}
+STUDENT_ENGLISH_PATTERNS = {
+    'name': r'姓名|学生|name',
+    'school': r'学校|school',
+    'current_class': r'班级|class',
+    'grade_level': r'年级|grade'
+}
+
+# 排名级别，按顺序优先匹配
+RANK_PATTERNS = {
+    'school': r'校.*排.*名?|学校.*排.*名?',
+    'city': r'市.*排.*名?|地市.*排.*名?',
+    'province': r'省.*排.*名?|全省.*排.*名?'
+}
+
+# pandas为空表头生成的占位列名，如 "Unnamed: 5"
+PLACEHOLDER_PATTERN = r'Unnamed: \d+'
+
+# 无法确定级别的排名列
+RANK_KEYWORDS = r'排名|名次|rank'
+
+# 成绩类型，赋分优先
+SCORE_TYPE_PATTERNS = {
+    'scaled': r'赋分|等级',
+    'original': r'原始'
+}
+
+class ColumnInfo(NamedTuple):
+    """单个表头的分类结果"""
+    student_field: Optional[str] = None   # 学生信息字段
+    subject: Optional[str] = None         # 科目英文名
+    subject_chinese: Optional[str] = None
+    score_type: Optional[str] = None      # scaled / original / None
+    rank_level: Optional[str] = None      # school / city / province
+    is_rank: bool = False                 # 含排名关键词（级别可能未知）
+
+def _compile_lookaheads(patterns: Dict[str, str], flags: int = 0) -> re.Pattern:
+    """
+    把多个模式编译成一个正则：每个模式是一个可选的前瞻命名分组，
+    一次match就能得到所有模式各自是否出现，再按定义顺序取第一个命中的
+    """
+    groups = ''.join(f'(?:(?=.*?(?P<{name}>{pattern})))?' for name, pattern in patterns.items())
+    return re.compile(groups, flags | re.S)
+
+def _first_group(match: Optional[re.Match]) -> Optional[str]:
+    if match is None:
+        return None
+    return next((name for name, value in match.groupdict().items() if value is not None), None)
+
+class ColumnClassifier:
+    """预编译的表头分类器"""
+
+    def __init__(self, subject_keywords: Dict[str, List[str]], student_patterns: Dict[str, str],
+                 flags: int = 0):
+        # 关键词 -> 科目中文名
+        self._subject_by_keyword = {
+            keyword.lower() if flags & re.I else keyword: subject
+            for subject, keywords in subject_keywords.items()
+            for keyword in keywords
+        }
+        self._priority = {subject: i for i, subject in enumerate(SUBJECT_PRIORITY)}
+        self._flags = flags
+
+        keywords = sorted(self._subject_by_keyword, key=len, reverse=True)
+        self._subject_re = re.compile('|'.join(map(re.escape, keywords)), flags)
+        self._student_re = _compile_lookaheads(student_patterns, flags)
+        self._rank_re = _compile_lookaheads(RANK_PATTERNS, flags)
+        self._rank_keyword_re = re.compile(RANK_KEYWORDS, flags | re.I)
+        self._score_type_re = _compile_lookaheads(SCORE_TYPE_PATTERNS, flags)
+        self._placeholder_re = re.compile(PLACEHOLDER_PATTERN)
+
+        self.classify = lru_cache(maxsize=256)(self._classify)
+        self.template_mapping = lru_cache(maxsize=256)(self._template_mapping)
+        self.suggested_mappings = lru_cache(maxsize=256)(self._suggested_mappings)
+
+    def classify_column(self, col) -> Optional[ColumnInfo]:
+        """分类单个表头，非字符串表头和空表头占位列返回None"""
+        if not isinstance(col, str) or self._placeholder_re.fullmatch(col):
+            return None
+
+        subjects = self._subject_re.findall(col)
+        if subjects:
+            if self._flags & re.I:
+                subjects = [keyword.lower() for keyword in subjects]
+            subject_chinese = min((self._subject_by_keyword[keyword] for keyword in subjects),
+                                  key=self._priority.__getitem__)
+            return ColumnInfo(
+                subject=SUBJECTS[subject_chinese],
+                subject_chinese=subject_chinese,
+                score_type=_first_group(self._score_type_re.match(col)),
+                rank_level=_first_group(self._rank_re.match(col)),
+                is_rank=self._rank_keyword_re.search(col) is not None
+            )
+
+        student_field = _first_group(self._student_re.match(col))
+        is_rank = self._rank_keyword_re.search(col) is not None
+        if student_field or is_rank:
+            return ColumnInfo(student_field=student_field, is_rank=is_rank)
+        return None
+
+    def _classify(self, headers: Tuple) -> Tuple[Optional[ColumnInfo], ...]:
+        """分类一组表头，按表头元组缓存"""
+        return tuple(self.classify_column(col) for col in headers)
+
+    def _template_mapping(self, headers: Tuple) -> Tuple[ExamType, Tuple[Tuple[str, str], ...]]:
+        """
+        标准模板的考试类型和列映射，按表头元组缓存
+        科目列映射为 {科目}_original_score / {科目}_scaled_score / {科目}_rank_{级别} / {科目}_scaled_rank_{级别}
+        """
+        infos = self.classify(headers)
+
+        # 检测考试类型
+        has_physics = any(isinstance(col, str) and '物理' in col for col in headers)
+        has_history = any(isinstance(col, str) and '历史' in col for col in headers)
+        if has_history and not has_physics:
+            exam_type = ExamType.HISTORY
+        else:
+            # 默认物理类
+            exam_type = ExamType.PHYSICS
+
+        mapping = []
+        for col, info in zip(headers, infos):
+            if info is None:
+                continue
+            if info.subject:
+                if info.rank_level:
+                    prefix = 'scaled_' if info.score_type == 'scaled' else ''
+                    mapping.append((col, f"{info.subject}_{prefix}rank_{info.rank_level}"))
+                elif not info.is_rank:
+                    mapping.append((col, f"{info.subject}_{info.score_type or 'original'}_score"))
+                # 无法确定级别的排名列不映射，避免被当作成绩导入
+            elif info.student_field:
+                mapping.append((col, info.student_field))
+
+        return exam_type, tuple(mapping)
+
+    def _suggested_mappings(self, headers: Tuple) -> Tuple[Tuple[str, str], ...]:
+        """
+        按列映射导入时的建议映射，按表头元组缓存
+        原始成绩列映射为 {科目中文名}_score，排名列映射为 {科目中文名}_rank_{级别}，赋分列不映射
+        """
+        mapping = []
+        for col, info in zip(headers, self.classify(headers)):
+            if info is None:
+                continue
+            if info.subject:
+                if info.score_type == 'scaled':
+                    continue
+                if info.rank_level:
+                    mapping.append((col, f"{info.subject_chinese}_rank_{info.rank_level}"))
+                elif not info.is_rank:
+                    mapping.append((col, f"{info.subject_chinese}_score"))
+            elif info.student_field:
+                mapping.append((col, info.student_field))
+        return tuple(mapping)
+
+# 标准模板使用的分类器：只识别中文表头
+template_classifier = ColumnClassifier(
+    {subject: [subject] for subject in SUBJECTS},
+    STUDENT_PATTERNS
+)
+
+# 预览建议使用的分类器：同时识别英文关键词，不区分大小写
+suggestion_classifier = ColumnClassifier(
+    {subject: [subject, english] for subject, english in SUBJECT_ENGLISH_KEYWORDS.items()},
+    STUDENT_ENGLISH_PATTERNS,
+    flags=re.I
+)
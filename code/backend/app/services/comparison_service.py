@@ -0,0 +1,109 @@
+"""
+考试对比服务
+按学生和科目关联两场考试的成绩，在SQL中计算分数和各级排名的变化，并按班级汇总平均变化
+变化均为本次减上次：分数变化为正表示提高，排名变化为负表示名次上升
+"""
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import and_, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from ..database.models import Grade, Student, Subject
+
+# 参与对比的成绩和排名列
+COMPARISON_COLUMNS = (
+    'original_score', 'scaled_score',
+    'rank_school', 'rank_city', 'rank_province',
+    'scaled_rank_school', 'scaled_rank_city', 'scaled_rank_province'
+)
+
+class ExamComparisonService:
+    """两场考试的成绩对比，只包含两场考试都有成绩的学生和科目"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    def _joined(self, exam_id: int, previous_exam_id: int, subject_name: Optional[str],
+                school: Optional[str], current_class: Optional[str]):
+        """本次和上次成绩按(学生, 科目)关联，返回各变化列的表达式和在关联结果上构造查询的函数"""
+        current = aliased(Grade, name='current_grade')
+        previous = aliased(Grade, name='previous_grade')
+        changes = {
+            f'{column}_change': (getattr(current, column) - getattr(previous, column)).label(f'{column}_change')
+            for column in COMPARISON_COLUMNS
+        }
+        conditions = [current.exam_id == exam_id]
+        if subject_name:
+            conditions.append(Subject.name == subject_name)
+        if school:
+            conditions.append(Student.school == school)
+        if current_class:
+            conditions.append(Student.current_class == current_class)
+
+        def select_from(*columns):
+            return (
+                select(*columns)
+                .select_from(current)
+                .join(previous, and_(
+                    previous.exam_id == previous_exam_id,
+                    previous.student_id == current.student_id,
+                    previous.subject_id == current.subject_id
+                ))
+                .join(Student, current.student_id == Student.id)
+                .join(Subject, current.subject_id == Subject.id)
+                .where(and_(*conditions))
+            )
+        return changes, select_from
+
+    async def compare_exams(self, exam_id: int, previous_exam_id: int, subject_name: Optional[str] = None,
+                            school: Optional[str] = None, current_class: Optional[str] = None) -> Dict[str, Any]:
+        """
+        返回每名学生各科目的变化，以及每个班级各科目的平均变化
+        学生的变化只包含两次都有值的列
+        """
+        changes, select_from = self._joined(exam_id, previous_exam_id, subject_name, school, current_class)
+
+        result = await self.db.execute(
+            select_from(Student.id, Student.name, Student.school, Student.current_class,
+                        Subject.name.label('subject_name'), *changes.values())
+            .order_by(Student.school, Student.current_class, Student.name, Student.id, Subject.name)
+        )
+        change_names = list(changes)
+        students: Dict[int, Dict[str, Any]] = {}
+        for student_id, name, student_school, student_class, row_subject, *values in result.tuples():
+            student = students.get(student_id)
+            if student is None:
+                student = students[student_id] = {
+                    'student_id': student_id,
+                    'student_name': name,
+                    'school': student_school,
+                    'current_class': student_class,
+                    'subjects': {}
+                }
+            student['subjects'][row_subject] = {
+                change_name: value for change_name, value in zip(change_names, values) if value is not None
+            }
+
+        # 班级汇总：平均值忽略空值，人数为两次都有该科成绩的学生数
+        result = await self.db.execute(
+            select_from(Student.school, Student.current_class, Subject.name.label('subject_name'),
+                        func.count().label('student_count'),
+                        *(func.avg(change).label(f'mean_{name}') for name, change in changes.items()))
+            .group_by(Student.school, Student.current_class, Subject.name)
+            .order_by(Student.school, Student.current_class, Subject.name)
+        )
+        classes: List[Dict[str, Any]] = []
+        for row in result:
+            summary = dict(row._mapping)
+            for name in changes:
+                value = summary[f'mean_{name}']
+                summary[f'mean_{name}'] = round(float(value), 2) if value is not None else None
+            classes.append(summary)
+
+        return {
+            'exam_id': exam_id,
+            'previous_exam_id': previous_exam_id,
+            'students': list(students.values()),
+            'classes': classes
+        }
@@ -1,24 +1,207 @@
 import pandas as pd
 import os
 import shutil
-from typing import List, Dict, Any, Optional
+import tempfile
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Union
 from datetime import datetime
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR, TYPE_NUMERIC
+from .column_classifier import suggestion_classifier
+
+# 与pandas.read_excel默认规则一致，视为空值的单元格文本
+EXCEL_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+])
 
 class ExcelService:
+    # 流式读取时每个数据块的行数
+    CHUNK_ROWS = int(os.getenv("EXCEL_CHUNK_ROWS", "5000"))
+    # 预览时读取的样本行数
+    PREVIEW_SAMPLE_ROWS = int(os.getenv("PREVIEW_SAMPLE_ROWS", "200"))
+    # 上传文件落盘时每次读取的字节数
+    UPLOAD_READ_SIZE = 1024 * 1024
+    
     def __init__(self, backup_dir: str = "./backups"):
         self.backup_dir = backup_dir
         os.makedirs(backup_dir, exist_ok=True)
     
-    def preview_excel(self, file_path: str) -> Dict[str, Any]:
-        """预览Excel文件，返回列名和样本数据"""
+    async def save_upload(self, upload, directory: Optional[str] = None, hasher=None) -> str:
+        """
+        把上传文件分块写入临时文件，不在内存中保留整个文件，返回临时文件路径
+        directory指定临时文件目录，hasher（如hashlib.sha256()）会在写入时同步计算内容哈希
+        """
+        suffix = os.path.splitext(upload.filename or '')[1] or '.xlsx'
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix, dir=directory) as tmp_file:
+            while True:
+                content = await upload.read(self.UPLOAD_READ_SIZE)
+                if not content:
+                    break
+                if hasher is not None:
+                    hasher.update(content)
+                tmp_file.write(content)
+            return tmp_file.name
+    
+    def iter_excel_chunks(self, file_path: str, chunk_size: Optional[int] = None,
+                          sheet_name: Optional[Union[str, int]] = None) -> Iterator[pd.DataFrame]:
+        """
+        流式读取Excel，按固定行数逐块返回DataFrame
+        第一行非空行作为表头，各数据块的索引为数据行在全表中的序号
+        """
+        chunk_size = chunk_size or self.CHUNK_ROWS
+        
+        # openpyxl不支持旧版.xls，整表读取后再分块
+        if file_path.lower().endswith('.xls'):
+            df = pd.read_excel(file_path, sheet_name=sheet_name or 0)
+            for start in range(0, max(len(df), 1), chunk_size):
+                yield df.iloc[start:start + chunk_size]
+            return
+        
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
         try:
-            df = pd.read_excel(file_path)
-            return {
-                "columns": df.columns.tolist(),
-                "sample_data": df.head(5).to_dict('records')
-            }
-        except Exception as e:
-            raise ValueError(f"无法读取Excel文件: {str(e)}")
+            worksheet = self._get_worksheet(workbook, sheet_name)
+            
+            # 表头中的dimension可能不准确，按实际数据读取
+            worksheet.reset_dimensions()
+            
+            columns = None
+            batch = []
+            start = 0
+            for _, values in self._iter_row_values(worksheet):
+                if columns is None:
+                    columns = self._make_header(values)
+                    continue
+                
+                # 数据行比表头宽时，补充未命名列
+                if len(values) > len(columns):
+                    columns = columns + [f"Unnamed: {i}" for i in range(len(columns), len(values))]
+                batch.append(values)
+                if len(batch) >= chunk_size:
+                    yield self._make_chunk(batch, columns, start)
+                    start += len(batch)
+                    batch = []
+            
+            if columns is None:
+                return
+            if batch or start == 0:
+                yield self._make_chunk(batch, columns, start)
+        finally:
+            workbook.close()
+    
+    def read_excel_sample(self, file_path: str, sample_rows: Optional[int] = None,
+                          sheet_name: Optional[Union[str, int]] = None) -> Tuple[pd.DataFrame, Optional[int], bool]:
+        """
+        只读取表头和前sample_rows行数据，读取成本与文件大小无关
+        返回(样本数据, 数据总行数, 总行数是否精确)：读到表尾时为精确值，
+        否则按工作表记录的dimension估算，dimension不可用时为None
+        """
+        sample_rows = sample_rows or self.PREVIEW_SAMPLE_ROWS
+        
+        if file_path.lower().endswith('.xls'):
+            df = pd.read_excel(file_path, sheet_name=sheet_name or 0, nrows=sample_rows + 1)
+            exact = len(df) <= sample_rows
+            return df.head(sample_rows), (len(df) if exact else None), exact
+        
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            worksheet = self._get_worksheet(workbook, sheet_name)
+            
+            # 重置前记录工作表声明的最大行号，用于估算总行数
+            declared_max_row = worksheet.max_row
+            worksheet.reset_dimensions()
+            
+            columns = None
+            header_row = 0
+            batch = []
+            exact = True
+            for row_number, values in self._iter_row_values(worksheet):
+                if columns is None:
+                    columns = self._make_header(values)
+                    header_row = row_number
+                    continue
+                if len(batch) >= sample_rows:
+                    exact = False
+                    break
+                if len(values) > len(columns):
+                    columns = columns + [f"Unnamed: {i}" for i in range(len(columns), len(values))]
+                batch.append(values)
+            
+            if columns is None:
+                return pd.DataFrame(), 0, True
+            
+            sample = self._make_chunk(batch, columns, 0)
+            if exact:
+                return sample, len(batch), True
+            
+            estimated_rows = (declared_max_row or 0) - header_row
+            return sample, (estimated_rows if estimated_rows > len(batch) else None), False
+        finally:
+            workbook.close()
+    
+    def list_sheets(self, file_path: str) -> List[str]:
+        """返回工作簿中各工作表的名称，不读取单元格数据"""
+        if file_path.lower().endswith('.xls'):
+            with pd.ExcelFile(file_path) as excel_file:
+                return list(excel_file.sheet_names)
+
+        workbook = load_workbook(file_path, read_only=True)
+        try:
+            return list(workbook.sheetnames)
+        finally:
+            workbook.close()
+
+    def _get_worksheet(self, workbook, sheet_name: Optional[Union[str, int]]):
+        if sheet_name is None or isinstance(sheet_name, int):
+            return workbook.worksheets[sheet_name or 0]
+        return workbook[sheet_name]
+    
+    def _iter_row_values(self, worksheet) -> Iterator[Tuple[int, List[Any]]]:
+        """逐行返回(行号, 单元格值)，去掉行尾空单元格并跳过空行"""
+        for row_number, row in enumerate(worksheet.iter_rows(), start=1):
+            values = [self._convert_cell(cell) for cell in row]
+            while values and values[-1] is None:
+                values.pop()
+            if values:
+                yield row_number, values
+    
+    def _convert_cell(self, cell) -> Any:
+        """单元格取值规则与pandas.read_excel一致：整数值的浮点数转为int，错误值和空值文本为None"""
+        value = cell.value
+        if value is None or cell.data_type == TYPE_ERROR:
+            return None
+        if cell.data_type == TYPE_NUMERIC and not isinstance(value, bool):
+            int_value = int(value)
+            return int_value if int_value == value else float(value)
+        if isinstance(value, str) and value in EXCEL_NA_VALUES:
+            return None
+        return value
+    
+    def _make_header(self, values: List[Any]) -> List[Any]:
+        """生成表头：空表头命名为'Unnamed: i'，重名列追加'.1'、'.2'后缀"""
+        columns = []
+        seen = {}
+        for i, value in enumerate(values):
+            name = f"Unnamed: {i}" if value is None else value
+            if name in seen:
+                count = seen[name]
+                while f"{name}.{count}" in seen:
+                    count += 1
+                seen[name] = count + 1
+                name = f"{name}.{count}"
+            seen[name] = seen.get(name, 1)
+            columns.append(name)
+        return columns
+    
+    def _make_chunk(self, batch: List[List[Any]], columns: List[Any], start: int) -> pd.DataFrame:
+        """由行数据构造数据块，完整无空值的列推断为数值等具体类型"""
+        width = len(columns)
+        batch = [values + [None] * (width - len(values)) for values in batch]
+        chunk = pd.DataFrame(batch, columns=columns, dtype=object)
+        chunk.index = pd.RangeIndex(start, start + len(batch))
+        complete = chunk.columns[chunk.notna().all().to_numpy()]
+        if len(complete) > 0:
+            chunk[complete] = chunk[complete].infer_objects()
+        return chunk
     
     def backup_file(self, file_path: str, exam_name: str) -> str:
         """备份原始文件"""
@@ -39,27 +222,16 @@ class ExcelService:
         # 排名字段
         rank_fields = []
         
-        # 常见的基本信息字段
-        basic_keywords = ['姓名', '学校', '班级', '年级', 'name', 'school', 'class']
-        # 常见的科目
-        subjects = ['语文', '数学', '英语', '物理', '化学', '生物', '历史', '地理', '政治', '总分']
-        # 排名关键词
-        rank_keywords = ['排名', '名次', 'rank']
-        
-        for col in columns:
-            col_lower = col.lower()
-            
-            # 判断是否为基本信息字段
-            if any(keyword in col for keyword in basic_keywords):
+        for col, info in zip(columns, suggestion_classifier.classify(tuple(columns))):
+            if info is None:
+                # 数值列可能是成绩
+                if self._is_numeric_column(df[col]):
+                    subject_fields.append(col)
+            elif info.student_field:
                 basic_fields.append(col)
-            # 判断是否为排名字段
-            elif any(keyword in col for keyword in rank_keywords):
+            elif info.is_rank or info.rank_level:
                 rank_fields.append(col)
-            # 判断是否为科目成绩字段
-            elif any(subject in col for subject in subjects):
-                subject_fields.append(col)
-            # 数值列可能是成绩
-            elif df[col].dtype in ['int64', 'float64']:
+            elif info.subject:
                 subject_fields.append(col)
         
         return {
@@ -69,45 +241,16 @@ class ExcelService:
             "suggested_mappings": self._suggest_mappings(columns)
         }
     
+    def _is_numeric_column(self, column: pd.Series) -> bool:
+        """
+        非空值全部可以转为数值的列（数字或数字文本，不含布尔值），与pandas.read_excel读出int64/float64的列一致；
+        流式读取时有空单元格的列（如缺考学生的科目列）和数字文本列保留为object类型，不能只看dtype
+        """
+        values = column.dropna()
+        if values.empty or values.map(lambda value: isinstance(value, bool)).any():
+            return False
+        return bool(pd.to_numeric(values, errors='coerce').notna().all())
+    
     def _suggest_mappings(self, columns: List[str]) -> Dict[str, str]:
-        """建议字段映射"""
-        mappings = {}
-        
-        # 映射规则
-        mapping_rules = {
-            'name': ['姓名', 'name', '学生姓名'],
-            'school': ['学校', 'school', '学校名称'],
-            'current_class': ['班级', 'class', '所在班级'],
-            'grade_level': ['年级', 'grade', '年级'],
-        }
-        
-        # 科目映射
-        subject_rules = {
-            '语文': ['语文', 'chinese'],
-            '数学': ['数学', 'math'],
-            '英语': ['英语', 'english'],
-            '物理': ['物理', 'physics'],
-            '化学': ['化学', 'chemistry'],
-            '生物': ['生物', 'biology'],
-            '历史': ['历史', 'history'],
-            '地理': ['地理', 'geography'],
-            '政治': ['政治', 'politics'],
-            '总分': ['总分', 'total']
-        }
-        
-        for col in columns:
-            col_lower = col.lower()
-            
-            # 匹配基本字段
-            for field, keywords in mapping_rules.items():
-                if any(keyword in col_lower for keyword in keywords):
-                    mappings[col] = field
-                    break
-            
-            # 匹配科目字段
-            for subject, keywords in subject_rules.items():
-                if any(keyword in col_lower for keyword in keywords):
-                    mappings[col] = f"{subject}_score"
-                    break
-        
-        return mappings
\ No newline at end of file
+        """建议字段映射，结果按表头缓存"""
+        return dict(suggestion_classifier.suggested_mappings(tuple(columns)))
\ No newline at end of file
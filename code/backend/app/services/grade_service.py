@@ -1,128 +1,578 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Union, Callable, Tuple, AsyncIterator, Set
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, text
+from sqlalchemy import select, insert, update, delete, and_, or_, case, text, tuple_, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import selectinload, joinedload
+from sqlalchemy.types import DateTime, Float
+import numpy as np
 import pandas as pd
+import base64
+import json
+import os
 from datetime import datetime
+from decimal import Decimal
 
-from ..database.models import Exam, Student, Subject, Grade, ExamType, ExamLevel, ScoreType
+from ..database.models import Exam, Student, Subject, Grade, ExamSubjectStats, ExamType, ExamLevel, ScoreType
 from ..schemas.exam import GradeImportRequest, ColumnMapping, StandardTemplateImportRequest
 from ..schemas.grade import StudentGradeHistory, ExamGradeReport
+from ..schemas.student import StudentCreate
 from .student_service import StudentService
+from .stats_service import ExamStatsService
+from .ranking_service import RankingService, SuppliedKey, ALL_RANK_COLUMNS, supplied_keys
+from .scaling_service import ScalingService, TOTAL_SUBJECT
 from .template_service import TemplateService
+from .subject_registry import subject_registry
+from .excel_service import ExcelService
+from .archive_service import ArchiveService
+from .parse_tasks import ParsedTemplate, build_parsed_template, parse_standard_template, spill_excel_chunks
+from .process_pool import SpilledFrames, run_in_process
+from .upload_store import upload_store, UploadEntry
+
+# 导入进度回调：progress(stage, rows=新增处理行数, grades=新增写入成绩数)
+ProgressCallback = Callable[..., None]
+
+# 成绩表可写入的列
+GRADE_COLUMNS = (
+    'exam_id', 'student_id', 'subject_id',
+    'original_score', 'rank_school', 'rank_city', 'rank_province',
+    'scaled_score', 'scaled_rank_school', 'scaled_rank_city', 'scaled_rank_province'
+)
+
+# 按列映射导入时的学生信息字段和随各科成绩导入的排名字段
+MAPPED_STUDENT_FIELDS = ('name', 'school', 'current_class', 'grade_level')
+MAPPED_RANK_FIELDS = ('rank_school', 'rank_city', 'rank_province')
+
+# 成绩和排名列，重新导入时按这些列比较是否变化
+GRADE_VALUE_COLUMNS = GRADE_COLUMNS[3:]
+SCORE_COLUMNS = ('original_score', 'scaled_score')
+
+# 成绩的唯一键，同一考试中每名学生每个科目一行
+GRADE_KEY_COLUMNS = GRADE_COLUMNS[:3]
+
+# 各数据库方言的成绩写入语句，见GradeService._grade_insert_statement
+_GRADE_INSERT_STATEMENTS: Dict[str, Any] = {}
+
+# 手工录入的成绩列，已有成绩时覆盖这些列
+MANUAL_GRADE_COLUMNS = ('original_score', 'scaled_score', 'rank_province', 'scaled_rank_province')
+
+# 考试成绩报告，包含学生的考试类型和选科组合
+EXAM_REPORT_QUERY = text("""
+    SELECT st.name as student_name, st.school, st.current_class,
+           st.exam_type, st.subject_combination,
+           sub.name as subject_name, 
+           g.original_score, g.scaled_score,
+           g.rank_school, g.rank_city, g.rank_province,
+           g.scaled_rank_school, g.scaled_rank_city, g.scaled_rank_province
+    FROM grades g
+    JOIN students st ON g.student_id = st.id
+    JOIN subjects sub ON g.subject_id = sub.id
+    WHERE g.exam_id = :exam_id
+    ORDER BY st.name, sub.name
+""")
+
+# 按学生ID查询成绩历史；流式输出时分数按浮点数、考试日期按时间类型读取
+STUDENT_HISTORY_QUERY = text("""
+    SELECT st.name, st.school, st.current_class,
+           e.exam_name, e.exam_date, s.name as subject_name, 
+           g.original_score, g.scaled_score, g.rank_school, g.rank_city, g.rank_province,
+           g.scaled_rank_school, g.scaled_rank_city, g.scaled_rank_province
+    FROM grades g
+    JOIN exams e ON g.exam_id = e.id
+    JOIN subjects s ON g.subject_id = s.id
+    JOIN students st ON g.student_id = st.id
+    WHERE g.student_id = :student_id
+    ORDER BY e.exam_date DESC, s.name
+""")
+
+_STREAM_COLUMN_TYPES = {'original_score': Float, 'scaled_score': Float}
+
+class ReimportTargetNotFound(LookupError):
+    """重新导入时没有名称和日期相同的考试"""
+
+def _with_score(grade: Dict[str, Any]) -> Dict[str, Any]:
+    """添加兼容的score字段（优先使用原始成绩，如果没有则使用赋分成绩）"""
+    grade['score'] = grade['original_score'] or grade['scaled_score']
+    return grade
+
+# 导入文件没有提供时由导入阶段计算的列：赋分成绩和各级排名
+DERIVED_COLUMNS = ('scaled_score', *ALL_RANK_COLUMNS)
+
+# 成绩单按姓名排序，或按“科目.成绩列”排序，如“总分.rank_province”
+SCORE_SHEET_SORT_BY_NAME = 'name'
+SCORE_SHEET_DEFAULT_SORT = '总分.rank_province'
+
+def _encode_cursor(values: List[Any]) -> str:
+    """把最后一行的排序键编码为分页游标"""
+    values = [float(value) if isinstance(value, Decimal) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values, ensure_ascii=False).encode()).decode()
+
+def _decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("分页游标无效")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("分页游标无效")
+    return values
+
+def _keyset_after(keys: List[Tuple[Any, bool]], values: List[Any]):
+    """按(排序表达式, 是否降序)依次比较，取排在游标之后的行"""
+    clauses = []
+    for index, (expression, descending) in enumerate(keys):
+        equal = [key == value for (key, _), value in zip(keys[:index], values[:index])]
+        clauses.append(and_(*equal, expression < values[index] if descending else expression > values[index]))
+    return or_(*clauses)
 
 class GradeService:
-    def __init__(self, db: AsyncSession):
+    # 成绩批量写入时每条INSERT语句的行数
+    GRADE_INSERT_BATCH_SIZE = int(os.getenv("GRADE_INSERT_BATCH_SIZE", "5000"))
+    # 流式输出成绩时每批从数据库游标读取的行数
+    REPORT_STREAM_BATCH_SIZE = int(os.getenv("REPORT_STREAM_BATCH_SIZE", "2000"))
+    
+    def __init__(self, db: AsyncSession, grade_batch_size: Optional[int] = None):
         self.db = db
         self.student_service = StudentService(db)
+        self.stats_service = ExamStatsService(db)
         self.template_service = TemplateService()
+        self.excel_service = ExcelService()
+        self.grade_batch_size = grade_batch_size or self.GRADE_INSERT_BATCH_SIZE
+        self.scaling_service = ScalingService(db, self.grade_batch_size)
+        self.ranking_service = RankingService(db, self.grade_batch_size)
+        # 本次导入写入的成绩中文件提供了哪些科目的赋分成绩和排名，其余的在导入的赋分、排名阶段计算
+        # 同一个GradeService会依次导入多场考试，每次写入开始和回滚时清空
+        self.supplied_values: Set[SuppliedKey] = set()
     
     async def create_exam(self, exam_name: str, exam_date: datetime, exam_type: ExamType, 
-                         exam_level: ExamLevel, raw_file_path: str) -> Exam:
-        """创建考试记录"""
+                         exam_level: ExamLevel, raw_file_path: str, commit: bool = True,
+                         content_hash: Optional[str] = None) -> Exam:
+        """创建考试记录，commit为False时只写入当前事务，由调用方统一提交"""
         exam = Exam(
             exam_name=exam_name, 
             exam_date=exam_date,
             exam_type=exam_type,
             exam_level=exam_level,
-            raw_file_path=raw_file_path
+            raw_file_path=raw_file_path,
+            content_hash=content_hash
         )
         self.db.add(exam)
-        await self.db.commit()
-        await self.db.refresh(exam)
+        if commit:
+            await self.db.commit()
+            await self.db.refresh(exam)
+        else:
+            await self.db.flush()
         return exam
     
-    async def get_or_create_subject(self, subject_name: str) -> Subject:
-        """获取或创建科目"""
+    async def find_duplicate_import(self, content_hash: Optional[str], exam_name: str) -> Optional[Exam]:
+        """查找用同一文件导入的同名考试，重复上传时直接返回已有考试"""
+        if not content_hash:
+            return None
+        result = await self.db.execute(
+            select(Exam)
+            .where(and_(Exam.content_hash == content_hash, Exam.exam_name == exam_name))
+            .order_by(Exam.id.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+    
+    async def find_reimport_target(self, exam_name: str, exam_date: datetime) -> Optional[Exam]:
+        """查找重新导入要更新的考试：名称和日期相同的最近一次导入"""
         result = await self.db.execute(
-            select(Subject).where(Subject.name == subject_name)
+            select(Exam)
+            .where(and_(Exam.exam_name == exam_name, Exam.exam_date == exam_date))
+            .order_by(Exam.id.desc())
+            .limit(1)
         )
-        subject = result.scalar_one_or_none()
+        return result.scalar_one_or_none()
+    
+    async def import_template_upload(self, upload: UploadEntry, import_request: StandardTemplateImportRequest,
+                                     progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        按标准模板导入上传的文件，同步导入接口和后台导入任务共用
+        重复导入时返回{"exam_id", "duplicate": True}，reimport时重新导入到已有考试
+        """
+        duplicate, target = await self._begin_upload_import(upload, import_request)
+        if duplicate:
+            return {"exam_id": duplicate.id, "duplicate": True}
         
-        if not subject:
-            subject = Subject(name=subject_name)
-            self.db.add(subject)
-            await self.db.commit()
-            await self.db.refresh(subject)
+        with upload_store.pinned(upload):
+            backup_path = self.excel_service.backup_file(upload.file_path, import_request.exam_name)
+            if progress:
+                progress("parsing")
+            # 在子进程中解析标准模板，同时写入Parquet归档，预览过的文件直接使用缓存的解析结果
+            parsed = await run_in_process(
+                parse_standard_template, upload.file_path, import_request.subject_combination,
+                upload.frame_path, ArchiveService.archive_path(backup_path)
+            )
         
-        return subject
+        if target:
+            return await self.reimport_standard_template(
+                target,
+                import_request.exam_date,
+                import_request.exam_type,
+                import_request.exam_level,
+                parsed,
+                backup_path,
+                upload.token,
+                progress=progress
+            )
+        return await self.import_standard_template(
+            import_request.exam_name,
+            import_request.exam_date,
+            import_request.exam_type,
+            import_request.exam_level,
+            parsed,
+            backup_path,
+            import_request.subject_combination,
+            progress=progress,
+            content_hash=upload.token
+        )
     
-    async def bulk_import_grades(self, exam_id: int, df: pd.DataFrame, 
-                               column_mappings: List[ColumnMapping]) -> int:
-        """批量导入成绩数据"""
-        # 创建映射字典
-        mapping_dict = {cm.excel_column: cm.system_field for cm in column_mappings}
+    async def import_mapped_upload(self, upload: UploadEntry, import_request: GradeImportRequest,
+                                   progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        按列映射导入上传的文件，同步导入接口和后台导入任务共用
+        重复导入时返回{"exam_id", "duplicate": True}，reimport时只更新有变化的成绩
+        """
+        duplicate, target = await self._begin_upload_import(upload, import_request)
+        if duplicate:
+            return {"exam_id": duplicate.id, "duplicate": True}
         
-        # 重命名DataFrame列
-        df_mapped = df.rename(columns=mapping_dict)
+        with upload_store.pinned(upload):
+            backup_path = self.excel_service.backup_file(upload.file_path, import_request.exam_name)
+            if progress:
+                progress("parsing")
+            # 在子进程中流式读取Excel数据并写入Parquet归档，预览过的文件直接使用缓存的解析结果
+            chunks = await run_in_process(
+                spill_excel_chunks, upload.file_path, upload.frame_path,
+                ArchiveService.archive_path(backup_path),
+                {cm.excel_column: cm.system_field for cm in import_request.column_mappings}
+            )
         
-        imported_count = 0
+        try:
+            if target:
+                counts = await self.reimport_grades(
+                    target,
+                    import_request.exam_date,
+                    import_request.exam_type,
+                    import_request.exam_level,
+                    chunks,
+                    import_request.column_mappings,
+                    backup_path,
+                    upload.token,
+                    progress=progress
+                )
+                return {"exam_id": target.id, **counts}
+            
+            return await self.import_grades(
+                import_request.exam_name,
+                import_request.exam_date,
+                import_request.exam_type,
+                import_request.exam_level,
+                chunks,
+                import_request.column_mappings,
+                backup_path,
+                content_hash=upload.token,
+                progress=progress
+            )
+        finally:
+            chunks.discard()
+    
+    async def _begin_upload_import(self, upload: UploadEntry,
+                                   import_request: Union[GradeImportRequest, StandardTemplateImportRequest]
+                                   ) -> Tuple[Optional[Exam], Optional[Exam]]:
+        """
+        导入上传文件前的检查，返回(重复导入的已有考试, 重新导入的目标考试)
+        同一文件重复导入同名考试时返回已有考试；reimport时找不到名称和日期相同的考试抛出ReimportTargetNotFound
+        """
+        duplicate = await self.find_duplicate_import(upload.token, import_request.exam_name)
+        if duplicate:
+            return duplicate, None
+        
+        target = None
+        if import_request.reimport:
+            target = await self.find_reimport_target(import_request.exam_name, import_request.exam_date)
+            if not target:
+                raise ReimportTargetNotFound("未找到要重新导入的考试")
+        # 结束查询事务，解析期间不占用数据库连接
+        await self.db.commit()
+        return None, target
+    
+    async def bulk_insert_grades(self, grade_rows: Iterable[Dict[str, Any]],
+                                 batch_size: Optional[int] = None) -> int:
+        """
+        分批写入成绩行，每批一条多行INSERT，不构造ORM对象
+        内存占用以批大小为上限，不在此处提交事务
+        """
+        batch_size = batch_size or self.grade_batch_size
+        inserted_count = 0
+        batch = []
         
-        # 获取所有科目列（除了基本信息列）
-        basic_fields = {'name', 'school', 'current_class', 'grade_level'}
-        subject_columns = [col for col in df_mapped.columns 
-                          if col not in basic_fields and col.endswith('_score')]
+        for grade_row in grade_rows:
+            batch.append({column: grade_row.get(column) for column in GRADE_COLUMNS})
+            if len(batch) >= batch_size:
+                self.supplied_values |= supplied_keys(batch, DERIVED_COLUMNS)
+                await self.db.execute(self._grade_insert_statement(), batch)
+                inserted_count += len(batch)
+                batch = []
         
-        for _, row in df_mapped.iterrows():
-            # 处理学生信息
-            if 'name' not in row or pd.isna(row['name']):
-                continue
-                
-            student_data = {
-                'name': str(row['name']),
-                'school': str(row.get('school', '未知学校')),
-                'current_class': str(row.get('current_class', '')) if pd.notna(row.get('current_class')) else None,
-                'grade_level': str(row.get('grade_level', '')) if pd.notna(row.get('grade_level')) else None
-            }
-            
-            # 获取或创建学生
-            from ..schemas.student import StudentCreate
-            student_create = StudentCreate(**student_data)
-            student = await self.student_service.upsert_student(student_create)
+        if batch:
+            self.supplied_values |= supplied_keys(batch, DERIVED_COLUMNS)
+            await self.db.execute(self._grade_insert_statement(), batch)
+            inserted_count += len(batch)
+        
+        return inserted_count
+    
+    async def import_manual_grades(self, exam_id: int,
+                                   entries: List[Tuple[Dict[str, Any], List[Dict[str, Any]]]]) -> Dict[str, int]:
+        """
+        手工录入多名学生同一场考试的成绩，entries为(学生信息, 成绩列表)，在一个事务中提交
+        学生按学校+班级+姓名批量解析，已有成绩覆盖手工录入的列，没有的成绩批量插入
+        """
+        # 从科目注册表解析科目ID
+        subject_ids = await self._resolve_subjects(
+            grade['subject_name'] for _, grades in entries for grade in grades
+        )
+        
+        try:
+            self.supplied_values = set()
+            students = [StudentCreate(**student).dict() for student, _ in entries]
+            student_ids = await self.student_service.bulk_resolve_students(students)
             
-            # 处理各科成绩
-            for subject_col in subject_columns:
-                if subject_col in row and pd.notna(row[subject_col]):
-                    # 提取科目名称（去掉_score后缀）
-                    subject_name = subject_col.replace('_score', '')
-                    subject = await self.get_or_create_subject(subject_name)
-                    
-                    # 安全转换分数
-                    score_value = None
-                    try:
-                        score_str = str(row[subject_col]).strip()
-                        if score_str and score_str != '-' and score_str.lower() != 'nan':
-                            score_value = float(score_str)
-                    except (ValueError, TypeError):
-                        score_value = None
-                    
-                    # 创建成绩记录
-                    grade_data = {
+            # 同一学生同一科目录入多次时，后面的覆盖前面的
+            grade_rows: Dict[Tuple[int, int], Dict[str, Any]] = {}
+            for student, (_, grades) in zip(students, entries):
+                student_id = student_ids[StudentService.make_student_key(
+                    student['school'], student['current_class'], student['name']
+                )]
+                for grade in grades:
+                    subject_id = subject_ids[grade['subject_name']]
+                    grade_rows[(student_id, subject_id)] = {
                         'exam_id': exam_id,
-                        'student_id': student.id,
-                        'subject_id': subject.id,
-                        'score': score_value
+                        'student_id': student_id,
+                        'subject_id': subject_id,
+                        **{column: grade.get(column) for column in MANUAL_GRADE_COLUMNS}
                     }
-                    
-                    # 添加排名信息（如果有的话）
-                    rank_fields = ['rank_school', 'rank_city', 'rank_province']
-                    for rank_field in rank_fields:
-                        rank_col = f"{subject_name}_{rank_field}"
-                        if rank_col in row and pd.notna(row[rank_col]):
-                            try:
-                                rank_str = str(row[rank_col]).strip()
-                                if rank_str and rank_str != '-' and rank_str.lower() != 'nan':
-                                    grade_data[rank_field] = int(float(rank_str))
-                            except (ValueError, TypeError):
-                                pass  # 忽略无法转换的排名数据
-                    
-                    grade = Grade(**grade_data)
-                    self.db.add(grade)
-                    imported_count += 1
+            
+            # 一次查询已有成绩，按主键批量更新
+            result = await self.db.execute(
+                select(Grade.id, Grade.student_id, Grade.subject_id).where(and_(
+                    Grade.exam_id == exam_id,
+                    tuple_(Grade.student_id, Grade.subject_id).in_(list(grade_rows))
+                ))
+            ) if grade_rows else []
+            updates = []
+            existing = set()
+            for row in result:
+                key = (row.student_id, row.subject_id)
+                existing.add(key)
+                updates.append({'id': row.id, **{column: grade_rows[key][column] for column in MANUAL_GRADE_COLUMNS}})
+            for start in range(0, len(updates), self.grade_batch_size):
+                await self.db.execute(update(Grade), updates[start:start + self.grade_batch_size])
+            
+            inserted = await self.bulk_insert_grades(
+                grade_row for key, grade_row in grade_rows.items() if key not in existing
+            )
+            # 只录入了部分学生，不重新计算已有的赋分成绩和排名，只填补空缺
+            await self.scaling_service.scale_exam(exam_id, overwrite=False)
+            await self.ranking_service.rank_exam(exam_id, overwrite=False)
+            await self.stats_service.refresh_exam(exam_id)
+            await self.db.commit()
+        except Exception:
+            await self._rollback()
+            raise
         
-        await self.db.commit()
+        return {
+            "imported_students": len(student_ids),
+            "imported_grades": len(grade_rows),
+            "inserted": inserted,
+            "updated": len(existing)
+        }
+    
+    def _grade_insert_statement(self):
+        """
+        成绩多行INSERT语句：同一考试、学生、科目已有成绩时（如文件中同一学生出现多次），
+        各列保留已有的非空值，空列用新值补充，与_merge_grade_rows的合并规则一致
+        """
+        dialect_name = self.db.bind.dialect.name
+        statement = _GRADE_INSERT_STATEMENTS.get(dialect_name)
+        if statement is not None:
+            return statement
+        
+        grades = Grade.__table__
+        if dialect_name in ('sqlite', 'postgresql'):
+            dialect_insert = sqlite_insert if dialect_name == 'sqlite' else postgresql_insert
+            statement = dialect_insert(grades)
+            statement = statement.on_conflict_do_update(
+                index_elements=list(GRADE_KEY_COLUMNS),
+                set_={column: func.coalesce(grades.c[column], statement.excluded[column])
+                      for column in GRADE_VALUE_COLUMNS}
+            )
+        elif dialect_name in ('mysql', 'mariadb'):
+            statement = mysql_insert(grades)
+            statement = statement.on_duplicate_key_update({
+                column: func.coalesce(grades.c[column], statement.inserted[column])
+                for column in GRADE_VALUE_COLUMNS
+            })
+        else:
+            statement = insert(grades)
+        _GRADE_INSERT_STATEMENTS[dialect_name] = statement
+        return statement
+    
+    async def import_grades(self, exam_name: str, exam_date: datetime, exam_type: ExamType,
+                            exam_level: ExamLevel, frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                            column_mappings: List[ColumnMapping], backup_path: str,
+                            content_hash: Optional[str] = None,
+                            progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """按列映射导入成绩，考试记录和全部成绩在一个事务中提交，任何一块出错时整体回滚"""
+        try:
+            # 科目在独立事务中创建，需在写入考试记录之前解析
+            await self._resolve_subjects(self._mapped_subject_names(cm.system_field for cm in column_mappings))
+            exam = await self.create_exam(exam_name, exam_date, exam_type, exam_level,
+                                          backup_path, commit=False, content_hash=content_hash)
+            imported_count = await self.bulk_import_grades(exam.id, frames, column_mappings, progress)
+        except Exception:
+            await self._rollback()
+            raise
+        return {"exam_id": exam.id, "imported_records": imported_count}
+    
+    async def bulk_import_grades(self, exam_id: int, frames: Union[pd.DataFrame, Iterable[pd.DataFrame]], 
+                               column_mappings: List[ColumnMapping],
+                               progress: Optional[ProgressCallback] = None) -> int:
+        """
+        批量导入成绩数据，frames可以是整个DataFrame或流式读取的数据块，progress用于报告导入进度
+        全部数据块在一个事务中提交，出错时回滚
+        """
+        try:
+            self.supplied_values = set()
+            imported_count = await self._write_mapped_grades(exam_id, frames, column_mappings, progress)
+            await self._finalize_grades(exam_id, progress)
+            if progress:
+                progress("committing")
+            await self.db.commit()
+        except Exception:
+            await self._rollback()
+            raise
         return imported_count
     
+    async def reimport_grades(self, exam: Exam, exam_date: datetime, exam_type: ExamType,
+                              exam_level: ExamLevel, frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                              column_mappings: List[ColumnMapping], backup_path: str,
+                              content_hash: Optional[str] = None,
+                              progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """按列映射重新导入到已有考试，只写入有变化的成绩，在一个事务中提交"""
+        try:
+            self.supplied_values = set()
+            await self._resolve_subjects(self._mapped_subject_names(cm.system_field for cm in column_mappings))
+            self._update_exam_source(exam, exam_date, exam_type, exam_level, backup_path, content_hash)
+            counts = await self._sync_grades(
+                exam.id, self._iter_mapped_grade_batches(exam.id, frames, column_mappings, progress), progress
+            )
+            await self._finalize_grades(exam.id, progress)
+            if progress:
+                progress("committing")
+            await self.db.commit()
+        except Exception:
+            await self._rollback()
+            raise
+        return counts
+    
+    async def _write_mapped_grades(self, exam_id: int, frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                                   column_mappings: List[ColumnMapping],
+                                   progress: Optional[ProgressCallback] = None) -> int:
+        """按列映射逐块写入成绩，不提交事务，返回写入的成绩数"""
+        imported_count = 0
+        async for grade_rows in self._iter_mapped_grade_batches(exam_id, frames, column_mappings, progress):
+            written = await self.bulk_insert_grades(grade_rows)
+            imported_count += written
+            if progress:
+                progress("writing", grades=written)
+        return imported_count
+    
+    def _mapped_subject_names(self, fields: Iterable[Any]) -> List[str]:
+        """映射后的成绩字段（除学生信息外以_score结尾）对应的科目名称"""
+        return [
+            field.replace('_score', '') for field in fields
+            if isinstance(field, str) and field not in MAPPED_STUDENT_FIELDS and field.endswith('_score')
+        ]
+    
+    async def _iter_mapped_grade_batches(self, exam_id: int, frames: Union[pd.DataFrame, Iterable[pd.DataFrame]],
+                                         column_mappings: List[ColumnMapping],
+                                         progress: Optional[ProgressCallback] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """按列映射逐块解析学生和成绩，成绩行按批返回，不提交事务"""
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        
+        # 创建映射字典
+        mapping_dict = {cm.excel_column: cm.system_field for cm in column_mappings}
+        
+        for df in frames:
+            if progress:
+                progress("writing", rows=len(df))
+            grade_rows = await self._resolve_mapped_grade_rows(exam_id, df.rename(columns=mapping_dict))
+            for start in range(0, len(grade_rows), self.grade_batch_size):
+                yield grade_rows[start:start + self.grade_batch_size]
+    
+    async def _resolve_mapped_grade_rows(self, exam_id: int, df_mapped: pd.DataFrame) -> List[Dict[str, Any]]:
+        """
+        整列转换一个数据块的学生信息、分数和排名，批量解析学生后生成成绩表行
+        学生按学校+姓名匹配（同校同名时用班级区分），行优先顺序与逐行逐列处理一致
+        """
+        columns = list(df_mapped.columns)
+        if 'name' not in columns:
+            return []
+        
+        # 跳过姓名为空的行
+        df_valid = df_mapped.iloc[df_mapped.iloc[:, columns.index('name')].notna().to_numpy()]
+        names = self.template_service._str_column(df_valid, 'name', '')
+        schools = self.template_service._str_column(df_valid, 'school', '未知学校', null_value='未知学校')
+        classes = self.template_service._str_column(df_valid, 'current_class', '')
+        grade_levels = self.template_service._str_column(df_valid, 'grade_level', None, null_value=None)
+        
+        student_ids = await self.student_service.bulk_resolve_students([
+            {'name': name, 'school': school, 'current_class': current_class, 'grade_level': grade_level}
+            for name, school, current_class, grade_level in zip(names, schools, classes, grade_levels)
+        ], match_by_name=True)
+        row_student_ids = np.array([
+            student_ids[StudentService.make_student_key(school, current_class, name)]
+            for name, school, current_class in zip(names, schools, classes)
+        ], dtype=np.int64)
+        
+        # 成绩列: (列位置, 科目名称)
+        score_columns = [
+            (position, subject_name)
+            for position, col in enumerate(columns)
+            for subject_name in self._mapped_subject_names([col])
+        ]
+        subject_ids = await subject_registry.resolve(subject_name for _, subject_name in score_columns)
+        
+        # 分数矩阵和按科目名称对齐的排名矩阵（行=学生，列=成绩列）
+        shape = (len(df_valid), len(score_columns))
+        present = np.zeros(shape, dtype=bool)
+        scores = np.full(shape, np.nan)
+        ranks = {field: np.full(shape, np.nan) for field in MAPPED_RANK_FIELDS}
+        for j, (position, subject_name) in enumerate(score_columns):
+            column = df_valid.iloc[:, position]
+            present[:, j] = column.notna().to_numpy()
+            scores[:, j] = self.template_service._to_float_array(column)
+            for field in MAPPED_RANK_FIELDS:
+                rank_col = f"{subject_name}_{field}"
+                if rank_col in columns:
+                    ranks[field][:, j] = self.template_service._to_rank_array(df_valid.iloc[:, columns.index(rank_col)])
+        
+        # 有值的单元格展开为成绩行，无法转换的分数为空
+        rows, cols = np.nonzero(present)
+        subject_id_array = np.array([subject_ids[subject_name] for _, subject_name in score_columns], dtype=np.int64)
+        grades_frame = pd.DataFrame({
+            'exam_id': exam_id,
+            'student_id': row_student_ids[rows],
+            'subject_id': subject_id_array[cols],
+            'original_score': scores[rows, cols],
+            **{field: pd.array(ranks[field][rows, cols], dtype='Int64') for field in MAPPED_RANK_FIELDS}
+        })
+        return self.template_service._frame_to_records(grades_frame)
+    
     async def get_student_grade_history(self, student_name: str, school: str) -> Optional[StudentGradeHistory]:
         """获取学生成绩历史"""
         # 获取学生信息
@@ -169,31 +619,9 @@ class GradeService:
         if not exam:
             return None
         
-        # 获取考试成绩，包含学生的考试类型和选科组合
-        query = text("""
-            SELECT st.name as student_name, st.school, st.current_class,
-                   st.exam_type, st.subject_combination,
-                   sub.name as subject_name, 
-                   g.original_score, g.scaled_score,
-                   g.rank_school, g.rank_city, g.rank_province,
-                   g.scaled_rank_school, g.scaled_rank_city, g.scaled_rank_province
-            FROM grades g
-            JOIN students st ON g.student_id = st.id
-            JOIN subjects sub ON g.subject_id = sub.id
-            WHERE g.exam_id = :exam_id
-            ORDER BY st.name, sub.name
-        """)
-        
-        result = await self.db.execute(query, {"exam_id": exam_id})
-        raw_grades = [dict(row._mapping) for row in result]
-        
-        # 处理成绩数据，添加默认的score字段用于兼容
-        grades = []
-        for grade in raw_grades:
-            grade_dict = dict(grade)
-            # 添加兼容的score字段（优先使用原始成绩，如果没有则使用赋分成绩）
-            grade_dict['score'] = grade_dict['original_score'] or grade_dict['scaled_score']
-            grades.append(grade_dict)
+        # 获取考试成绩
+        result = await self.db.execute(EXAM_REPORT_QUERY, {"exam_id": exam_id})
+        grades = [_with_score(dict(row._mapping)) for row in result]
         
         # 获取科目列表
         subjects = list(set(grade['subject_name'] for grade in grades))
@@ -212,6 +640,144 @@ class GradeService:
             grades=grades
         )
     
+    async def stream_exam_grade_report(self, exam_id: int,
+                                       batch_size: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        按批读取考试成绩报告的成绩行，使用服务端游标，不把整场考试的成绩读入内存
+        每行的列与get_exam_grade_report中的grades相同
+        """
+        query = EXAM_REPORT_QUERY.columns(**_STREAM_COLUMN_TYPES)
+        async for rows in self._stream_rows(query, {"exam_id": exam_id}, batch_size):
+            yield rows
+    
+    async def stream_student_grade_history(self, student_id: int,
+                                           batch_size: Optional[int] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """按批读取学生的成绩历史，每行包含学生信息、考试和成绩"""
+        query = STUDENT_HISTORY_QUERY.columns(exam_date=DateTime, **_STREAM_COLUMN_TYPES)
+        async for rows in self._stream_rows(query, {"student_id": student_id}, batch_size):
+            yield rows
+    
+    async def _stream_rows(self, query, params: Dict[str, Any],
+                           batch_size: Optional[int]) -> AsyncIterator[List[Dict[str, Any]]]:
+        batch_size = batch_size or self.REPORT_STREAM_BATCH_SIZE
+        result = await self.db.stream(query.execution_options(yield_per=batch_size), params)
+        try:
+            async for partition in result.mappings().partitions():
+                yield [_with_score(dict(row)) for row in partition]
+        finally:
+            await result.close()
+    
+    async def get_exam_score_sheet(self, exam_id: int, search: Optional[str] = None,
+                                   school: Optional[str] = None, current_class: Optional[str] = None,
+                                   exam_type: Optional[ExamType] = None,
+                                   sort_by: str = SCORE_SHEET_DEFAULT_SORT, descending: bool = False,
+                                   limit: int = 50, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        考试成绩单：每名学生一行，各科成绩按科目名称归入grades，按游标分页
+        先按筛选和排序条件查出一页学生（只关联排序科目的成绩行），再按(考试, 学生)索引读取这些学生的成绩
+        sort_by为name或“科目.成绩列”，该科目没有成绩的学生排在最后；search匹配姓名或学校
+        第一页（没有cursor）同时返回符合条件的学生总数
+        """
+        exam_students = select(Grade.student_id).where(Grade.exam_id == exam_id).distinct().subquery()
+        query = select(Student.id).join(exam_students, exam_students.c.student_id == Student.id)
+        
+        conditions = []
+        if search:
+            conditions.append(or_(Student.name.contains(search), Student.school.contains(search)))
+        if school:
+            conditions.append(Student.school == school)
+        if current_class:
+            conditions.append(Student.current_class == current_class)
+        if exam_type:
+            conditions.append(Student.exam_type == exam_type)
+        if conditions:
+            query = query.where(and_(*conditions))
+        
+        total = None
+        if cursor is None:
+            total = (await self.db.execute(select(func.count()).select_from(query.subquery()))).scalar_one()
+        
+        # 排序键，最后按学生ID保证顺序唯一
+        if sort_by == SCORE_SHEET_SORT_BY_NAME:
+            keys = [(Student.name, descending), (Student.id, False)]
+        else:
+            subject_name, _, column = sort_by.partition('.')
+            if column not in GRADE_VALUE_COLUMNS:
+                raise ValueError(f"不支持的排序字段: {sort_by}")
+            subject_id = (await self.db.execute(
+                select(Subject.id).where(Subject.name == subject_name)
+            )).scalar_one_or_none()
+            sort_grade = Grade.__table__.alias('sort_grade')
+            query = query.outerjoin(sort_grade, and_(
+                sort_grade.c.exam_id == exam_id,
+                sort_grade.c.student_id == Student.id,
+                sort_grade.c.subject_id == subject_id
+            ))
+            sort_value = sort_grade.c[column]
+            keys = [
+                (case((sort_value.is_(None), 1), else_=0), False),
+                (func.coalesce(sort_value, 0), descending),
+                (Student.id, False)
+            ]
+        
+        query = query.add_columns(*(key for key, _ in keys))
+        if cursor is not None:
+            query = query.where(_keyset_after(keys, _decode_cursor(cursor, len(keys))))
+        query = query.order_by(*(key.desc() if key_descending else key for key, key_descending in keys))
+        page = (await self.db.execute(query.limit(limit + 1))).all()
+        
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = _encode_cursor(list(page[-1][1:]))
+        student_ids = [row[0] for row in page]
+        
+        # 这一页学生的信息和各科成绩
+        students = {}
+        if student_ids:
+            result = await self.db.execute(
+                select(Student.id, Student.name, Student.school, Student.current_class,
+                       Student.exam_type, Student.subject_combination)
+                .where(Student.id.in_(student_ids))
+            )
+            for row in result:
+                students[row.id] = {
+                    'student_id': row.id,
+                    'student_name': row.name,
+                    'school': row.school,
+                    'current_class': row.current_class,
+                    'exam_type': row.exam_type.value if row.exam_type else None,
+                    'subject_combination': row.subject_combination,
+                    'grades': {}
+                }
+            result = await self.db.execute(
+                select(Grade.student_id, Subject.name, *(getattr(Grade, column) for column in GRADE_VALUE_COLUMNS))
+                .join(Subject, Grade.subject_id == Subject.id)
+                .where(and_(Grade.exam_id == exam_id, Grade.student_id.in_(student_ids)))
+            )
+            for row in result:
+                # 只返回有值的成绩列
+                students[row.student_id]['grades'][row.name] = {
+                    column: row._mapping[column] for column in GRADE_VALUE_COLUMNS
+                    if row._mapping[column] is not None
+                }
+        
+        # 科目列表取自预计算的统计
+        subjects = (await self.db.execute(
+            select(Subject.name).distinct()
+            .join(ExamSubjectStats, ExamSubjectStats.subject_id == Subject.id)
+            .where(ExamSubjectStats.exam_id == exam_id)
+            .order_by(Subject.name)
+        )).scalars().all()
+        
+        return {
+            "exam_id": exam_id,
+            "subjects": subjects,
+            "total": total,
+            "students": [students[student_id] for student_id in student_ids],
+            "next_cursor": next_cursor
+        }
+    
     async def get_previous_exam_for_comparison(self, current_exam_id: int) -> Optional[int]:
         """获取用于对比的上一次考试ID"""
         # 获取当前考试信息
@@ -233,9 +799,7 @@ class GradeService:
             "current_date": current_exam.exam_date,
             "exam_type": current_exam.exam_type.value
         })
-        previous_exam = result.scalar_one_or_none()
-        
-        return previous_exam[0] if previous_exam else None
+        return result.scalar_one_or_none()
     
     async def get_top_performers(self, subject_name: str, limit: int = 10) -> List[Dict[str, Any]]:
         """获取某科目排名前N的学生"""
@@ -267,94 +831,321 @@ class GradeService:
         return results
     async def import_standard_template(self, exam_name: str, exam_date: datetime, 
                                      exam_type: ExamType, exam_level: ExamLevel,
-                                     df: pd.DataFrame, backup_path: str, 
-                                     subject_combination: Optional[str] = None) -> Dict[str, Any]:
-        """标准模板导入"""
-        # 检测模板类型和列映射
-        detected_type, column_mapping = self.template_service.detect_template_type(df)
+                                     frames: Union[ParsedTemplate, pd.DataFrame, Iterable[pd.DataFrame]],
+                                     backup_path: str, subject_combination: Optional[str] = None,
+                                     progress: Optional[ProgressCallback] = None,
+                                     content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """
+        标准模板导入，全部数据块在一个事务中提交
+        frames可以是子进程解析好的ParsedTemplate，也可以是DataFrame或流式读取的数据块（在当前进程解析）
+        progress用于报告导入进度（阶段、已处理行数、已写入成绩数）
+        """
+        if isinstance(frames, ParsedTemplate):
+            parsed = frames
+        else:
+            if isinstance(frames, pd.DataFrame):
+                frames = [frames]
+            if progress:
+                progress("parsing")
+            parsed = build_parsed_template(frames, subject_combination)
         
-        # 验证模板
-        errors = self.template_service.validate_template(df, column_mapping)
-        if errors:
-            raise ValueError(f"模板验证失败: {'; '.join(errors)}")
+        try:
+            self.supplied_values = set()
+            # 科目在独立事务中创建，需在写入考试记录之前解析
+            await self._resolve_subjects(parsed.subjects)
+            
+            # 创建考试记录
+            exam = await self.create_exam(exam_name, exam_date, exam_type, exam_level,
+                                          backup_path, commit=False, content_hash=content_hash)
+            
+            imported_students, imported_count = await self._write_parsed_template(exam.id, parsed, progress)
+            await self._finalize_grades(exam.id, progress)
+            
+            if progress:
+                progress("committing")
+            await self.db.commit()
+        except Exception:
+            await self._rollback()
+            raise
+        finally:
+            parsed.chunks.discard()
+        
+        return {
+            "exam_id": exam.id,
+            "detected_type": parsed.detected_type.value,
+            "imported_students": imported_students,
+            "imported_grades": imported_count,
+            "column_mapping": parsed.column_mapping,
+            "subject_combination": subject_combination,
+            "validation": parsed.validation
+        }
+    
+    async def reimport_standard_template(self, exam: Exam, exam_date: datetime, exam_type: ExamType,
+                                         exam_level: ExamLevel, parsed: ParsedTemplate, backup_path: str,
+                                         content_hash: Optional[str] = None,
+                                         progress: Optional[ProgressCallback] = None) -> Dict[str, Any]:
+        """
+        标准模板重新导入到已有考试：与已有成绩按(学生, 科目)比较，只写入有变化的行，在一个事务中提交
+        返回各类行数：inserted新增、updated更新、deleted删除、unchanged未变化
+        """
+        try:
+            self.supplied_values = set()
+            await self._resolve_subjects(parsed.subjects)
+            self._update_exam_source(exam, exam_date, exam_type, exam_level, backup_path, content_hash)
+            counts = await self._sync_grades(
+                exam.id,
+                (grade_rows async for _, _, grade_rows in self._iter_parsed_grade_batches(exam.id, parsed, progress)),
+                progress
+            )
+            await self._finalize_grades(exam.id, progress)
+            if progress:
+                progress("committing")
+            await self.db.commit()
+        except Exception:
+            await self._rollback()
+            raise
+        finally:
+            parsed.chunks.discard()
         
-        # 处理模板数据
-        processed_data = self.template_service.process_template_data(df, column_mapping, subject_combination)
+        return {
+            "exam_id": exam.id,
+            "detected_type": parsed.detected_type.value,
+            "column_mapping": parsed.column_mapping,
+            "validation": parsed.validation,
+            **counts
+        }
+    
+    async def _resolve_subjects(self, names: Iterable[str]) -> Dict[str, int]:
+        """
+        解析导入用到的科目ID，总分由赋分阶段写入，一并解析
+        缺失的科目在独立事务中创建，需在本事务写入数据之前调用，否则SQLite会因写锁而等待超时
+        """
+        return await subject_registry.resolve([*names, TOTAL_SUBJECT])
+    
+    async def _finalize_grades(self, exam_id: int, progress: Optional[ProgressCallback] = None) -> None:
+        """成绩写入后、提交前计算文件没有提供的赋分成绩和排名，并重新计算考试统计"""
+        if progress:
+            progress("scaling")
+        await self.scaling_service.scale_exam(exam_id, supplied=self.supplied_values)
+        if progress:
+            progress("ranking")
+        await self.ranking_service.rank_exam(exam_id, supplied=self.supplied_values)
+        self.supplied_values = set()
+        if progress:
+            progress("statistics")
+        await self.stats_service.refresh_exam(exam_id)
+    
+    async def _rollback(self) -> None:
+        """回滚写入事务，清空本次记录的文件提供的成绩列，不带到下一场考试"""
+        self.supplied_values = set()
+        await self.db.rollback()
+    
+    def _update_exam_source(self, exam: Exam, exam_date: datetime, exam_type: ExamType,
+                            exam_level: ExamLevel, backup_path: str, content_hash: Optional[str]) -> None:
+        """重新导入时更新考试信息，指向新的备份文件"""
+        exam.exam_date = exam_date
+        exam.exam_type = exam_type
+        exam.exam_level = exam_level
+        exam.raw_file_path = backup_path
+        exam.content_hash = content_hash
+    
+    async def _sync_grades(self, exam_id: int, batches: AsyncIterator[List[Dict[str, Any]]],
+                           progress: Optional[ProgressCallback] = None) -> Dict[str, int]:
+        """
+        把新的成绩行与考试已有成绩按(学生, 科目)比较：
+        新增的行批量插入，成绩或排名变化的行按主键批量更新，文件中已不存在的行删除，其余不动
+        文件没有提供的赋分成绩和排名沿用已有的值参与比较，由赋分、排名阶段重新计算
+        """
+        # 已有成绩：(学生ID, 科目ID) -> 成绩行列表，旧数据中同一科目可能有多行
+        result = await self.db.execute(
+            select(Grade.id, Grade.student_id, Grade.subject_id,
+                   *(getattr(Grade, column) for column in GRADE_VALUE_COLUMNS))
+            .where(Grade.exam_id == exam_id)
+            .order_by(Grade.id)
+        )
+        stored = {}
+        for row in result:
+            stored.setdefault((row.student_id, row.subject_id), []).append(row)
         
-        # 创建考试记录
-        exam = await self.create_exam(exam_name, exam_date, exam_type, exam_level, backup_path)
+        counts = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+        async for grade_rows in batches:
+            inserts = []
+            updates = []
+            stale_ids = []
+            merged_rows = self._merge_grade_rows(grade_rows)
+            self.supplied_values |= supplied_keys(merged_rows, DERIVED_COLUMNS)
+            for grade_row in merged_rows:
+                existing = stored.pop((grade_row['student_id'], grade_row['subject_id']), None)
+                if not existing:
+                    inserts.append(grade_row)
+                    continue
+                
+                # 同一科目的多余行删除，保留的行写入合并后的值
+                first, *duplicates = existing
+                for column in DERIVED_COLUMNS:
+                    if grade_row.get(column) is None:
+                        grade_row[column] = first._mapping[column]
+                stale_ids.extend(duplicate.id for duplicate in duplicates)
+                if duplicates or self._grade_values(first._mapping) != self._grade_values(grade_row):
+                    updates.append({
+                        'id': first.id,
+                        **{column: grade_row.get(column) for column in GRADE_VALUE_COLUMNS}
+                    })
+                else:
+                    counts["unchanged"] += 1
+            
+            counts["inserted"] += await self.bulk_insert_grades(inserts)
+            for start in range(0, len(updates), self.grade_batch_size):
+                await self.db.execute(update(Grade), updates[start:start + self.grade_batch_size])
+            counts["updated"] += len(updates)
+            counts["deleted"] += await self._delete_grades(stale_ids)
+            if progress:
+                progress("writing", grades=len(inserts) + len(updates))
         
-        # 导入学生和成绩数据
-        imported_count = await self._import_processed_data(exam.id, processed_data)
+        # 新文件中已不存在的成绩
+        counts["deleted"] += await self._delete_grades([row.id for rows in stored.values() for row in rows])
+        return counts
+    
+    async def _delete_grades(self, grade_ids: List[int]) -> int:
+        """按主键分批删除成绩行"""
+        for start in range(0, len(grade_ids), self.grade_batch_size):
+            await self.db.execute(delete(Grade).where(Grade.id.in_(grade_ids[start:start + self.grade_batch_size])))
+        return len(grade_ids)
+    
+    def _grade_values(self, grade_row) -> Tuple:
+        """成绩行中用于比较的值：分数按DECIMAL(5, 2)取两位小数，排名取整"""
+        values = []
+        for column in GRADE_VALUE_COLUMNS:
+            value = grade_row.get(column)
+            if value is not None:
+                value = round(float(value), 2) if column in SCORE_COLUMNS else int(value)
+            values.append(value)
+        return tuple(values)
+    
+    def _merge_grade_rows(self, grade_rows: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """同一学生同一科目的原始成绩行和赋分成绩行合并为一行，各列取第一个非空值"""
+        merged = {}
+        for grade_row in grade_rows:
+            key = (grade_row['student_id'], grade_row['subject_id'])
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(grade_row)
+                continue
+            for column in GRADE_VALUE_COLUMNS:
+                if existing.get(column) is None and grade_row.get(column) is not None:
+                    existing[column] = grade_row[column]
+        return list(merged.values())
+    
+    async def rebuild_exam(self, exam_id: int, metadata: Dict[str, Any],
+                           parsed: Union[ParsedTemplate, SpilledFrames]) -> Dict[str, Any]:
+        """
+        用归档重新解析的数据重建考试成绩：删除原有成绩后重新写入，
+        删除和重新写入在一个事务中提交，出错时整体回滚，原有成绩保持不变
+        metadata和parsed来自parse_archive
+        """
+        try:
+            self.supplied_values = set()
+            if isinstance(parsed, ParsedTemplate):
+                subject_names = parsed.subjects
+            else:
+                column_mappings = [
+                    ColumnMapping(excel_column=excel_column, system_field=system_field)
+                    for excel_column, system_field in metadata["column_mapping"].items()
+                ]
+                subject_names = self._mapped_subject_names(metadata["column_mapping"].values())
+            await self._resolve_subjects(subject_names)
+            await self.db.execute(delete(Grade).where(Grade.exam_id == exam_id))
+            
+            if isinstance(parsed, ParsedTemplate):
+                imported_students, imported_count = await self._write_parsed_template(exam_id, parsed)
+            else:
+                imported_students = None
+                imported_count = await self._write_mapped_grades(exam_id, parsed, column_mappings)
+            await self._finalize_grades(exam_id)
+            await self.db.commit()
+        except Exception:
+            await self._rollback()
+            raise
+        finally:
+            if isinstance(parsed, ParsedTemplate):
+                parsed.chunks.discard()
+            else:
+                parsed.discard()
         
         return {
-            "exam_id": exam.id,
-            "detected_type": detected_type.value,
-            "imported_students": len(processed_data['students']),
-            "imported_grades": imported_count,
-            "column_mapping": column_mapping,
-            "subject_combination": subject_combination
+            "exam_id": exam_id,
+            "import_mode": metadata["import_mode"],
+            "imported_students": imported_students,
+            "imported_grades": imported_count
         }
     
-    async def _import_processed_data(self, exam_id: int, processed_data: Dict) -> int:
-        """导入处理后的数据"""
+    async def _write_parsed_template(self, exam_id: int, parsed: ParsedTemplate,
+                                     progress: Optional[ProgressCallback] = None) -> Tuple[int, int]:
+        """逐块写入解析好的标准模板数据，不提交事务，返回(学生数, 成绩数)"""
+        imported_students = 0
         imported_count = 0
-        student_cache = {}  # 缓存学生信息，避免重复查询
-        
-        # 按学生分组处理成绩
-        grades_by_student = {}
-        for grade in processed_data['grades']:
-            student_key = grade['student_key']
-            if student_key not in grades_by_student:
-                grades_by_student[student_key] = []
-            grades_by_student[student_key].append(grade)
-        
-        # 处理每个学生的数据
-        for student_info in processed_data['students']:
-            student_key = f"{student_info['school']}_{student_info['current_class']}_{student_info['name']}"
+        async for rows, students, grade_rows in self._iter_parsed_grade_batches(exam_id, parsed, progress):
+            imported_students += students
+            written = await self.bulk_insert_grades(grade_rows)
+            imported_count += written
+            if progress:
+                progress("writing", rows=rows, grades=written)
+        return imported_students, imported_count
+    
+    async def _iter_parsed_grade_batches(self, exam_id: int, parsed: ParsedTemplate,
+                                         progress: Optional[ProgressCallback] = None
+                                         ) -> AsyncIterator[Tuple[int, int, List[Dict[str, Any]]]]:
+        """逐块解析学生并生成成绩行，返回(Excel行数, 学生数, 成绩行)"""
+        for rows, (students_frame, grades_frame) in zip(parsed.chunks.rows, parsed.chunks):
+            if progress:
+                progress("writing")
+            processed_data = self.template_service.to_processed_data(students_frame, grades_frame)
+            grade_rows = await self._resolve_grade_rows(exam_id, processed_data)
+            yield rows, len(processed_data['students']), grade_rows
+    
+    async def _resolve_grade_rows(self, exam_id: int, processed_data: Dict) -> List[Dict[str, Any]]:
+        """解析学生和科目ID，生成成绩表行，同一学生同一科目的原始成绩和赋分成绩合并为一行"""
+        # 从科目注册表解析科目ID
+        subject_ids = await subject_registry.resolve(
+            grade['subject_name'] for grade in processed_data['grades']
+        )
+        
+        # 批量解析学生，得到 student_key -> 学生ID 映射
+        student_ids = await self.student_service.bulk_resolve_students(processed_data['students'])
+        
+        return self._merge_grade_rows(
+            self._build_grade_rows(exam_id, processed_data['grades'], student_ids, subject_ids)
+        )
+    
+    def _build_grade_rows(self, exam_id: int, grades: Iterable[Dict[str, Any]],
+                          student_ids: Dict[str, int], subject_ids: Dict[str, int]):
+        """把处理后的成绩信息逐条转换为成绩表行"""
+        for grade_info in grades:
+            student_id = student_ids.get(grade_info['student_key'])
+            if student_id is None:
+                continue
             
-            # 获取或创建学生
-            if student_key not in student_cache:
-                from ..schemas.student import StudentCreate
-                student_create = StudentCreate(**student_info)
-                student = await self.student_service.upsert_student_by_class_name(student_create)
-                student_cache[student_key] = student
+            grade_data = {
+                'exam_id': exam_id,
+                'student_id': student_id,
+                'subject_id': subject_ids[grade_info['subject_name']],
+                # 原始排名
+                'rank_school': grade_info.get('rank_school'),
+                'rank_city': grade_info.get('rank_city'),
+                'rank_province': grade_info.get('rank_province'),
+                # 赋分排名
+                'scaled_rank_school': grade_info.get('scaled_rank_school'),
+                'scaled_rank_city': grade_info.get('scaled_rank_city'),
+                'scaled_rank_province': grade_info.get('scaled_rank_province')
+            }
+            
+            # 根据成绩类型设置分数
+            if grade_info.get('score_type') == 'scaled':
+                grade_data['scaled_score'] = grade_info['score']
             else:
-                student = student_cache[student_key]
+                grade_data['original_score'] = grade_info['score']
             
-            # 处理该学生的成绩
-            if student_key in grades_by_student:
-                for grade_info in grades_by_student[student_key]:
-                    # 获取或创建科目
-                    subject = await self.get_or_create_subject(grade_info['subject_name'])
-                    
-                    # 创建成绩记录
-                    grade_data = {
-                        'exam_id': exam_id,
-                        'student_id': student.id,
-                        'subject_id': subject.id,
-                        # 原始排名
-                        'rank_school': grade_info.get('rank_school'),
-                        'rank_city': grade_info.get('rank_city'),
-                        'rank_province': grade_info.get('rank_province'),
-                        # 赋分排名
-                        'scaled_rank_school': grade_info.get('scaled_rank_school'),
-                        'scaled_rank_city': grade_info.get('scaled_rank_city'),
-                        'scaled_rank_province': grade_info.get('scaled_rank_province')
-                    }
-                    
-                    # 根据成绩类型设置分数
-                    if grade_info.get('score_type') == 'scaled':
-                        grade_data['scaled_score'] = grade_info['score']
-                    else:
-                        grade_data['original_score'] = grade_info['score']
-                    
-                    grade = Grade(**grade_data)
-                    self.db.add(grade)
-                    imported_count += 1
-        
-        await self.db.commit()
-        return imported_count
+            yield grade_data
     
     async def get_ranking_by_type(self, exam_type: ExamType, subject_name: str, 
                                  score_type: ScoreType = ScoreType.ORIGINAL,
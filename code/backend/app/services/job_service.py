@@ -0,0 +1,164 @@
+"""
+导入任务服务
+把耗时的导入放到后台任务中执行，请求立即返回任务ID，通过任务ID查询进度
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+class ImportJob:
+    """单个导入任务的状态和进度"""
+    
+    def __init__(self, job_id: str, kind: str, description: str = ""):
+        self.id = job_id
+        self.kind = kind
+        self.description = description
+        self.status = "pending"  # pending / running / succeeded / failed
+        self.stage = "queued"
+        self.rows_processed = 0
+        self.grades_written = 0
+        self.errors: List[str] = []
+        self.result: Optional[Dict[str, Any]] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self._started_clock: Optional[float] = None
+        self._finished_clock: Optional[float] = None
+    
+    def advance(self, stage: Optional[str] = None, rows: int = 0, grades: int = 0) -> None:
+        """更新进度：切换阶段并累加已处理行数和已写入成绩数"""
+        if stage:
+            self.stage = stage
+        self.rows_processed += rows
+        self.grades_written += grades
+    
+    def start(self) -> None:
+        self.status = "running"
+        self.stage = "starting"
+        self.started_at = datetime.now()
+        self._started_clock = time.monotonic()
+    
+    def succeed(self, result: Dict[str, Any]) -> None:
+        self.status = "succeeded"
+        self.stage = "done"
+        self.result = result
+        self._finish()
+    
+    def fail(self, error: str) -> None:
+        self.status = "failed"
+        self.errors.append(error)
+        self._finish()
+    
+    def _finish(self) -> None:
+        self.finished_at = datetime.now()
+        self._finished_clock = time.monotonic()
+    
+    @property
+    def is_finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+    
+    @property
+    def throughput(self) -> Optional[float]:
+        """处理速度（行/秒）"""
+        if self._started_clock is None:
+            return None
+        elapsed = (self._finished_clock or time.monotonic()) - self._started_clock
+        return round(self.rows_processed / elapsed, 1) if elapsed > 0 else None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "description": self.description,
+            "status": self.status,
+            "stage": self.stage,
+            "rows_processed": self.rows_processed,
+            "grades_written": self.grades_written,
+            "throughput": self.throughput,
+            "errors": self.errors,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+class ImportJobManager:
+    """导入任务管理器：限制并发执行的任务数和排队任务数"""
+    
+    def __init__(self, max_concurrent: int = 2, max_pending: int = 20, max_history: int = 200):
+        self.max_concurrent = max_concurrent
+        self.max_pending = max_pending
+        self.max_history = max_history
+        self._jobs: "OrderedDict[str, ImportJob]" = OrderedDict()
+        self._tasks = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+    
+    def submit(self, kind: str, run: Callable[[ImportJob], Awaitable[Dict[str, Any]]],
+               description: str = "", cleanup: Optional[Callable[[], None]] = None) -> ImportJob:
+        """
+        提交导入任务，立即返回任务对象
+        任务在后台独立运行，不受发起请求的客户端断开影响
+        """
+        if self.pending_count >= self.max_pending:
+            raise RuntimeError("导入任务排队已满，请稍后重试")
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+        
+        job = ImportJob(uuid.uuid4().hex, kind, description)
+        self._jobs[job.id] = job
+        self._evict_finished()
+        
+        task = asyncio.create_task(self._run(job, run, cleanup))
+        # 保留任务引用，避免被垃圾回收
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+    
+    def get(self, job_id: str) -> Optional[ImportJob]:
+        return self._jobs.get(job_id)
+    
+    def list_jobs(self) -> List[ImportJob]:
+        return list(reversed(self._jobs.values()))
+    
+    @property
+    def pending_count(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == "pending")
+    
+    async def shutdown(self) -> None:
+        """应用关闭时取消未完成的任务"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+    
+    async def _run(self, job: ImportJob, run: Callable[[ImportJob], Awaitable[Dict[str, Any]]],
+                   cleanup: Optional[Callable[[], None]]) -> None:
+        try:
+            async with self._semaphore:
+                job.start()
+                job.succeed(await run(job))
+        except asyncio.CancelledError:
+            job.fail("任务已取消")
+            raise
+        except Exception as e:
+            job.fail(str(e))
+        finally:
+            if cleanup:
+                cleanup()
+    
+    def _evict_finished(self) -> None:
+        """只保留最近的任务记录"""
+        while len(self._jobs) > self.max_history:
+            oldest = next((job_id for job_id, job in self._jobs.items() if job.is_finished), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
+
+import_job_manager = ImportJobManager(
+    max_concurrent=int(os.getenv("IMPORT_JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("IMPORT_JOB_QUEUE_SIZE", "20"))
+)
@@ -0,0 +1,268 @@
+"""
+子进程解析任务
+这些函数在进程池中执行，参数和返回值都必须可以pickle
+"""
+import itertools
+import pickle
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import pandas as pd
+
+from ..schemas.exam import ExamType
+from .excel_service import ExcelService
+from .template_service import TemplateService, ValidationReport
+from .process_pool import SpilledFrames
+from .archive_service import ArchiveWriter, ArchiveService
+from .batch_import_service import BatchImportService, BatchSource
+
+# 学生信息表中各字段对应的列名，靠前的优先
+STUDENT_ROSTER_COLUMNS = {
+    'name': ['姓名', 'name'],
+    'school': ['学校', 'school'],
+    'current_class': ['班级', 'class'],
+    'grade_level': ['年级', 'grade']
+}
+
+# 导入结果中附带的校验错误样本数
+IMPORT_VALIDATION_SAMPLE = 20
+
+# 归档元数据中记录的导入方式
+IMPORT_MODE_STANDARD_TEMPLATE = "standard_template"
+IMPORT_MODE_GRADES = "grades"
+
+class ParsedTemplate:
+    """解析后的标准模板：模板类型、列映射、涉及的科目，以及按块溢写的(学生表, 成绩表)"""
+    
+    def __init__(self, detected_type: ExamType, column_mapping: Dict[str, str], subjects: List[str]):
+        self.detected_type = detected_type
+        self.column_mapping = column_mapping
+        self.subjects = subjects
+        self.chunks = SpilledFrames()
+        # 单元格校验结果摘要，见ValidationReport.summary
+        self.validation: Optional[Dict[str, Any]] = None
+
+def build_parsed_template(frames: Iterable[pd.DataFrame],
+                          subject_combination: Optional[str] = None,
+                          archive_path: Optional[str] = None,
+                          detected_type: Optional[ExamType] = None,
+                          column_mapping: Optional[Dict[str, str]] = None) -> ParsedTemplate:
+    """
+    检测模板类型，逐块验证并转换为列式结果，任何一块验证失败都不会写入数据库
+    指定archive_path时同时写入Parquet归档；从归档重建时直接使用归档中记录的模板类型和列映射
+    """
+    template_service = TemplateService()
+    frames = iter(frames)
+    
+    first_chunk = next(frames, None)
+    if first_chunk is None:
+        raise ValueError("Excel文件中没有数据")
+    
+    # 检测模板类型和列映射
+    if column_mapping is None:
+        detected_type, column_mapping = template_service.detect_template_type(first_chunk)
+    parsed = ParsedTemplate(detected_type, column_mapping,
+                            template_service.get_template_subjects(column_mapping))
+    
+    archive = None
+    if archive_path:
+        archive = ArchiveWriter(archive_path, {
+            "import_mode": IMPORT_MODE_STANDARD_TEMPLATE,
+            "detected_type": detected_type.value,
+            "column_mapping": column_mapping,
+            "subject_combination": subject_combination
+        })
+    
+    # 单元格错误不阻止导入，无效的成绩和排名按空值处理，错误摘要随导入结果返回
+    report = ValidationReport(column_mapping, IMPORT_VALIDATION_SAMPLE, template_service)
+    
+    try:
+        for chunk in itertools.chain([first_chunk], frames):
+            # 验证模板
+            errors = template_service.validate_template(chunk, column_mapping)
+            if errors:
+                raise ValueError(f"模板验证失败: {'; '.join(errors)}")
+            report.add(chunk)
+            
+            if archive:
+                archive.write(chunk)
+            students_frame, grades_frame = template_service.process_template_frame(
+                chunk, column_mapping, subject_combination
+            )
+            parsed.chunks.add((students_frame, grades_frame), rows=len(chunk))
+        
+        if archive:
+            archive.close()
+    except Exception:
+        if archive:
+            archive.abort()
+        parsed.chunks.discard()
+        raise
+    
+    parsed.validation = report.summary()
+    return parsed
+
+def validate_standard_template(file_path: str, frame_path: Optional[str] = None,
+                               max_errors: int = 1000) -> Dict[str, Any]:
+    """
+    试运行标准模板导入的校验阶段，不写入数据库
+    返回模板类型、列映射、结构错误（缺少必需字段等，会导致导入失败）和逐单元格的错误表
+    """
+    template_service = TemplateService()
+    frames = _iter_source_chunks(file_path, frame_path)
+    
+    first_chunk = next(frames, None)
+    if first_chunk is None:
+        raise ValueError("Excel文件中没有数据")
+    
+    detected_type, column_mapping = template_service.detect_template_type(first_chunk)
+    report = ValidationReport(column_mapping, max_errors, template_service)
+    
+    structure_errors = []
+    for chunk in itertools.chain([first_chunk], frames):
+        for error in template_service.validate_template(chunk, column_mapping):
+            if error not in structure_errors:
+                structure_errors.append(error)
+        report.add(chunk)
+    
+    summary = report.summary()
+    return {
+        "detected_type": detected_type.value,
+        "column_mapping": column_mapping,
+        "structure_errors": structure_errors,
+        **summary,
+        "valid": summary["valid"] and not structure_errors,
+        "error_types": TemplateService.VALIDATION_ERRORS
+    }
+
+def parse_standard_template(file_path: str, subject_combination: Optional[str] = None,
+                            frame_path: Optional[str] = None,
+                            archive_path: Optional[str] = None,
+                            sheet_name: Optional[str] = None) -> ParsedTemplate:
+    """流式读取标准模板文件并完成解析，有预览缓存的数据时直接使用；sheet_name指定读取的工作表"""
+    return build_parsed_template(_iter_source_chunks(file_path, frame_path, sheet_name),
+                                 subject_combination, archive_path)
+
+def collect_batch_sources(file_path: str, filename: str,
+                          work_dir: str) -> Tuple[List[BatchSource], Optional[List[Dict[str, Any]]]]:
+    """拆分批量导入的工作簿或ZIP压缩包，返回(数据来源列表, ZIP中的导入清单)"""
+    return BatchImportService().collect_sources(file_path, filename, work_dir)
+
+def spill_excel_chunks(file_path: str, frame_path: Optional[str] = None,
+                       archive_path: Optional[str] = None,
+                       column_mapping: Optional[Dict[str, str]] = None) -> SpilledFrames:
+    """流式读取Excel，把数据块溢写到临时文件，指定archive_path时同时写入Parquet归档"""
+    return _spill_chunks(_iter_source_chunks(file_path, frame_path), archive_path, column_mapping)
+
+def parse_archive(archive_path: str) -> Tuple[Dict[str, Any], Union[ParsedTemplate, SpilledFrames]]:
+    """
+    读取考试归档，按导入时的方式重新处理
+    返回(归档元数据, 解析结果)：标准模板为ParsedTemplate，按列映射导入为溢写的数据块
+    """
+    archive_service = ArchiveService()
+    metadata = archive_service.read_metadata(archive_path)
+    chunks = archive_service.iter_chunks(archive_path, ExcelService.CHUNK_ROWS)
+    
+    if metadata["import_mode"] == IMPORT_MODE_STANDARD_TEMPLATE:
+        parsed = build_parsed_template(
+            chunks, metadata.get("subject_combination"),
+            detected_type=ExamType(metadata["detected_type"]),
+            column_mapping=metadata["column_mapping"]
+        )
+        return metadata, parsed
+    
+    return metadata, _spill_chunks(chunks)
+
+def _spill_chunks(frames: Iterable[pd.DataFrame], archive_path: Optional[str] = None,
+                  column_mapping: Optional[Dict[str, str]] = None) -> SpilledFrames:
+    chunks = SpilledFrames()
+    archive = None
+    if archive_path:
+        archive = ArchiveWriter(archive_path, {
+            "import_mode": IMPORT_MODE_GRADES,
+            "column_mapping": column_mapping or {}
+        })
+    
+    try:
+        for chunk in frames:
+            if archive:
+                archive.write(chunk)
+            chunks.add(chunk, rows=len(chunk))
+        if archive:
+            archive.close()
+    except Exception:
+        if archive:
+            archive.abort()
+        chunks.discard()
+        raise
+    return chunks
+
+def preview_upload(file_path: str, spill_dir: Optional[str] = None,
+                   sample_rows: Optional[int] = None) -> Tuple[Dict[str, Any], Optional[str]]:
+    """
+    预览Excel文件并检测成绩表结构，返回(预览结果, 溢写文件路径)
+    指定sample_rows时只读取表头和前sample_rows行，从样本推断结构并估算总行数，不溢写数据；
+    否则完整解析一次，完整数据溢写到spill_dir，导入时可以直接复用
+    """
+    excel_service = ExcelService()
+    
+    if sample_rows:
+        df, total_rows, total_rows_exact = excel_service.read_excel_sample(file_path, sample_rows)
+        frame_path = None
+    else:
+        chunks = list(excel_service.iter_excel_chunks(file_path))
+        df = pd.concat(chunks) if chunks else pd.DataFrame()
+        total_rows, total_rows_exact = len(df), True
+        
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.pkl', dir=spill_dir) as spill_file:
+            pickle.dump(df, spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        frame_path = spill_file.name
+    
+    preview = {
+        "columns": df.columns.tolist(),
+        "sample_data": df.head(5).to_dict('records'),
+        # 检测成绩表结构
+        "structure": excel_service.detect_grade_structure(df),
+        "total_rows": total_rows,
+        "total_rows_exact": total_rows_exact
+    }
+    return preview, frame_path
+
+def _iter_source_chunks(file_path: str, frame_path: Optional[str],
+                        sheet_name: Optional[str] = None) -> Iterator[pd.DataFrame]:
+    """按块读取数据：优先使用预览时溢写的完整数据，否则流式读取Excel"""
+    excel_service = ExcelService()
+    if not frame_path:
+        yield from excel_service.iter_excel_chunks(file_path, sheet_name=sheet_name)
+        return
+    
+    with open(frame_path, 'rb') as spill_file:
+        df = pickle.load(spill_file)
+    for start in range(0, len(df), excel_service.CHUNK_ROWS):
+        yield df.iloc[start:start + excel_service.CHUNK_ROWS]
+
+def read_student_rows(file_path: str) -> List[Dict[str, Optional[str]]]:
+    """
+    读取学生信息表，整列规范化字段，返回可直接构造StudentRosterEntry的字典列表
+    姓名为空的行跳过，缺少学校时为“未知学校”，缺少班级时为空（不覆盖已有学生的班级）
+    """
+    chunks = list(ExcelService().iter_excel_chunks(file_path))
+    df = pd.concat(chunks) if chunks else pd.DataFrame()
+    
+    students = pd.DataFrame({
+        field: _coalesce_text_columns(df, columns) for field, columns in STUDENT_ROSTER_COLUMNS.items()
+    })
+    students = students[students['name'].notna().to_numpy()]
+    students['school'] = students['school'].fillna('未知学校')
+    return students.astype(object).where(students.notna(), None).to_dict('records')
+
+def _coalesce_text_columns(df: pd.DataFrame, columns: List[str]) -> pd.Series:
+    """按列名顺序取第一个非空值，去除首尾空格，空字符串视为空值"""
+    result = pd.Series(None, index=df.index, dtype=object)
+    for column in columns:
+        if column not in df.columns:
+            continue
+        values = df[column]
+        text = values.astype(str).str.strip().astype(object).where(values.notna(), None)
+        text = text.where(text != '', None)
+        result = result.where(result.notna(), text)
+    return result
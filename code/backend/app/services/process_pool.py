@@ -0,0 +1,89 @@
+"""
+进程池服务
+Excel解析和pandas数据转换是CPU密集型操作，放到子进程中执行，避免阻塞事件循环
+"""
+import asyncio
+import functools
+import multiprocessing
+import os
+import pickle
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Iterator, List, Optional
+
+class SpilledFrames:
+    """
+    溢写到临时文件的数据块
+    子进程把处理结果按块序列化到磁盘，只把文件路径传回主进程，
+    主进程逐块读取并删除，内存中始终只保留一个数据块
+    """
+    
+    def __init__(self):
+        self.paths: List[str] = []
+        # 每个数据块对应的Excel行数
+        self.rows: List[int] = []
+    
+    def add(self, payload: Any, rows: int = 0) -> None:
+        """序列化一个数据块，pickle协议5对DataFrame中的NumPy数组直接写入缓冲区"""
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.pkl') as spill_file:
+            pickle.dump(payload, spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.paths.append(spill_file.name)
+        self.rows.append(rows)
+    
+    def __iter__(self) -> Iterator[Any]:
+        """按顺序读取数据块，读取后立即删除临时文件"""
+        while self.paths:
+            path = self.paths.pop(0)
+            try:
+                with open(path, 'rb') as spill_file:
+                    payload = pickle.load(spill_file)
+            finally:
+                os.unlink(path)
+            yield payload
+    
+    def discard(self) -> None:
+        """删除尚未读取的临时文件"""
+        for path in self.paths:
+            if os.path.exists(path):
+                os.unlink(path)
+        self.paths = []
+
+class ProcessPool:
+    """受管理的进程池，提供给路由使用的异步接口"""
+    
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+    
+    def start(self) -> None:
+        if self._executor is None:
+            # 使用spawn方式启动子进程，不继承主进程的事件循环和数据库连接
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+    
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+    
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """在子进程中执行func，func及其参数和返回值都必须可以pickle"""
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+        except BrokenProcessPool:
+            # 子进程异常退出后进程池不可再用，下次调用时重建
+            self._executor = None
+            raise RuntimeError("解析进程异常退出，请重试")
+
+process_pool = ProcessPool(
+    max_workers=int(os.getenv("PROCESS_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+)
+
+async def run_in_process(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """在共享进程池中执行CPU密集型任务"""
+    return await process_pool.run(func, *args, **kwargs)
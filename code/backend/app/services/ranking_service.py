@@ -0,0 +1,115 @@
+"""
+成绩排名计算
+导入的文件没有排名列时，按考试中的分数计算各科目（含总分）原始成绩和赋分成绩的校、市、省排名：
+校排名在学生所在学校内排名，市排名和省排名在参加本场考试的全部学生中排名
+（系统中只有本场考试的学生，无法得到更大范围的名次）
+"""
+import os
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Grade, Student
+
+# 分数列 -> (校排名, 市排名, 省排名)列
+RANK_COLUMNS = {
+    'original_score': ('rank_school', 'rank_city', 'rank_province'),
+    'scaled_score': ('scaled_rank_school', 'scaled_rank_city', 'scaled_rank_province'),
+}
+ALL_RANK_COLUMNS = [column for columns in RANK_COLUMNS.values() for column in columns]
+
+# 并列规则：competition并列同名次、后面的名次跳过（1, 1, 3），dense并列同名次、名次连续（1, 1, 2）
+TIE_RULES = {'competition': 'min', 'dense': 'dense'}
+DEFAULT_TIE_RULE = os.getenv("RANK_TIE_RULE", "competition")
+
+# (科目ID, 成绩列)，用于记录导入文件提供了哪些科目的排名或赋分成绩
+SuppliedKey = Tuple[int, str]
+
+def supplied_keys(grade_rows: Iterable[Dict], columns: Iterable[str]) -> Set[SuppliedKey]:
+    """成绩行中columns有值的(科目ID, 列)"""
+    columns = list(columns)
+    keys = set()
+    for grade_row in grade_rows:
+        for column in columns:
+            if grade_row.get(column) is not None:
+                keys.add((grade_row['subject_id'], column))
+    return keys
+
+def compute_ranks(grades: pd.DataFrame, tie_rule: str = DEFAULT_TIE_RULE) -> pd.DataFrame:
+    """
+    grades需要subject_id、school和两个分数列，返回与grades同索引的各排名列，
+    分数越高名次越靠前，没有分数的行排名为空
+    """
+    method = TIE_RULES[tie_rule]
+    school = grades['school'].fillna('')
+    ranks = pd.DataFrame(index=grades.index)
+    for score_column, (school_column, city_column, province_column) in RANK_COLUMNS.items():
+        scores = grades[score_column].astype(float)
+        cohort_rank = scores.groupby(grades['subject_id'], sort=False).rank(method=method, ascending=False)
+        ranks[school_column] = scores.groupby([grades['subject_id'], school], sort=False) \
+            .rank(method=method, ascending=False).astype('Int64')
+        ranks[city_column] = cohort_rank.astype('Int64')
+        ranks[province_column] = cohort_rank.astype('Int64')
+    return ranks
+
+class RankingService:
+    """计算考试的排名并按主键批量写回，只写入变化的行，不提交事务"""
+
+    def __init__(self, db: AsyncSession, batch_size: int = 5000):
+        self.db = db
+        self.batch_size = batch_size
+
+    async def rank_exam(self, exam_id: int, tie_rule: Optional[str] = None,
+                        supplied: Optional[Set[SuppliedKey]] = None, overwrite: bool = True) -> Dict[str, int]:
+        """
+        计算一场考试的排名
+        supplied中的(科目ID, 排名列)为导入文件提供的排名，保持不变；
+        overwrite为False时只填补为空的排名，已有的排名不变
+        返回计算的成绩行数和更新的行数
+        """
+        tie_rule = tie_rule or DEFAULT_TIE_RULE
+        if tie_rule not in TIE_RULES:
+            raise ValueError(f"不支持的并列规则: {tie_rule}")
+
+        result = await self.db.execute(
+            select(Grade.id, Grade.subject_id, Student.school,
+                   *(getattr(Grade, column) for column in RANK_COLUMNS),
+                   *(getattr(Grade, column) for column in ALL_RANK_COLUMNS))
+            .join(Student, Grade.student_id == Student.id)
+            .where(Grade.exam_id == exam_id)
+        )
+        grades = pd.DataFrame(result.all(), columns=['id', 'subject_id', 'school',
+                                                     *RANK_COLUMNS, *ALL_RANK_COLUMNS])
+        if grades.empty:
+            return {"ranked": 0, "updated": 0}
+
+        stored = grades[ALL_RANK_COLUMNS].astype('Int64')
+        ranks = compute_ranks(grades, tie_rule)
+
+        # 文件提供的排名和（不覆盖时）已有的排名保持原值
+        keep = pd.DataFrame(False, index=grades.index, columns=ALL_RANK_COLUMNS)
+        for subject_id, column in supplied or ():
+            if column in keep:
+                keep[column] |= grades['subject_id'] == subject_id
+        if not overwrite:
+            keep |= stored.notna()
+        ranks = ranks.mask(keep, stored)
+
+        changed = (ranks.isna() != stored.isna()).to_numpy() | (ranks.fillna(0) != stored.fillna(0)).to_numpy()
+        changed_rows = np.flatnonzero(changed.any(axis=1))
+        updates = self._update_rows(grades['id'].iloc[changed_rows], ranks.iloc[changed_rows])
+        # 按主键批量更新，不经过ORM的逐行处理
+        grades_table = Grade.__table__
+        statement = grades_table.update().where(grades_table.c.id == bindparam("grade_id"))
+        for start in range(0, len(updates), self.batch_size):
+            await self.db.execute(statement, updates[start:start + self.batch_size])
+        return {"ranked": len(grades), "updated": len(updates)}
+
+    def _update_rows(self, grade_ids: pd.Series, ranks: pd.DataFrame) -> List[Dict]:
+        """转换为批量更新的参数，空排名写入NULL"""
+        values = ranks.astype(object).where(ranks.notna(), None)
+        values.insert(0, 'grade_id', grade_ids.astype(int).to_numpy())
+        return values.to_dict('records')
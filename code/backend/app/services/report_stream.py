@@ -0,0 +1,90 @@
+"""
+成绩报告的流式输出
+按批读取查询结果并逐批编码：默认输出NDJSON（每行一条成绩），请求头Accept为Arrow IPC流格式时输出Arrow记录批，
+内存占用只与每批行数有关，与考试规模无关
+"""
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import pyarrow as pa
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_STREAM_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+RowBatches = AsyncIterator[List[Dict[str, Any]]]
+
+_SCORE_FIELDS = [
+    pa.field("original_score", pa.float64()),
+    pa.field("scaled_score", pa.float64()),
+    pa.field("score", pa.float64()),
+    pa.field("rank_school", pa.int64()),
+    pa.field("rank_city", pa.int64()),
+    pa.field("rank_province", pa.int64()),
+    pa.field("scaled_rank_school", pa.int64()),
+    pa.field("scaled_rank_city", pa.int64()),
+    pa.field("scaled_rank_province", pa.int64()),
+]
+
+# 考试成绩报告每行的列，与GradeService.stream_exam_grade_report一致
+EXAM_REPORT_SCHEMA = pa.schema([
+    pa.field("student_name", pa.string()),
+    pa.field("school", pa.string()),
+    pa.field("current_class", pa.string()),
+    pa.field("exam_type", pa.string()),
+    pa.field("subject_combination", pa.string()),
+    pa.field("subject_name", pa.string()),
+    *_SCORE_FIELDS,
+])
+
+# 学生成绩历史每行的列，与GradeService.stream_student_grade_history一致
+STUDENT_HISTORY_SCHEMA = pa.schema([
+    pa.field("name", pa.string()),
+    pa.field("school", pa.string()),
+    pa.field("current_class", pa.string()),
+    pa.field("exam_name", pa.string()),
+    pa.field("exam_date", pa.timestamp("us")),
+    pa.field("subject_name", pa.string()),
+    *_SCORE_FIELDS,
+])
+
+def wants_arrow(accept: Optional[str]) -> bool:
+    return bool(accept) and ARROW_STREAM_MEDIA_TYPE in accept
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"无法编码为JSON: {type(value).__name__}")
+
+async def ndjson_stream(batches: RowBatches) -> AsyncIterator[bytes]:
+    async for rows in batches:
+        yield "".join(
+            json.dumps(row, ensure_ascii=False, default=_json_default) + "\n" for row in rows
+        ).encode("utf-8")
+
+async def arrow_stream(batches: RowBatches, schema: pa.Schema) -> AsyncIterator[bytes]:
+    """每批写成一个Arrow记录批，写完即取出缓冲区内容，缓冲区只保留当前一批"""
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        async for rows in batches:
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=schema))
+            yield _drain(sink)
+    # 结束标记
+    yield _drain(sink)
+
+def _drain(sink: io.BytesIO) -> bytes:
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
+
+def stream_rows_response(batches: RowBatches, schema: pa.Schema, accept: Optional[str]) -> StreamingResponse:
+    """按Accept选择NDJSON或Arrow IPC流格式输出"""
+    if wants_arrow(accept):
+        return StreamingResponse(arrow_stream(batches, schema), media_type=ARROW_STREAM_MEDIA_TYPE)
+    return StreamingResponse(ndjson_stream(batches), media_type=NDJSON_MEDIA_TYPE)
@@ -0,0 +1,175 @@
+"""
+选考科目等级赋分
+按原始成绩从高到低把全体考生划入各等级，等级内按原始成绩线性转换到该等级的赋分区间：
+(Y2 - Y) / (Y - Y1) = (T2 - T) / (T - T1)，Y1、Y2为等级内原始成绩的最低、最高分，T1、T2为赋分区间，结果四舍五入取整
+赋分后重新计算总分的赋分成绩：非赋分科目取原始成绩，赋分科目取赋分成绩
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import Grade, Subject
+from .ranking_service import SuppliedKey
+from .subject_registry import subject_registry
+
+# 赋分等级：(等级, 人数比例%, 赋分下限, 赋分上限)，默认为湖南省选考科目等级赋分办法
+DEFAULT_SCALING_BANDS = [
+    ('A', 15, 86, 100),
+    ('B', 35, 71, 85),
+    ('C', 35, 56, 70),
+    ('D', 13, 41, 55),
+    ('E', 2, 30, 40),
+]
+
+TOTAL_SUBJECT = '总分'
+
+ScalingBand = Tuple[str, float, float, float]
+
+def load_scaling_bands(value: Optional[str] = None) -> List[ScalingBand]:
+    """
+    读取赋分等级，SCALING_BANDS为JSON数组，如[["A", 15, 86, 100], ...]，
+    等级按从高到低排列，人数比例之和为100
+    """
+    value = value if value is not None else os.getenv("SCALING_BANDS")
+    if not value:
+        return list(DEFAULT_SCALING_BANDS)
+    bands = [(str(name), float(share), float(low), float(high)) for name, share, low, high in json.loads(value)]
+    if abs(sum(share for _, share, _, _ in bands) - 100) > 1e-6:
+        raise ValueError("赋分等级的人数比例之和必须为100")
+    if any(low > high for _, _, low, high in bands):
+        raise ValueError("赋分区间的下限不能大于上限")
+    return bands
+
+SCALING_BANDS = load_scaling_bands()
+
+def compute_scaled_scores(scores: pd.Series, bands: List[ScalingBand] = SCALING_BANDS) -> pd.Series:
+    """
+    一个科目全体考生的原始成绩转换为赋分成绩，没有原始成绩的为空
+    考生的等级按排在其前面（分数更高）的人数所占比例确定，同分考生的等级相同
+    """
+    scores = scores.astype(float)
+    valid = scores.dropna()
+    scaled = pd.Series(np.nan, index=scores.index)
+    if valid.empty:
+        return scaled
+
+    above = (valid.rank(method='min', ascending=False) - 1) / len(valid)
+    cut_points = np.cumsum([share for _, share, _, _ in bands]) / 100
+    band = np.minimum(np.searchsorted(cut_points, above.to_numpy(), side='right'), len(bands) - 1)
+
+    band_low = np.array([low for _, _, low, _ in bands])[band]
+    band_high = np.array([high for _, _, _, high in bands])[band]
+    grouped = valid.groupby(band)
+    score_low = grouped.transform('min').to_numpy()
+    score_high = grouped.transform('max').to_numpy()
+
+    # 等级内只有一个分数时取赋分区间上限
+    span = score_high - score_low
+    ratio = np.divide(valid.to_numpy() - score_low, span, out=np.ones_like(span), where=span > 0)
+    scaled[valid.index] = np.floor(band_low + ratio * (band_high - band_low) + 0.5)
+    return scaled
+
+class ScalingService:
+    """计算考试中赋分科目的赋分成绩和总分的赋分成绩，按主键批量写回，不提交事务"""
+
+    def __init__(self, db: AsyncSession, batch_size: int = 5000, bands: Optional[List[ScalingBand]] = None):
+        self.db = db
+        self.batch_size = batch_size
+        self.bands = bands or SCALING_BANDS
+
+    async def scale_exam(self, exam_id: int, supplied: Optional[Set[SuppliedKey]] = None,
+                         overwrite: bool = True) -> Dict[str, int]:
+        """
+        为一场考试的赋分科目计算赋分成绩，并重新计算总分的赋分成绩
+        supplied中(科目ID, 'scaled_score')表示导入文件提供了该科目的赋分成绩，保持不变；
+        overwrite为False时只填补为空的赋分成绩
+        返回计算赋分的成绩数、更新的成绩数和写入的总分数
+        """
+        supplied = supplied or set()
+        result = await self.db.execute(
+            select(Grade.id, Grade.student_id, Grade.subject_id, Subject.name, Subject.is_scalable,
+                   Grade.original_score, Grade.scaled_score)
+            .join(Subject, Grade.subject_id == Subject.id)
+            .where(Grade.exam_id == exam_id)
+        )
+        grades = pd.DataFrame(result.all(), columns=['id', 'student_id', 'subject_id', 'subject_name',
+                                                     'is_scalable', 'original_score', 'scaled_score'])
+        counts = {"scaled": 0, "updated": 0, "totals": 0}
+        if grades.empty:
+            return counts
+        grades['original_score'] = grades['original_score'].astype(float)
+        grades['scaled_score'] = grades['scaled_score'].astype(float)
+
+        scalable = grades['is_scalable'].fillna(False).astype(bool) & ~grades['subject_id'].map(
+            lambda subject_id: (subject_id, 'scaled_score') in supplied
+        )
+        if not scalable.any():
+            return counts
+
+        scaled = grades.loc[scalable].groupby('subject_id', sort=False)['original_score'] \
+            .transform(lambda scores: compute_scaled_scores(scores, self.bands))
+        counts["scaled"] = int(scaled.notna().sum())
+        if not overwrite:
+            scaled = scaled.where(grades.loc[scalable, 'scaled_score'].isna(), grades.loc[scalable, 'scaled_score'])
+        counts["updated"] = await self._write_scaled(grades.loc[scalable], scaled)
+        grades.loc[scalable, 'scaled_score'] = scaled
+
+        total_subject_id = await subject_registry.get_id(TOTAL_SUBJECT)
+        if (total_subject_id, 'scaled_score') not in supplied:
+            counts["totals"] = await self._write_totals(exam_id, grades, total_subject_id, overwrite)
+        return counts
+
+    async def _write_scaled(self, grades: pd.DataFrame, scaled: pd.Series) -> int:
+        changed = ~((scaled == grades['scaled_score']) | (scaled.isna() & grades['scaled_score'].isna()))
+        updates = [
+            {'grade_id': int(grade_id), 'scaled_score': None if pd.isna(value) else float(value)}
+            for grade_id, value in zip(grades.loc[changed, 'id'].tolist(), scaled[changed].tolist())
+        ]
+        await self._update(updates)
+        return len(updates)
+
+    async def _write_totals(self, exam_id: int, grades: pd.DataFrame, total_subject_id: int,
+                            overwrite: bool) -> int:
+        """
+        总分的赋分成绩：非赋分科目的原始成绩加赋分科目的赋分成绩，只计算有赋分科目成绩的学生；
+        没有总分行的学生新增一行，原始总分为各科原始成绩之和
+        """
+        subjects = grades[grades['subject_id'] != total_subject_id]
+        is_scalable = subjects['is_scalable'].fillna(False).astype(bool)
+        contribution = subjects['scaled_score'].where(is_scalable, subjects['original_score'])
+        scaled_totals = contribution.groupby(subjects['student_id']).sum(min_count=1)
+        scaled_students = subjects.loc[is_scalable & subjects['scaled_score'].notna(), 'student_id'].unique()
+        scaled_totals = scaled_totals[scaled_totals.index.isin(scaled_students)]
+        original_totals = subjects['original_score'].groupby(subjects['student_id']).sum(min_count=1)
+
+        totals = grades[grades['subject_id'] == total_subject_id].set_index('student_id')
+        existing = scaled_totals[scaled_totals.index.isin(totals.index)]
+        current = totals.loc[existing.index, 'scaled_score']
+        changed = (existing.round(2) != current.round(2)) & (overwrite | current.isna())
+        updates = [
+            {'grade_id': int(grade_id), 'scaled_score': float(value)}
+            for grade_id, value in zip(totals.loc[existing.index[changed], 'id'].tolist(), existing[changed].tolist())
+        ]
+        await self._update(updates)
+
+        missing = scaled_totals[~scaled_totals.index.isin(totals.index)]
+        inserts = [
+            {'exam_id': exam_id, 'student_id': int(student_id), 'subject_id': total_subject_id,
+             'original_score': None if pd.isna(original_totals.get(student_id)) else float(original_totals[student_id]),
+             'scaled_score': float(value)}
+            for student_id, value in missing.items()
+        ]
+        for start in range(0, len(inserts), self.batch_size):
+            await self.db.execute(insert(Grade.__table__), inserts[start:start + self.batch_size])
+        return len(updates) + len(inserts)
+
+    async def _update(self, updates: List[Dict[str, Any]]) -> None:
+        grades_table = Grade.__table__
+        statement = grades_table.update().where(grades_table.c.id == bindparam("grade_id"))
+        for start in range(0, len(updates), self.batch_size):
+            await self.db.execute(statement, updates[start:start + self.batch_size])
@@ -0,0 +1,283 @@
+"""
+考试成绩统计服务
+按(考试, 科目, 成绩类型)计算整场考试、各学校、各班级的人数、平均分、标准差、最值、分位数和分段人数，
+写入exam_subject_stats表；导入、重新导入和修改成绩时在同一事务中重新计算，统计接口直接读取
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, delete, distinct, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..database.models import ExamSubjectStats, Grade, ScoreType, Student, Subject
+from .template_service import TemplateService
+
+# 统计的分位数：列名 -> 分位点
+STATS_QUANTILES = {'p10': 0.1, 'p25': 0.25, 'median': 0.5, 'p75': 0.75, 'p90': 0.9}
+
+# 分段人数按满分等分，满分以上的成绩计入最后一段
+HISTOGRAM_BINS = 10
+DEFAULT_FULL_MARK = 100
+
+# 成绩类型对应的分数列
+SCORE_TYPE_COLUMNS = {ScoreType.ORIGINAL: 'original_score', ScoreType.SCALED: 'scaled_score'}
+
+# 统计范围：exam整场考试，school各学校，class各班级
+STATS_SCOPES = ('exam', 'school', 'class')
+
+GROUP_COLUMNS = ['subject_id', 'school', 'current_class']
+
+# 成绩分布最多的分段数
+MAX_DISTRIBUTION_BINS = 200
+
+# 成绩分布的分组方式对应的学生列
+DISTRIBUTION_GROUPS = {
+    None: [],
+    'school': [Student.school],
+    'class': [Student.school, Student.current_class],
+}
+
+def distribution_edges(subject_name: str, edges: Optional[List[float]] = None,
+                       bin_width: Optional[float] = None) -> List[float]:
+    """
+    成绩分布的分段边界：给出edges时直接使用，否则按bin_width从0等分到满分，
+    都不给时与预计算统计一样分为HISTOGRAM_BINS段
+    """
+    if edges is not None:
+        if len(edges) < 2 or any(low >= high for low, high in zip(edges, edges[1:])):
+            raise ValueError("分段边界至少两个且必须递增")
+    else:
+        full_mark = float(TemplateService.FULL_MARKS.get(subject_name, DEFAULT_FULL_MARK))
+        if bin_width is None:
+            bin_width = full_mark / HISTOGRAM_BINS
+        if bin_width <= 0:
+            raise ValueError("分段宽度必须大于0")
+        count = int(np.ceil(full_mark / bin_width))
+        if count > MAX_DISTRIBUTION_BINS:
+            raise ValueError(f"分段数不能超过{MAX_DISTRIBUTION_BINS}")
+        edges = [min(index * bin_width, full_mark) for index in range(count + 1)]
+    if len(edges) - 1 > MAX_DISTRIBUTION_BINS:
+        raise ValueError(f"分段数不能超过{MAX_DISTRIBUTION_BINS}")
+    return [float(edge) for edge in edges]
+
+def _bin_expression(score, edges: List[float]):
+    """
+    成绩所在分段的序号，与numpy.histogram一致：各段左闭右开，最后一段两端都闭；
+    低于第一个边界为-1，高于最后一个边界为分段数
+    """
+    bins = len(edges) - 1
+    return case(
+        (score < edges[0], -1),
+        *((score < edge, index) for index, edge in enumerate(edges[1:-1])),
+        (score <= edges[-1], bins - 1),
+        else_=bins
+    )
+
+def exam_grades_query(exam_id: int):
+    """计算统计所需的成绩：科目、学生当前的学校和班级、原始成绩和赋分成绩"""
+    return (
+        select(Grade.subject_id, Subject.name.label('subject_name'),
+               Student.school, Student.current_class,
+               Grade.original_score, Grade.scaled_score)
+        .join(Student, Grade.student_id == Student.id)
+        .join(Subject, Grade.subject_id == Subject.id)
+        .where(Grade.exam_id == exam_id)
+    )
+
+def compute_exam_subject_stats(exam_id: int, rows: Iterable[Any]) -> List[Dict[str, Any]]:
+    """
+    由exam_grades_query的结果计算统计行，返回可以直接写入exam_subject_stats的字典列表
+    三个范围拼接后一次分组计算：整场考试的学校和班级为空字符串，学校范围的班级为空字符串；
+    没有班级的学生只计入整场考试和学校范围
+    """
+    grades = pd.DataFrame(list(rows), columns=['subject_id', 'subject_name', 'school', 'current_class',
+                                               'original_score', 'scaled_score'])
+    if grades.empty:
+        return []
+    grades['school'] = grades['school'].fillna('')
+    grades['current_class'] = grades['current_class'].fillna('')
+    full_marks = grades['subject_name'].map(TemplateService.FULL_MARKS).fillna(DEFAULT_FULL_MARK).astype(float)
+
+    updated_at = datetime.now()
+    stats_rows = []
+    for score_type, score_column in SCORE_TYPE_COLUMNS.items():
+        scores = grades[['subject_id', 'school', 'current_class']].assign(
+            score=grades[score_column].astype(float),
+            bin_width=full_marks / HISTOGRAM_BINS
+        )
+        scores = scores[scores['score'].notna()]
+        if scores.empty:
+            continue
+
+        scoped = pd.concat([
+            scores.assign(school='', current_class=''),
+            scores.assign(current_class=''),
+            scores[scores['current_class'] != '']
+        ], ignore_index=True)
+        scoped['bin'] = np.clip(np.floor(scoped['score'] / scoped['bin_width']), 0, HISTOGRAM_BINS - 1).astype(int)
+
+        grouped = scoped.groupby(GROUP_COLUMNS, sort=False)
+        summary = grouped['score'].agg(['count', 'mean', 'min', 'max'])
+        summary['std'] = grouped['score'].std(ddof=0)
+        summary['bin_width'] = grouped['bin_width'].first()
+        quantiles = grouped['score'].quantile(list(STATS_QUANTILES.values())).unstack()
+        quantiles.columns = list(STATS_QUANTILES)
+        histograms = scoped.groupby(GROUP_COLUMNS + ['bin'], sort=False).size() \
+            .unstack(fill_value=0).reindex(columns=range(HISTOGRAM_BINS), fill_value=0)
+        summary = summary.join(quantiles).join(histograms)
+
+        for (subject_id, school, current_class), stats in summary.iterrows():
+            stats_rows.append({
+                'exam_id': exam_id,
+                'subject_id': int(subject_id),
+                'score_type': score_type,
+                'school': school,
+                'current_class': current_class,
+                'count': int(stats['count']),
+                'mean': round(float(stats['mean']), 4),
+                'std': round(float(stats['std']), 4),
+                'min_score': float(stats['min']),
+                'max_score': float(stats['max']),
+                **{name: round(float(stats[name]), 4) for name in STATS_QUANTILES},
+                'histogram': json.dumps({
+                    'bin_width': float(stats['bin_width']),
+                    'counts': [int(stats[bin_index]) for bin_index in range(HISTOGRAM_BINS)]
+                }),
+                'updated_at': updated_at
+            })
+    return stats_rows
+
+class ExamStatsService:
+    """考试成绩统计的计算和查询，计算结果只写入当前事务，由调用方提交"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def refresh_exam(self, exam_id: int) -> int:
+        """重新计算一场考试的统计，返回统计行数"""
+        result = await self.db.execute(exam_grades_query(exam_id))
+        stats_rows = compute_exam_subject_stats(exam_id, result.all())
+
+        await self.delete_exam_stats(exam_id)
+        if stats_rows:
+            await self.db.execute(insert(ExamSubjectStats.__table__), stats_rows)
+        return len(stats_rows)
+
+    async def refresh_student_exams(self, student_id: int) -> List[int]:
+        """重新计算学生参加过的考试的统计（学生的成绩、学校或班级变化后），返回考试ID"""
+        result = await self.db.execute(
+            select(distinct(Grade.exam_id)).where(Grade.student_id == student_id)
+        )
+        exam_ids = list(result.scalars())
+        for exam_id in exam_ids:
+            await self.refresh_exam(exam_id)
+        return exam_ids
+
+    async def delete_exam_stats(self, exam_id: int) -> None:
+        await self.db.execute(delete(ExamSubjectStats).where(ExamSubjectStats.exam_id == exam_id))
+
+    async def get_exam_stats(self, exam_id: int, subject_name: Optional[str] = None,
+                             score_type: Optional[ScoreType] = None, scope: str = 'exam',
+                             school: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        查询考试统计，scope为exam时返回整场考试，为school时返回各学校，为class时返回各班级
+        school用于只查询某所学校（及其各班级）的统计
+        """
+        conditions = [ExamSubjectStats.exam_id == exam_id]
+        if subject_name:
+            conditions.append(Subject.name == subject_name)
+        if score_type:
+            conditions.append(ExamSubjectStats.score_type == score_type)
+        if scope == 'exam':
+            conditions.append(ExamSubjectStats.school == '')
+        else:
+            conditions.append(ExamSubjectStats.school != '')
+            conditions.append(ExamSubjectStats.current_class == '' if scope == 'school'
+                              else ExamSubjectStats.current_class != '')
+        if school is not None and scope != 'exam':
+            conditions.append(ExamSubjectStats.school == school)
+
+        result = await self.db.execute(
+            select(ExamSubjectStats, Subject.name)
+            .join(Subject, ExamSubjectStats.subject_id == Subject.id)
+            .where(and_(*conditions))
+            .order_by(Subject.name, ExamSubjectStats.score_type,
+                      ExamSubjectStats.school, ExamSubjectStats.current_class)
+        )
+
+        stats = []
+        for row, subject_name in result:
+            stats.append({
+                'subject_name': subject_name,
+                'score_type': row.score_type.value,
+                'school': row.school or None,
+                'current_class': row.current_class or None,
+                'count': row.count,
+                'mean': row.mean,
+                'std': row.std,
+                'min_score': row.min_score,
+                'max_score': row.max_score,
+                **{name: getattr(row, name) for name in STATS_QUANTILES},
+                'histogram': json.loads(row.histogram) if row.histogram else None,
+                'updated_at': row.updated_at
+            })
+        return stats
+
+    async def get_score_distribution(self, exam_id: int, subject_name: str, score_type: ScoreType = ScoreType.ORIGINAL,
+                                     edges: Optional[List[float]] = None, bin_width: Optional[float] = None,
+                                     group_by: Optional[str] = None, school: Optional[str] = None) -> Dict[str, Any]:
+        """
+        按分段统计一场考试某科目的人数，在一条分组查询中完成，不读取成绩明细
+        group_by为school时按学校、为class时按班级分组，否则为整场考试；超出边界的成绩计入below和above
+        """
+        edges = distribution_edges(subject_name, edges, bin_width)
+        bins = len(edges) - 1
+        score = getattr(Grade, SCORE_TYPE_COLUMNS[score_type])
+        bin_index = _bin_expression(score, edges).label('bin')
+        group_columns = DISTRIBUTION_GROUPS[group_by]
+
+        conditions = [Grade.exam_id == exam_id, Subject.name == subject_name, score.isnot(None)]
+        if school:
+            conditions.append(Student.school == school)
+        query = (
+            select(*group_columns, bin_index, func.count().label('count'))
+            .select_from(Grade)
+            .join(Subject, Grade.subject_id == Subject.id)
+            .where(and_(*conditions))
+            .group_by(*group_columns, bin_index)
+        )
+        if group_columns or school:
+            query = query.join(Student, Grade.student_id == Student.id)
+        result = await self.db.execute(query)
+
+        groups: Dict[tuple, Dict[str, Any]] = {}
+        for row in result:
+            key = tuple(row[:len(group_columns)])
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = {
+                    'school': row.school if group_by else None,
+                    'current_class': row.current_class if group_by == 'class' else None,
+                    'counts': [0] * bins,
+                    'below': 0,
+                    'above': 0,
+                    'total': 0
+                }
+            if row.bin < 0:
+                group['below'] += row.count
+            elif row.bin >= bins:
+                group['above'] += row.count
+            else:
+                group['counts'][row.bin] += row.count
+            group['total'] += row.count
+
+        return {
+            'exam_id': exam_id,
+            'subject_name': subject_name,
+            'score_type': score_type.value,
+            'edges': edges,
+            'groups': [groups[key] for key in sorted(groups, key=lambda key: tuple(value or '' for value in key))]
+        }
@@ -1,14 +1,23 @@
-from typing import List, Optional, Dict, Any
+import os
+from typing import List, Optional, Dict, Any, Iterable, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, delete
+from sqlalchemy import select, insert, update, and_, func, delete, tuple_
 from sqlalchemy.orm import selectinload
 
 from ..database.models import Student, ExamType
-from ..schemas.student import StudentCreate, StudentResponse, StudentUpdate
+from ..schemas.student import StudentBase, StudentCreate, StudentResponse, StudentUpdate
+from .stats_service import ExamStatsService
+
+# 多行INSERT保留空值列，空值分布不同的行也在同一条语句中写入
+STUDENT_INSERT = insert(Student).execution_options(render_nulls=True)
 
 class StudentService:
+    # 按键批量查询学生时每条语句的键数，每个键占2~3个绑定参数，需低于SQLite的参数上限和MySQL的max_allowed_packet
+    STUDENT_LOOKUP_BATCH_SIZE = int(os.getenv("STUDENT_LOOKUP_BATCH_SIZE", "300"))
+    
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.stats_service = ExamStatsService(db)
     
     async def create_student(self, student_data: StudentCreate) -> Student:
         """创建学生"""
@@ -27,36 +36,111 @@ class StudentService:
         )
         return result.scalar_one_or_none()
     
-    async def upsert_student(self, student_data: StudentCreate) -> Student:
-        """插入或更新学生信息"""
-        existing_student = await self.get_student_by_name_school(
-            student_data.name, student_data.school
+    async def bulk_import_students(self, students_data: List[StudentBase]) -> Dict[str, int]:
+        """
+        批量导入学生名单，一次查询匹配已有学生，多行INSERT/UPDATE写入，在一个事务中提交
+        匹配规则见_upsert_by_school_name
+        返回 inserted新增、updated更新、unchanged未变化 的人数
+        """
+        merged = self._merge_students(student.dict() for student in students_data)
+        if not merged:
+            return {"inserted": 0, "updated": 0, "unchanged": 0}
+        
+        try:
+            _, counts = await self._upsert_by_school_name(merged)
+            await self.db.commit()
+        except Exception:
+            await self.db.rollback()
+            raise
+        return counts
+    
+    async def _upsert_by_school_name(self, merged: Dict[Tuple[str, str, str], Dict[str, Any]]
+                                     ) -> Tuple[Dict[Tuple[str, str, str], int], Dict[str, int]]:
+        """
+        按(学校, 姓名)匹配已有学生并写入，不提交事务
+        同校同名的学生用班级区分：优先匹配同班学生，
+        同校只有一名同名学生时视为同一人（班级变化时更新班级），否则作为新学生插入
+        为空的字段（包括空班级）不覆盖已有学生的值，没有班级的新学生班级为空字符串
+        返回 (学校, 班级, 姓名) -> 学生ID 映射和各类人数
+        """
+        existing = await self._load_students_by_school_name(
+            list({(school, name) for school, _, name in merged})
         )
         
-        if existing_student:
-            # 更新现有学生信息
-            for key, value in student_data.dict().items():
-                if value is not None:
-                    setattr(existing_student, key, value)
-            student = existing_student
-        else:
-            # 创建新学生
-            student = Student(**student_data.dict())
-            self.db.add(student)
+        # 先匹配同班的同名学生，再匹配同校唯一的同名学生，每名已有学生只匹配一次
+        matches: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        claimed = set()
+        for key in merged:
+            school, current_class, name = key
+            for row in existing.get((school, name), []):
+                if row['current_class'] == current_class and row['id'] not in claimed:
+                    matches[key] = row
+                    claimed.add(row['id'])
+                    break
+        for key in merged:
+            candidates = existing.get((key[0], key[2]), [])
+            if key not in matches and len(candidates) == 1 and candidates[0]['id'] not in claimed:
+                matches[key] = candidates[0]
+                claimed.add(candidates[0]['id'])
         
-        await self.db.commit()
-        await self.db.refresh(student)
-        return student
-    
-    async def bulk_import_students(self, students_data: List[StudentCreate]) -> int:
-        """批量导入学生"""
-        imported_count = 0
+        # 已有学生：非空字段有变化时按主键批量更新
+        updatable_fields = ('current_class', 'grade_level', 'exam_type', 'subject_combination')
+        updates = []
+        for key, row in matches.items():
+            student = merged[key]
+            values = {
+                field: student[field] if student[field] not in (None, '') else row[field]
+                for field in updatable_fields
+            }
+            if any(getattr(values[field], 'value', values[field]) != getattr(row[field], 'value', row[field])
+                   for field in updatable_fields):
+                updates.append({'id': row['id'], **values})
+        if updates:
+            await self.db.execute(update(Student), updates)
         
-        for student_data in students_data:
-            await self.upsert_student(student_data)
-            imported_count += 1
+        # 新学生：多行INSERT，再按(学校, 姓名)回查生成的ID
+        student_ids = {key: row['id'] for key, row in matches.items()}
+        inserts = [
+            {**student, 'current_class': student['current_class'] or ''}
+            for key, student in merged.items() if key not in matches
+        ]
+        if inserts:
+            await self.db.execute(STUDENT_INSERT, inserts)
+            known_ids = {row['id'] for rows in existing.values() for row in rows}
+            inserted = await self._load_students_by_school_name(
+                list({(student['school'], student['name']) for student in inserts})
+            )
+            for key in merged:
+                if key in student_ids:
+                    continue
+                school, current_class, name = key
+                for row in inserted.get((school, name), []):
+                    if row['id'] not in known_ids and row['current_class'] == (current_class or ''):
+                        student_ids[key] = row['id']
+                        known_ids.add(row['id'])
+                        break
         
-        return imported_count
+        return student_ids, {
+            "inserted": len(inserts),
+            "updated": len(updates),
+            "unchanged": len(matches) - len(updates)
+        }
+    
+    async def _load_students_by_school_name(self, keys: List[Tuple[str, str]]) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """按(学校, 姓名)分批查询学生，同校同名的学生按ID排序"""
+        students: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for start in range(0, len(keys), self.STUDENT_LOOKUP_BATCH_SIZE):
+            result = await self.db.execute(
+                select(
+                    Student.id, Student.school, Student.current_class, Student.name,
+                    Student.grade_level, Student.exam_type, Student.subject_combination
+                ).where(
+                    tuple_(Student.school, Student.name).in_(keys[start:start + self.STUDENT_LOOKUP_BATCH_SIZE])
+                ).order_by(Student.id)
+            )
+            for row in result:
+                students.setdefault((row.school, row.name), []).append(dict(row._mapping))
+        return students
     
     async def get_students_by_school(self, school: str) -> List[Student]:
         """获取某学校的所有学生"""
@@ -128,10 +212,17 @@ class StudentService:
         
         # 更新字段
         update_data = student_update.dict(exclude_unset=True)
+        moved = False
         for key, value in update_data.items():
             if value is not None:
+                if key in ('school', 'current_class') and getattr(student, key) != value:
+                    moved = True
                 setattr(student, key, value)
         
+        # 学校或班级变化后，学生参加过的考试的学校和班级统计随之变化
+        if moved:
+            await self.db.flush()
+            await self.stats_service.refresh_student_exams(student_id)
         await self.db.commit()
         await self.db.refresh(student)
         return student
@@ -145,11 +236,18 @@ class StudentService:
         try:
             # 删除相关成绩记录
             from ..database.models import Grade
+            exam_ids = (await self.db.execute(
+                select(Grade.exam_id).where(Grade.student_id == student_id).distinct()
+            )).scalars().all()
             await self.db.execute(delete(Grade).where(Grade.student_id == student_id))
             
             # 删除学生记录
             await self.db.execute(delete(Student).where(Student.id == student_id))
             
+            # 重新计算学生参加过的考试的统计
+            for exam_id in exam_ids:
+                await self.stats_service.refresh_exam(exam_id)
+            
             await self.db.commit()
             return True
         except Exception:
@@ -169,23 +267,81 @@ class StudentService:
         )
         return result.scalar_one_or_none()
     
-    async def upsert_student_by_class_name(self, student_data: StudentCreate) -> Student:
-        """按班级+姓名插入或更新学生信息"""
-        existing_student = await self.get_student_by_class_name(
-            student_data.school, student_data.current_class, student_data.name
-        )
+    @staticmethod
+    def make_student_key(school: str, current_class: str, name: str) -> str:
+        """生成学生唯一键，与模板数据中的student_key格式一致"""
+        return f"{school}_{current_class}_{name}"
+    
+    async def bulk_resolve_students(self, students_data: List[Dict[str, Any]],
+                                    match_by_name: bool = False) -> Dict[str, int]:
+        """
+        按学校+班级+姓名批量解析学生，返回 student_key -> 学生ID 映射
+        一次查询加载已有学生，缺失的学生用多行INSERT写入，不在此处提交事务
+        match_by_name为True时按学校+姓名匹配，规则与学生名单导入相同（见_upsert_by_school_name）
+        """
+        merged = self._merge_students(StudentCreate(**student_info).dict() for student_info in students_data)
+        if not merged:
+            return {}
+        if match_by_name:
+            student_ids, _ = await self._upsert_by_school_name(merged)
+            return {self.make_student_key(*key): student_id for key, student_id in student_ids.items()}
         
-        if existing_student:
-            # 更新现有学生信息
-            for key, value in student_data.dict().items():
-                if value is not None:
-                    setattr(existing_student, key, value)
-            student = existing_student
-        else:
-            # 创建新学生
-            student = Student(**student_data.dict())
-            self.db.add(student)
+        # 一次查询加载所有已存在的学生
+        existing = await self._load_students_by_keys(list(merged.keys()))
         
-        await self.db.commit()
-        await self.db.refresh(student)
-        return student
\ No newline at end of file
+        # 已存在学生：非空字段有变化时批量更新
+        updatable_fields = ('grade_level', 'exam_type', 'subject_combination')
+        updates = []
+        for key, row in existing.items():
+            student = merged[key]
+            changes = {
+                field: student[field] for field in updatable_fields
+                if student[field] is not None
+                and getattr(student[field], 'value', student[field]) != getattr(row[field], 'value', row[field])
+            }
+            if changes:
+                updates.append({'id': row['id'], **{field: changes.get(field, row[field]) for field in updatable_fields}})
+        if updates:
+            await self.db.execute(update(Student), updates)
+        
+        # 缺失学生：多行INSERT，再回查生成的ID
+        missing = [student for key, student in merged.items() if key not in existing]
+        if missing:
+            await self.db.execute(STUDENT_INSERT, missing)
+            existing.update(await self._load_students_by_keys(
+                [(s['school'], s['current_class'], s['name']) for s in missing]
+            ))
+        
+        return {
+            self.make_student_key(*key): row['id'] for key, row in existing.items()
+        }
+    
+    def _merge_students(self, students: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """按(学校, 班级, 姓名)合并同一学生的重复记录，后出现的非空字段覆盖前面的值"""
+        merged: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for student in students:
+            key = (student['school'], student['current_class'], student['name'])
+            if key in merged:
+                merged[key].update({k: v for k, v in student.items() if v is not None})
+            else:
+                merged[key] = student
+        return merged
+    
+    async def _load_students_by_keys(self, keys: List[Tuple[str, str, str]]) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """按(学校, 班级, 姓名)分批查询学生，重复记录取ID最小的一条"""
+        students = {}
+        for start in range(0, len(keys), self.STUDENT_LOOKUP_BATCH_SIZE):
+            result = await self.db.execute(
+                select(
+                    Student.id, Student.school, Student.current_class, Student.name,
+                    Student.grade_level, Student.exam_type, Student.subject_combination
+                ).where(
+                    tuple_(Student.school, Student.current_class, Student.name)
+                    .in_(keys[start:start + self.STUDENT_LOOKUP_BATCH_SIZE])
+                ).order_by(Student.id)
+            )
+            for row in result:
+                key = (row.school, row.current_class, row.name)
+                if key not in students:
+                    students[key] = dict(row._mapping)
+        return students
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""
+科目注册表
+进程内缓存科目名称到ID的映射，导入时直接从内存解析科目
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, Optional
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+
+from ..database.models import AsyncSessionLocal, Subject, SCALABLE_SUBJECTS
+
+class SubjectRegistry:
+    """进程级科目注册表"""
+    
+    # 缺失科目并发创建冲突时的最大重试次数
+    MAX_CREATE_ATTEMPTS = 3
+    
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl  # 缓存有效期（秒），多进程部署时用于同步其他进程新建的科目
+        self._ids: Dict[str, int] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+    
+    async def load(self) -> None:
+        """从数据库加载全部科目（应用启动时调用）"""
+        async with self._lock:
+            await self._reload()
+    
+    def invalidate(self) -> None:
+        """使缓存失效，下次解析时重新从数据库加载"""
+        self._loaded_at = None
+    
+    async def resolve(self, names: Iterable[str]) -> Dict[str, int]:
+        """批量解析科目名称为ID，缺失的科目一次性创建"""
+        names = set(names)
+        if not self._is_stale() and names <= self._ids.keys():
+            return {name: self._ids[name] for name in names}
+        
+        # 加锁后再检查一次，避免并发导入重复创建同名科目
+        async with self._lock:
+            if self._is_stale():
+                await self._reload()
+            
+            for _ in range(self.MAX_CREATE_ATTEMPTS):
+                missing = names - self._ids.keys()
+                if not missing:
+                    break
+                await self._create(missing)
+                await self._reload()
+            else:
+                raise RuntimeError(f"科目创建失败: {', '.join(sorted(names - self._ids.keys()))}")
+            
+            return {name: self._ids[name] for name in names}
+    
+    async def get_id(self, name: str) -> int:
+        """解析单个科目名称为ID"""
+        return (await self.resolve([name]))[name]
+    
+    def _is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl
+    
+    async def _reload(self) -> None:
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(select(Subject.id, Subject.name))
+            self._ids = {row.name: row.id for row in result}
+        self._loaded_at = time.monotonic()
+    
+    async def _create(self, names: Iterable[str]) -> None:
+        # 科目属于基础数据，使用独立会话立即提交，不依赖调用方事务
+        async with AsyncSessionLocal() as session:
+            try:
+                await session.execute(insert(Subject), [
+                    {'name': name, 'is_scalable': name in SCALABLE_SUBJECTS} for name in sorted(names)
+                ])
+                await session.commit()
+            except IntegrityError:
+                # 其他进程已创建了同名科目，重新加载即可
+                await session.rollback()
+
+_ttl = os.getenv("SUBJECT_REGISTRY_TTL", "300")
+subject_registry = SubjectRegistry(ttl=float(_ttl) if _ttl else None)
@@ -2,10 +2,12 @@
 标准模板导入服务
 支持预定义的Excel模板格式，自动识别和导入
 """
-from typing import Dict, List, Optional, Tuple
-import pandas as pd
 import re
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
 from ..schemas.exam import ExamType, ExamLevel, ScoreType
+from .column_classifier import RANK_PATTERNS, template_classifier
 
 class TemplateService:
     """标准模板导入服务"""
@@ -38,10 +40,40 @@ class TemplateService:
     }
     
     # 排名列识别模式
-    RANK_PATTERNS = {
-        'school': r'校.*排.*名?|学校.*排.*名?',
-        'city': r'市.*排.*名?|地市.*排.*名?',
-        'province': r'省.*排.*名?|全省.*排.*名?'
+    RANK_PATTERNS = RANK_PATTERNS
+    
+    # 系统支持的科目英文名
+    SUBJECT_KEYS = ['chinese', 'math', 'english', 'physics', 'chemistry', 'biology',
+                    'history', 'geography', 'politics', 'total_score']
+    
+    # 每个科目关联的排名字段
+    RANK_FIELDS = ['rank_school', 'rank_city', 'rank_province',
+                   'scaled_rank_school', 'scaled_rank_city', 'scaled_rank_province']
+    
+    # 处理结果中的学生字段和成绩字段
+    STUDENT_FIELDS = ['name', 'school', 'current_class', 'grade_level', 'subject_combination']
+    GRADE_FIELDS = ['student_key', 'subject_name', 'score_type', 'score'] + RANK_FIELDS
+    
+    # 成绩和排名中视为空值的文本
+    NULL_TOKENS = ['-', '', 'nan', 'NaN']
+    
+    # 各科满分，原始成绩和赋分成绩都不应超过
+    FULL_MARKS = {
+        '语文': 150, '数学': 150, '英语': 150,
+        '物理': 100, '历史': 100,
+        '化学': 100, '生物': 100, '地理': 100, '政治': 100,
+        '总分': 750
+    }
+    
+    # 映射后的排名字段名，如 chemistry_scaled_rank_school
+    RANK_FIELD_PATTERN = re.compile(r'^(?P<subject>.+?)_(?:scaled_)?rank_(?:school|city|province)$')
+    
+    # 逐单元格校验的错误类型
+    VALIDATION_ERRORS = {
+        'non_numeric': '成绩不是数字',
+        'out_of_range': '成绩超出0到满分的范围',
+        'invalid_rank': '排名不是不小于1的整数',
+        'duplicate_student': '学校、班级、姓名与前面的行重复'
     }
     
     def __init__(self):
@@ -52,107 +84,9 @@ class TemplateService:
         检测模板类型和列映射
         返回: (考试类型, 列映射字典)
         """
-        columns = df.columns.tolist()
-        column_mapping = {}
-        
-        # 检测考试类型
-        has_physics = any('物理' in col for col in columns)
-        has_history = any('历史' in col for col in columns)
-        
-        if has_physics and not has_history:
-            exam_type = ExamType.PHYSICS
-        elif has_history and not has_physics:
-            exam_type = ExamType.HISTORY
-        else:
-            # 默认物理类，或者根据数据量判断
-            exam_type = ExamType.PHYSICS
-        
-        # 基础列映射
-        for col in columns:
-            col_clean = col.strip()
-            
-            # 直接匹配标准列名
-            if col_clean in self.STANDARD_COLUMNS:
-                column_mapping[col] = self.STANDARD_COLUMNS[col_clean]
-                continue
-            
-            # 模糊匹配学生信息
-            if '姓名' in col_clean or '学生' in col_clean:
-                column_mapping[col] = 'name'
-            elif '学校' in col_clean:
-                column_mapping[col] = 'school'
-            elif '班级' in col_clean:
-                column_mapping[col] = 'current_class'
-            elif '年级' in col_clean:
-                column_mapping[col] = 'grade_level'
-            
-            # 科目成绩匹配
-            elif self._is_subject_score_column(col_clean):
-                subject, score_type, rank_type = self._parse_subject_column(col_clean)
-                if subject:
-                    if rank_type:
-                        column_mapping[col] = f"{subject}_{rank_type}"
-                    elif score_type:
-                        column_mapping[col] = f"{subject}_{score_type}_score"
-                    else:
-                        column_mapping[col] = f"{subject}_original_score"
-        
-        return exam_type, column_mapping
-    
-    def _is_subject_score_column(self, col_name: str) -> bool:
-        """判断是否为科目成绩列"""
-        subjects = ['语文', '数学', '英语', '物理', '化学', '生物', '历史', '地理', '政治', '总分']
-        return any(subject in col_name for subject in subjects)
-    
-    def _parse_subject_column(self, col_name: str) -> Tuple[Optional[str], Optional[str], Optional[str]]:
-        """
-        解析科目列名
-        返回: (科目名, 成绩类型, 排名类型)
-        """
-        # 科目映射
-        subject_map = {
-            '语文': 'chinese',
-            '数学': 'math', 
-            '英语': 'english',
-            '物理': 'physics',
-            '化学': 'chemistry',
-            '生物': 'biology',
-            '历史': 'history',
-            '地理': 'geography',
-            '政治': 'politics',
-            '总分': 'total_score'
-        }
-        
-        subject = None
-        score_type = None
-        rank_type = None
-        
-        # 识别科目
-        for chinese_name, english_name in subject_map.items():
-            if chinese_name in col_name:
-                subject = english_name
-                break
-        
-        if not subject:
-            return None, None, None
-        
-        # 识别排名类型
-        for rank_key, pattern in self.RANK_PATTERNS.items():
-            if re.search(pattern, col_name):
-                # 检查是否为赋分排名
-                if '赋分' in col_name or '等级' in col_name:
-                    rank_type = f"scaled_rank_{rank_key}"
-                else:
-                    rank_type = f"rank_{rank_key}"
-                break
-        
-        # 识别成绩类型
-        if '赋分' in col_name or '等级' in col_name:
-            score_type = 'scaled'
-        elif '原始' in col_name:
-            score_type = 'original'
-        
-        return subject, score_type, rank_type
+        # 同一来源的表头相同，分类结果按表头缓存
+        exam_type, column_mapping = template_classifier.template_mapping(tuple(df.columns))
+        return exam_type, dict(column_mapping)
     
     def validate_template(self, df: pd.DataFrame, column_mapping: Dict[str, str]) -> List[str]:
         """
@@ -182,82 +116,78 @@ class TemplateService:
         
         return errors
     
-    def process_template_data(self, df: pd.DataFrame, column_mapping: Dict[str, str], 
-                             subject_combination: Optional[str] = None) -> Dict:
+    def validate_frame(self, df: pd.DataFrame, column_mapping: Dict[str, str]) -> pd.DataFrame:
         """
-        处理模板数据，转换为标准格式
+        整列校验数据块的单元格：成绩是否为数字、是否在0到满分之间，排名是否为不小于1的整数
+        返回错误表，每行是一个出错的单元格(row, column, value, error)，按行号排序，
+        row为数据行号（从1开始，不含表头）
         """
-        # 重命名列
-        df_mapped = df.rename(columns=column_mapping)
-        
-        # 数据清洗
-        df_mapped = self._clean_data(df_mapped)
-        
-        # 分离学生信息和成绩信息
-        student_fields = ['name', 'school', 'current_class', 'grade_level']
-        students_data = []
-        grades_data = []
+        rows = df.index.to_numpy() + 1
+        errors = []
         
-        for _, row in df_mapped.iterrows():
-            if pd.isna(row.get('name')):
+        def add_errors(column, mask, error):
+            if mask.any():
+                errors.append(pd.DataFrame({
+                    'row': rows[mask],
+                    'column': column,
+                    'value': df[column].to_numpy(dtype=object)[mask],
+                    'error': error
+                }))
+        
+        for column, field in column_mapping.items():
+            if column not in df.columns:
+                continue
+            
+            score_field = self._parse_score_field(field)
+            if not score_field and not self.RANK_FIELD_PATTERN.match(field):
                 continue
-                
-            # 学生信息
-            student_info = {
-                'name': self._safe_str_convert(row.get('name', '')),
-                'school': self._safe_str_convert(row.get('school', '未知学校')),
-                'current_class': self._safe_str_convert(row.get('current_class', '')),
-                'grade_level': self._safe_str_convert(row.get('grade_level', '')) if pd.notna(row.get('grade_level')) else None,
-                'subject_combination': subject_combination  # 添加选科组合
-            }
-            students_data.append(student_info)
             
-            # 成绩信息
-            student_grades = []
-            for col, value in row.items():
-                # 只处理真正的成绩字段，排除排名字段
-                if (col.endswith('_score') or col.endswith('_original_score') or col.endswith('_scaled_score')) and pd.notna(value):
-                    # 确保不是排名字段
-                    if any(rank_word in col for rank_word in ['rank_', '_rank']):
-                        continue
-                        
-                    # 解析科目和成绩类型
-                    if col.endswith('_original_score'):
-                        subject_name = col.replace('_original_score', '')
-                        score_type = 'original'
-                    elif col.endswith('_scaled_score'):
-                        subject_name = col.replace('_scaled_score', '')
-                        score_type = 'scaled'
-                    elif col.endswith('_score'):
-                        subject_name = col.replace('_score', '')
-                        score_type = 'original'  # 默认为原始成绩
-                    else:
-                        continue
-                    
-                    # 转换科目名称
-                    subject_chinese = self._get_chinese_subject_name(subject_name)
-                    
-                    # 跳过无效的科目名称
-                    if subject_chinese == subject_name and subject_name not in ['chinese', 'math', 'english', 'physics', 'chemistry', 'biology', 'history', 'geography', 'politics', 'total_score']:
-                        continue
-                    
-                    grade_info = {
-                        'student_key': f"{student_info['school']}_{student_info['current_class']}_{student_info['name']}",
-                        'subject_name': subject_chinese,
-                        'score_type': score_type,
-                        'score': self._safe_float_convert(value),
-                        # 原始排名
-                        'rank_school': self._get_rank_value(row, f"{subject_name}_rank_school"),
-                        'rank_city': self._get_rank_value(row, f"{subject_name}_rank_city"),
-                        'rank_province': self._get_rank_value(row, f"{subject_name}_rank_province"),
-                        # 赋分排名
-                        'scaled_rank_school': self._get_rank_value(row, f"{subject_name}_scaled_rank_school"),
-                        'scaled_rank_city': self._get_rank_value(row, f"{subject_name}_scaled_rank_city"),
-                        'scaled_rank_province': self._get_rank_value(row, f"{subject_name}_scaled_rank_province")
-                    }
-                    student_grades.append(grade_info)
+            # 空值和空值文本不算错误
+            values, blank = self._parse_float_array(df[column])
+            present = ~blank
+            numeric = ~np.isnan(values)
             
-            grades_data.extend(student_grades)
+            with np.errstate(invalid='ignore'):
+                if score_field:
+                    add_errors(column, present & ~numeric, 'non_numeric')
+                    full_mark = self.FULL_MARKS.get(score_field[1])
+                    if full_mark is not None:
+                        add_errors(column, numeric & ((values < 0) | (values > full_mark)), 'out_of_range')
+                else:
+                    valid_rank = numeric & (values >= 1) & (values == np.trunc(values))
+                    add_errors(column, present & ~valid_rank, 'invalid_rank')
+        
+        if not errors:
+            return pd.DataFrame(columns=ValidationReport.COLUMNS)
+        return pd.concat(errors, ignore_index=True).sort_values('row', kind='stable', ignore_index=True)
+    
+    def student_keys(self, df: pd.DataFrame, column_mapping: Dict[str, str]) -> pd.Series:
+        """按导入时的规则生成学生键（学校_班级_姓名），姓名为空的行不包含在内"""
+        fields = {field: column for column, field in column_mapping.items() if column in df.columns}
+        if 'name' not in fields:
+            return pd.Series([], dtype=object)
+        
+        def text(field, default):
+            if field not in fields:
+                return pd.Series(default, index=df.index, dtype=object)
+            column = df[fields[field]]
+            return column.astype(str).str.strip().astype(object).where(column.notna(), '')
+        
+        keys = text('school', '未知学校') + '_' + text('current_class', '') + '_' + text('name', '')
+        return keys[df[fields['name']].notna().to_numpy()]
+    
+    def process_template_data(self, df: pd.DataFrame, column_mapping: Dict[str, str], 
+                             subject_combination: Optional[str] = None) -> Dict:
+        """
+        处理模板数据，转换为标准格式
+        """
+        students_frame, grades_frame = self.process_template_frame(df, column_mapping, subject_combination)
+        return self.to_processed_data(students_frame, grades_frame)
+    
+    def to_processed_data(self, students_frame: pd.DataFrame, grades_frame: pd.DataFrame) -> Dict:
+        """把列式处理结果转换为导入使用的字典格式"""
+        students_data = self._frame_to_records(students_frame)
+        grades_data = self._frame_to_records(grades_frame)
         
         return {
             'students': students_data,
@@ -266,6 +196,183 @@ class TemplateService:
             'total_grades': len(grades_data)
         }
     
+    def process_template_frame(self, df: pd.DataFrame, column_mapping: Dict[str, str],
+                               subject_combination: Optional[str] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        列式处理模板数据：整列转换分数和排名，再把宽表展开为长表
+        返回: (学生表, 成绩表)，成绩表每行对应一个(学生, 科目, 成绩类型)
+        """
+        # 重命名列
+        df_mapped = df.rename(columns=column_mapping)
+        
+        # 数据清洗
+        df_mapped = self._clean_data(df_mapped)
+        columns = list(df_mapped.columns)
+        
+        if 'name' not in columns:
+            return (pd.DataFrame(columns=self.STUDENT_FIELDS),
+                    pd.DataFrame(columns=self.GRADE_FIELDS))
+        
+        # 跳过姓名为空的行
+        valid = df_mapped.iloc[:, columns.index('name')].notna().to_numpy()
+        df_valid = df_mapped.iloc[valid]
+        row_count = len(df_valid)
+        
+        # 学生信息
+        names = self._str_column(df_valid, 'name', '')
+        schools = self._str_column(df_valid, 'school', '未知学校')
+        classes = self._str_column(df_valid, 'current_class', '')
+        grade_levels = self._str_column(df_valid, 'grade_level', None, null_value=None)
+        students_frame = pd.DataFrame({
+            'name': names,
+            'school': schools,
+            'current_class': classes,
+            'grade_level': grade_levels,
+            'subject_combination': pd.Series([subject_combination] * row_count, dtype=object)
+        })
+        student_keys = (schools + '_' + classes + '_' + names).to_numpy(dtype=object)
+        
+        # 成绩列: (列位置, 科目英文名, 科目中文名, 成绩类型)
+        score_columns = []
+        for position, col in enumerate(columns):
+            parsed = self._parse_score_field(col)
+            if parsed:
+                score_columns.append((position, *parsed))
+        
+        # 分数矩阵和按科目前缀对齐的排名矩阵（行=学生，列=成绩列）
+        shape = (row_count, len(score_columns))
+        present = np.zeros(shape, dtype=bool)
+        scores = np.full(shape, np.nan)
+        ranks = {field: np.full(shape, np.nan) for field in self.RANK_FIELDS}
+        rank_cache = {}
+        for j, (position, subject_name, _, _) in enumerate(score_columns):
+            column = df_valid.iloc[:, position]
+            present[:, j] = column.notna().to_numpy()
+            scores[:, j] = self._to_float_array(column)
+            for field in self.RANK_FIELDS:
+                rank_col = f"{subject_name}_{field}"
+                if rank_col not in columns:
+                    continue
+                if rank_col not in rank_cache:
+                    rank_cache[rank_col] = self._to_rank_array(df_valid.iloc[:, columns.index(rank_col)])
+                ranks[field][:, j] = rank_cache[rank_col]
+        
+        # 展开为长表，行优先顺序与逐行逐列处理一致
+        rows, cols = np.nonzero(present)
+        subject_names = np.array([c[2] for c in score_columns], dtype=object)
+        score_types = np.array([c[3] for c in score_columns], dtype=object)
+        grades_frame = pd.DataFrame({
+            'student_key': pd.Series(student_keys[rows], dtype=object),
+            'subject_name': pd.Series(subject_names[cols], dtype=object),
+            'score_type': pd.Series(score_types[cols], dtype=object),
+            'score': scores[rows, cols],
+            **{field: pd.array(ranks[field][rows, cols], dtype='Int64') for field in self.RANK_FIELDS}
+        })
+        
+        return students_frame, grades_frame
+    
+    def get_template_subjects(self, column_mapping: Dict[str, str]) -> List[str]:
+        """返回列映射中出现的成绩科目（中文名）"""
+        subjects = []
+        for field in column_mapping.values():
+            parsed = self._parse_score_field(field)
+            if parsed and parsed[1] not in subjects:
+                subjects.append(parsed[1])
+        return subjects
+    
+    def _parse_score_field(self, col) -> Optional[Tuple[str, str, str]]:
+        """
+        解析映射后的成绩字段名
+        返回: (科目英文名, 科目中文名, 成绩类型)，非成绩字段返回None
+        """
+        # 只处理真正的成绩字段，排除排名字段
+        if not isinstance(col, str) or not col.endswith('_score'):
+            return None
+        if any(rank_word in col for rank_word in ['rank_', '_rank']):
+            return None
+        
+        # 解析科目和成绩类型
+        if col.endswith('_original_score'):
+            subject_name = col.replace('_original_score', '')
+            score_type = 'original'
+        elif col.endswith('_scaled_score'):
+            subject_name = col.replace('_scaled_score', '')
+            score_type = 'scaled'
+        else:
+            subject_name = col.replace('_score', '')
+            score_type = 'original'  # 默认为原始成绩
+        
+        # 转换科目名称，跳过无效的科目名称
+        subject_chinese = self._get_chinese_subject_name(subject_name)
+        if subject_chinese == subject_name and subject_name not in self.SUBJECT_KEYS:
+            return None
+        
+        return subject_name, subject_chinese, score_type
+    
+    def _str_column(self, df: pd.DataFrame, field: str, default: Optional[str],
+                    null_value: Optional[str] = '') -> pd.Series:
+        """整列安全字符串转换；列不存在时取默认值，空值取null_value"""
+        if field not in df.columns:
+            return pd.Series([default] * len(df), dtype=object)
+        
+        column = df.iloc[:, list(df.columns).index(field)]
+        text = column.astype(str).str.strip().astype(object)
+        return text.where(column.notna().to_numpy(), null_value).reset_index(drop=True)
+    
+    def _to_float_array(self, column: pd.Series) -> np.ndarray:
+        """整列安全浮点转换，无法转换的值为NaN，规则与_safe_float_convert一致"""
+        return self._parse_float_array(column)[0]
+    
+    def _parse_float_array(self, column: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        整列浮点转换，返回(数值, 是否为空)：空值和空值文本为空，其他无法转换的值为NaN但不为空
+        """
+        if pd.api.types.is_integer_dtype(column) or pd.api.types.is_float_dtype(column):
+            values = column.to_numpy(dtype=float, na_value=np.nan, copy=True)
+            return values, np.isnan(values)
+        
+        objects = column.to_numpy(dtype=object)
+        notna = column.notna().to_numpy()
+        blank = ~notna | column.isin(self.NULL_TOKENS).to_numpy()
+        values = np.full(len(objects), np.nan)
+        
+        # 通常只有数字和空值文本，非空值整体按float()转换一次
+        try:
+            values[~blank] = objects[~blank].astype(float)
+        except (ValueError, TypeError):
+            # 含有无法直接转换的值时，先快速解析，失败的非空值去空格后逐个回退到float()
+            values = pd.to_numeric(column, errors='coerce').to_numpy(dtype=float, na_value=np.nan, copy=True)
+            failed = np.flatnonzero(np.isnan(values) & notna)
+            if len(failed):
+                text = column.iloc[failed].astype(str).str.strip()
+                null_token = text.isin(self.NULL_TOKENS).to_numpy()
+                blank[failed[null_token]] = True
+                for i, value in zip(failed[~null_token], text[~null_token]):
+                    value = self._safe_float_convert(value)
+                    values[i] = np.nan if value is None else value
+        
+        # 布尔值会被转换为0或1，而float(str(x))无法转换
+        maybe_bool = np.flatnonzero((values == 0) | (values == 1)) if column.dtype == object else []
+        if len(maybe_bool):
+            is_bool = np.fromiter((isinstance(v, (bool, np.bool_)) for v in objects[maybe_bool]),
+                                  dtype=bool, count=len(maybe_bool))
+            values[maybe_bool[is_bool]] = np.nan
+        return values, blank
+    
+    def _to_rank_array(self, column: pd.Series) -> np.ndarray:
+        """整列排名转换，取整规则与int(float(x))一致，无效值为NaN"""
+        values = self._to_float_array(column)
+        return np.where(np.isfinite(values), np.trunc(values), np.nan)
+    
+    def _frame_to_records(self, frame: pd.DataFrame) -> List[Dict]:
+        """把列式结果转换为字典列表，缺失值统一为None"""
+        fields = list(frame.columns)
+        values = [
+            frame[field].astype(object).where(frame[field].notna(), None).tolist()
+            for field in fields
+        ]
+        return [dict(zip(fields, row)) for row in zip(*values)]
+    
     def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """数据清洗"""
         # 创建副本避免修改原始数据
@@ -278,8 +385,11 @@ class TemplateService:
         try:
             for col in df.columns:
                 if col in df.columns and hasattr(df[col], 'dtype') and df[col].dtype == 'object':
-                    # 正确地将每个值转换为字符串并去除空格
-                    df[col] = df[col].apply(lambda x: str(x).strip() if pd.notna(x) else x)
+                    # 整列将非空值转换为字符串并去除空格，结果与逐个str(x).strip()一致
+                    column = df[col].copy()
+                    mask = column.notna()
+                    column[mask] = column[mask].astype(str).str.strip()
+                    df[col] = column
         except Exception as e:
             print(f"Warning: Data cleaning failed: {e}")
             # 如果清洗失败，直接返回原数据
@@ -308,25 +418,12 @@ class TemplateService:
         
         try:
             str_value = str(value).strip()
-            if str_value in ['-', '', 'nan', 'NaN']:
+            if str_value in self.NULL_TOKENS:
                 return None
             return float(str_value)
         except (ValueError, TypeError):
             return None
     
-    def _get_rank_value(self, row: pd.Series, rank_field: str) -> Optional[int]:
-        """获取排名值"""
-        if rank_field not in row or pd.isna(row[rank_field]):
-            return None
-        
-        try:
-            rank_str = str(row[rank_field]).strip()
-            if rank_str in ['-', '', 'nan', 'NaN']:
-                return None
-            return int(float(rank_str))
-        except (ValueError, TypeError):
-            return None
-    
     def _get_chinese_subject_name(self, english_name: str) -> str:
         """将英文科目名转换为中文"""
         name_map = {
@@ -408,4 +505,81 @@ class TemplateService:
             ['李四', '示例学校', '高三2班', '高三'] + [0] * (len(columns) - 4)
         ]
         
-        return pd.DataFrame(sample_data, columns=columns)
\ No newline at end of file
+        return pd.DataFrame(sample_data, columns=columns)
+
+class ValidationReport:
+    """
+    整份文件的校验结果：逐块累积单元格错误，并在整个文件范围内检查重复学生
+    只保留前max_errors个错误，各类错误的数量完整统计
+    """
+    
+    COLUMNS = ['row', 'column', 'value', 'error']
+    
+    def __init__(self, column_mapping: Dict[str, str], max_errors: int = 1000,
+                 template_service: Optional[TemplateService] = None):
+        self.column_mapping = column_mapping
+        self.max_errors = max_errors
+        self.template_service = template_service or TemplateService()
+        self.name_column = next((k for k, v in column_mapping.items() if v == 'name'), None)
+        self.total_rows = 0
+        self.error_counts = {error: 0 for error in TemplateService.VALIDATION_ERRORS}
+        self._errors: List[pd.DataFrame] = []
+        self._kept = 0
+        # 已出现学生键的哈希值
+        self._seen_keys = np.empty(0, dtype=np.uint64)
+    
+    def add(self, df: pd.DataFrame) -> None:
+        """校验一个数据块，数据块的索引为数据行在全表中的序号"""
+        self.total_rows += len(df)
+        errors = self.template_service.validate_frame(df, self.column_mapping)
+        duplicates = self._duplicate_errors(df)
+        if len(duplicates):
+            errors = pd.concat([errors, duplicates], ignore_index=True) \
+                .sort_values('row', kind='stable', ignore_index=True)
+        
+        for error, count in errors['error'].value_counts().items():
+            self.error_counts[error] += int(count)
+        if self._kept < self.max_errors and len(errors):
+            kept = errors.iloc[:self.max_errors - self._kept]
+            self._errors.append(kept)
+            self._kept += len(kept)
+    
+    def _duplicate_errors(self, df: pd.DataFrame) -> pd.DataFrame:
+        """学生键与本块前面的行或之前的块重复的行，错误值为学生键"""
+        keys = self.template_service.student_keys(df, self.column_mapping)
+        if keys.empty:
+            return pd.DataFrame(columns=self.COLUMNS)
+        
+        hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+        duplicated = pd.Series(hashes).duplicated().to_numpy() | np.isin(hashes, self._seen_keys)
+        self._seen_keys = np.concatenate([self._seen_keys, np.unique(hashes)])
+        
+        return pd.DataFrame({
+            'row': keys.index.to_numpy()[duplicated] + 1,
+            'column': self.name_column,
+            'value': keys.to_numpy()[duplicated],
+            'error': 'duplicate_student'
+        })
+    
+    @property
+    def total_errors(self) -> int:
+        return sum(self.error_counts.values())
+    
+    def errors(self) -> pd.DataFrame:
+        """保留的错误表"""
+        if not self._errors:
+            return pd.DataFrame(columns=self.COLUMNS)
+        return pd.concat(self._errors, ignore_index=True)
+    
+    def summary(self) -> Dict[str, Any]:
+        """可序列化的校验结果，错误表转换为字典列表，单元格值转换为文本"""
+        errors = self.errors()
+        errors['value'] = [None if pd.isna(value) else str(value) for value in errors['value']]
+        return {
+            "total_rows": self.total_rows,
+            "valid": self.total_errors == 0,
+            "total_errors": self.total_errors,
+            "error_counts": {error: count for error, count in self.error_counts.items() if count},
+            "errors": errors.astype(object).to_dict('records'),
+            "truncated": self.total_errors > len(errors)
+        }
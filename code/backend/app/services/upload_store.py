@@ -0,0 +1,132 @@
+"""
+上传文件缓存
+按文件内容哈希保存上传文件及其解析结果，预览返回的上传令牌可以直接用于导入，
+避免同一个文件重复上传和重复解析
+"""
+import hashlib
+import os
+import tempfile
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from .excel_service import ExcelService
+
+class UploadEntry:
+    """缓存中的一个上传文件"""
+    
+    def __init__(self, token: str, file_path: str, filename: str):
+        self.token = token
+        self.file_path = file_path
+        self.filename = filename
+        # 完整预览时解析得到的数据，溢写到磁盘
+        self.frame_path: Optional[str] = None
+        # 按预览方式缓存的预览结果
+        self.previews: Dict[str, Dict[str, Any]] = {}
+        self.refs = 0
+        self.last_access = time.monotonic()
+
+class UploadStore:
+    """按内容哈希索引的上传文件缓存，按LRU和过期时间淘汰"""
+    
+    def __init__(self, directory: str, max_entries: int = 16, ttl: float = 1800):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, UploadEntry]" = OrderedDict()
+        self._excel_service = ExcelService()
+    
+    async def save(self, upload) -> UploadEntry:
+        """保存上传文件，内容相同的文件复用已有缓存"""
+        os.makedirs(self.directory, exist_ok=True)
+        hasher = hashlib.sha256()
+        tmp_file_path = await self._excel_service.save_upload(upload, self.directory, hasher)
+        token = hasher.hexdigest()
+        
+        entry = self._entries.get(token)
+        if entry is not None and os.path.exists(entry.file_path):
+            os.unlink(tmp_file_path)
+            self._touch(entry)
+            return entry
+        
+        suffix = os.path.splitext(tmp_file_path)[1]
+        file_path = os.path.join(self.directory, f"{token}{suffix}")
+        os.replace(tmp_file_path, file_path)
+        
+        entry = UploadEntry(token, file_path, upload.filename or '')
+        self._entries[token] = entry
+        self._evict()
+        return entry
+    
+    def get(self, token: str) -> Optional[UploadEntry]:
+        """按上传令牌获取缓存，过期或已淘汰时返回None"""
+        self._evict()
+        entry = self._entries.get(token)
+        if entry is not None:
+            self._touch(entry)
+        return entry
+    
+    def attach(self, entry: UploadEntry, preview_key: str, preview: Dict[str, Any],
+               frame_path: Optional[str] = None) -> None:
+        """记录预览结果，完整预览时同时记录溢写的解析数据"""
+        if self._entries.get(entry.token) is not entry:
+            # 解析期间缓存已被淘汰，解析结果不再保留
+            self._remove_file(frame_path)
+            return
+        if frame_path:
+            if entry.frame_path and entry.frame_path != frame_path:
+                self._remove_file(entry.frame_path)
+            entry.frame_path = frame_path
+        entry.previews[preview_key] = preview
+    
+    def acquire(self, entry: UploadEntry) -> None:
+        """使用期间不会被淘汰"""
+        entry.refs += 1
+    
+    def release(self, entry: UploadEntry) -> None:
+        entry.refs -= 1
+        self._evict()
+    
+    @contextmanager
+    def pinned(self, entry: UploadEntry) -> Iterator[UploadEntry]:
+        self.acquire(entry)
+        try:
+            yield entry
+        finally:
+            self.release(entry)
+    
+    def clear(self) -> None:
+        for entry in self._entries.values():
+            self._delete_entry_files(entry)
+        self._entries.clear()
+    
+    def _touch(self, entry: UploadEntry) -> None:
+        entry.last_access = time.monotonic()
+        self._entries.move_to_end(entry.token)
+    
+    def _evict(self) -> None:
+        now = time.monotonic()
+        # 从最久未使用的开始淘汰，正在使用的缓存跳过
+        for token, entry in list(self._entries.items()):
+            if entry.refs > 0:
+                continue
+            expired = self.ttl and now - entry.last_access > self.ttl
+            if expired or len(self._entries) > self.max_entries:
+                del self._entries[token]
+                self._delete_entry_files(entry)
+    
+    def _delete_entry_files(self, entry: UploadEntry) -> None:
+        self._remove_file(entry.file_path)
+        if entry.frame_path:
+            self._remove_file(entry.frame_path)
+    
+    def _remove_file(self, path: str) -> None:
+        if path and os.path.exists(path):
+            os.unlink(path)
+
+upload_store = UploadStore(
+    directory=os.getenv("UPLOAD_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "grade_uploads"),
+    max_entries=int(os.getenv("UPLOAD_CACHE_SIZE", "16")),
+    ttl=float(os.getenv("UPLOAD_CACHE_TTL", "1800"))
+)
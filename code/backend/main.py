@@ -1,8 +1,12 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.database import create_tables
+from app.database import run_migrations
 from app.api import api_router
+from app.services.subject_registry import subject_registry
+from app.services.job_service import import_job_manager
+from app.services.process_pool import process_pool
+from app.services.upload_store import upload_store
 
 app = FastAPI(title="GradeInsights API", version="2.0.0")
 
@@ -20,7 +24,15 @@ app.include_router(api_router, prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
-    await create_tables()
+    await run_migrations()
+    await subject_registry.load()
+    process_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await import_job_manager.shutdown()
+    process_pool.shutdown()
+    upload_store.clear()
 
 @app.get("/")
 async def root():
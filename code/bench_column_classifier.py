@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+列名分类器基准测试
+读取 data/ 下样例文件的表头，比较逐列分类与按表头缓存的耗时
+"""
+import glob
+import sys
+import os
+import time
+
+# 添加backend目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services.column_classifier import template_classifier, suggestion_classifier
+from app.services.excel_service import ExcelService
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+ROUNDS = 2000
+
+def load_headers():
+    """读取样例文件的表头"""
+    excel_service = ExcelService()
+    headers = []
+    for file_path in sorted(glob.glob(os.path.join(DATA_DIR, '*.xls*'))):
+        df, _, _ = excel_service.read_excel_sample(file_path, 1)
+        headers.append((os.path.basename(file_path), tuple(df.columns)))
+    return headers
+
+def bench(label, func, headers):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        for _, columns in headers:
+            func(columns)
+    elapsed = time.perf_counter() - start
+    per_call = elapsed / (ROUNDS * len(headers)) * 1e6
+    print(f"{label:<12} 总耗时 {elapsed:.3f}s  每个表头 {per_call:.1f}us")
+
+def main():
+    headers = load_headers()
+    if not headers:
+        print(f"未在 {DATA_DIR} 找到样例文件")
+        return
+    for name, columns in headers:
+        print(f"{name}: {len(columns)} 列")
+
+    for classifier_name, classifier, mapping in [
+        ('标准模板', template_classifier, template_classifier.template_mapping),
+        ('映射建议', suggestion_classifier, suggestion_classifier.suggested_mappings),
+    ]:
+        print(f"\n[{classifier_name}]")
+        # 逐列分类，不使用缓存
+        bench('逐列分类', lambda columns: [classifier.classify_column(col) for col in columns], headers)
+        # 按表头缓存，首次调用后直接命中
+        bench('表头缓存', mapping, headers)
+        print(mapping.cache_info())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+成绩表索引基准测试
+在临时SQLite数据库中生成约100万行成绩，比较建立索引前后成绩报告、成绩历史、科目排名三类查询的执行计划和耗时
+建立索引前的成绩表与迁移3之前的结构相同（没有唯一约束和复合索引），之后执行迁移3建立索引
+"""
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+# 添加backend目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from sqlalchemy import MetaData, Table, create_engine
+
+from app.database.models import Base, Grade
+from app.database.migrations import _grade_indexes
+
+EXAMS = 40
+STUDENTS = 3600
+SUBJECTS = ['语文', '数学', '英语', '物理', '化学', '生物', '总分']
+ROUNDS = 20
+
+# 与GradeService中的查询条件相同
+QUERIES = {
+    '成绩报告': ("""
+        SELECT st.name, sub.name, g.original_score, g.rank_school
+        FROM grades g
+        JOIN students st ON g.student_id = st.id
+        JOIN subjects sub ON g.subject_id = sub.id
+        WHERE g.exam_id = :exam_id
+    """, lambda: {"exam_id": random.randint(1, EXAMS)}),
+    '成绩历史': ("""
+        SELECT e.exam_name, sub.name, g.original_score, g.rank_province
+        FROM grades g
+        JOIN exams e ON g.exam_id = e.id
+        JOIN subjects sub ON g.subject_id = sub.id
+        WHERE g.student_id = :student_id
+    """, lambda: {"student_id": random.randint(1, STUDENTS)}),
+    '科目排名': ("""
+        SELECT st.name, g.original_score, g.rank_province
+        FROM grades g
+        JOIN students st ON g.student_id = st.id
+        JOIN subjects sub ON g.subject_id = sub.id
+        WHERE sub.name = :subject_name AND g.exam_id = :exam_id
+        ORDER BY g.rank_province
+        LIMIT 50
+    """, lambda: {"subject_name": random.choice(SUBJECTS), "exam_id": random.randint(1, EXAMS)}),
+}
+
+def create_schema(db_path):
+    """建立业务表，成绩表只保留列定义"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    legacy_grades = Table("grades", MetaData(), *[column._copy() for column in Grade.__table__.columns])
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn, tables=[t for t in Base.metadata.sorted_tables if t.name != "grades"])
+        conn.exec_driver_sql("DROP INDEX ix_students_school_name_class")
+        legacy_grades.create(conn)
+    return engine
+
+def populate(db_path):
+    con = sqlite3.connect(db_path)
+    con.executemany("INSERT INTO exams (id, exam_name, exam_date, exam_type, exam_level) VALUES (?, ?, ?, 'PHYSICS', 'CITY')",
+                    [(i, f"考试{i}", f"2024-01-{i % 28 + 1:02d}") for i in range(1, EXAMS + 1)])
+    con.executemany("INSERT INTO subjects (id, name) VALUES (?, ?)", list(enumerate(SUBJECTS, 1)))
+    con.executemany("INSERT INTO students (id, name, school, current_class) VALUES (?, ?, ?, ?)",
+                    [(i, f"学生{i}", f"学校{i % 12}", str(i % 30)) for i in range(1, STUDENTS + 1)])
+    # 按考试顺序写入，与实际导入的行顺序一致；成绩表主键为BIGINT，SQLite中需要显式给出
+    keys = (
+        (exam_id, student_id, subject_id)
+        for exam_id in range(1, EXAMS + 1)
+        for student_id in range(1, STUDENTS + 1)
+        for subject_id in range(1, len(SUBJECTS) + 1)
+    )
+    rows = ((grade_id, *key, random.randint(0, 150), random.randint(1, STUDENTS))
+            for grade_id, key in enumerate(keys, 1))
+    con.executemany("INSERT INTO grades (id, exam_id, student_id, subject_id, original_score, rank_province) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    con.commit()
+    count = con.execute("SELECT COUNT(*) FROM grades").fetchone()[0]
+    con.close()
+    return count
+
+def bench(db_path):
+    con = sqlite3.connect(db_path)
+    for label, (sql, make_params) in QUERIES.items():
+        plan = con.execute("EXPLAIN QUERY PLAN " + sql, make_params()).fetchall()
+        random.seed(0)
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            con.execute(sql, make_params()).fetchall()
+        per_query = (time.perf_counter() - start) / ROUNDS * 1000
+        print(f"{label:<6} 每次查询 {per_query:8.2f}ms")
+        for row in plan:
+            print(f"    {row[-1]}")
+    con.close()
+
+def main():
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as work_dir:
+        db_path = os.path.join(work_dir, 'bench.db')
+        engine = create_schema(db_path)
+        start = time.perf_counter()
+        count = populate(db_path)
+        print(f"生成 {count} 行成绩，耗时 {time.perf_counter() - start:.1f}s")
+
+        print("\n[建立索引前]")
+        bench(db_path)
+
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            _grade_indexes(conn)
+        print(f"\n执行迁移3建立索引，耗时 {time.perf_counter() - start:.1f}s")
+
+        print("\n[建立索引后]")
+        bench(db_path)
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+导入失败回滚检查
+在临时SQLite数据库中按列映射导入一场考试，再让重新导入在中途的数据块出错，
+检查已有成绩和考试的来源文件保持不变；新导入中途出错时不留下考试、学生和成绩
+"""
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+# 临时数据库需在导入app之前设置
+_db_dir = tempfile.mkdtemp(prefix='import_rollback_')
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(_db_dir, 'check.db')}"
+
+# 添加backend目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+import pandas as pd
+from sqlalchemy import Integer, func, select
+
+from app.database.models import AsyncSessionLocal, Base, Exam, ExamLevel, ExamType, Grade, Student, engine
+from app.schemas.exam import ColumnMapping
+from app.services.grade_service import GradeService
+
+STUDENTS = 1200
+CHUNK_ROWS = 200
+FAIL_AT_CHUNK = 3
+SUBJECTS = ['语文', '数学', '英语', '物理']
+
+COLUMN_MAPPINGS = [
+    ColumnMapping(excel_column='姓名', system_field='name'),
+    ColumnMapping(excel_column='学校', system_field='school'),
+    ColumnMapping(excel_column='班级', system_field='current_class'),
+    *(ColumnMapping(excel_column=subject, system_field=f'{subject}_score') for subject in SUBJECTS),
+]
+
+class InjectedFailure(RuntimeError):
+    pass
+
+def make_frame(seed: int) -> pd.DataFrame:
+    rng = random.Random(seed)
+    return pd.DataFrame({
+        '姓名': [f'学生{i}' for i in range(STUDENTS)],
+        '学校': [f'学校{i % 4}' for i in range(STUDENTS)],
+        '班级': [str(i % 20 + 1) for i in range(STUDENTS)],
+        **{subject: [rng.randint(0, 150) for _ in range(STUDENTS)] for subject in SUBJECTS},
+    })
+
+def chunks(df: pd.DataFrame, fail_at: int = None):
+    """与流式读取相同的数据块，fail_at指定的数据块读取时出错"""
+    for index, start in enumerate(range(0, len(df), CHUNK_ROWS), 1):
+        if index == fail_at:
+            raise InjectedFailure(f'第{index}块读取失败')
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+async def create_schema():
+    # 成绩表主键为BIGINT，SQLite只对INTEGER主键自动编号
+    Grade.__table__.c.id.type = Integer()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+async def snapshot(db):
+    result = await db.execute(
+        select(Grade.id, Grade.exam_id, Grade.student_id, Grade.subject_id, Grade.original_score,
+               Grade.scaled_score, Grade.rank_school, Grade.rank_city, Grade.rank_province)
+        .order_by(Grade.id)
+    )
+    grades = result.all()
+    exams = (await db.execute(select(Exam.id, Exam.raw_file_path, Exam.content_hash).order_by(Exam.id))).all()
+    return grades, exams
+
+async def count(db, model) -> int:
+    return (await db.execute(select(func.count()).select_from(model))).scalar_one()
+
+async def expect_failure(coroutine) -> None:
+    try:
+        await coroutine
+    except InjectedFailure as e:
+        print(f"  预期的失败: {e}")
+    else:
+        raise AssertionError("注入的错误没有抛出")
+
+async def main():
+    await create_schema()
+    exam_date = datetime(2024, 3, 1)
+
+    print("新导入中途出错")
+    async with AsyncSessionLocal() as db:
+        await expect_failure(GradeService(db).import_grades(
+            '回滚检查', exam_date, ExamType.PHYSICS, ExamLevel.CITY,
+            chunks(make_frame(1), FAIL_AT_CHUNK), COLUMN_MAPPINGS, 'first.xlsx', content_hash='first'
+        ))
+    async with AsyncSessionLocal() as db:
+        counts = [await count(db, model) for model in (Exam, Student, Grade)]
+    print(f"  考试、学生、成绩: {counts}")
+    assert counts == [0, 0, 0], "导入失败后残留了数据"
+
+    print("正常导入")
+    async with AsyncSessionLocal() as db:
+        result = await GradeService(db).import_grades(
+            '回滚检查', exam_date, ExamType.PHYSICS, ExamLevel.CITY,
+            chunks(make_frame(1)), COLUMN_MAPPINGS, 'first.xlsx', content_hash='first'
+        )
+        before = await snapshot(db)
+    print(f"  考试 {result['exam_id']}  成绩 {len(before[0])}")
+
+    print("重新导入中途出错")
+    async with AsyncSessionLocal() as db:
+        grade_service = GradeService(db)
+        exam = await grade_service.find_reimport_target('回滚检查', exam_date)
+        await expect_failure(grade_service.reimport_grades(
+            exam, exam_date, ExamType.PHYSICS, ExamLevel.CITY,
+            chunks(make_frame(2), FAIL_AT_CHUNK), COLUMN_MAPPINGS, 'second.xlsx', 'second'
+        ))
+    async with AsyncSessionLocal() as db:
+        after = await snapshot(db)
+    print(f"  成绩不变: {after[0] == before[0]}  考试来源不变: {after[1] == before[1]}")
+    assert after == before, "重新导入失败后已有成绩或考试被修改"
+
+    print("重新导入")
+    async with AsyncSessionLocal() as db:
+        grade_service = GradeService(db)
+        exam = await grade_service.find_reimport_target('回滚检查', exam_date)
+        counts = await grade_service.reimport_grades(
+            exam, exam_date, ExamType.PHYSICS, ExamLevel.CITY,
+            chunks(make_frame(2)), COLUMN_MAPPINGS, 'second.xlsx', 'second'
+        )
+        after = await snapshot(db)
+    print(f"  {counts}")
+    assert after != before and after[1][0][1:] == ('second.xlsx', 'second'), "重新导入没有写入"
+
+    await engine.dispose()
+    print("全部通过")
+    return 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main()))
+    finally:
+        shutil.rmtree(_db_dir, ignore_errors=True)
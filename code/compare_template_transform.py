@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+标准模板宽表转长表的一致性检查
+用 data/ 下的样例文件比较列式实现 TemplateService.process_template_data 与原来逐行逐列的实现，输出必须完全相同
+每个文件分别使用自动识别的列映射和去重后的列映射（同一字段只保留第一列）
+"""
+import glob
+import os
+import sys
+import time
+from typing import Dict, Optional
+
+import pandas as pd
+
+# 添加backend目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+
+from app.services.excel_service import ExcelService
+from app.services.template_service import TemplateService
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+class LegacyTemplateTransform:
+    """
+    原来逐行逐列的process_template_data及其用到的辅助方法，从基线版本原样复制，
+    不调用现在的TemplateService，对照结果不受后续修改影响
+    """
+    
+    def process_template_data(self, df: pd.DataFrame, column_mapping: Dict[str, str], 
+                             subject_combination: Optional[str] = None) -> Dict:
+        """
+        处理模板数据，转换为标准格式
+        """
+        # 重命名列
+        df_mapped = df.rename(columns=column_mapping)
+        
+        # 数据清洗
+        df_mapped = self._clean_data(df_mapped)
+        
+        # 分离学生信息和成绩信息
+        student_fields = ['name', 'school', 'current_class', 'grade_level']
+        students_data = []
+        grades_data = []
+        
+        for _, row in df_mapped.iterrows():
+            if pd.isna(row.get('name')):
+                continue
+                
+            # 学生信息
+            student_info = {
+                'name': self._safe_str_convert(row.get('name', '')),
+                'school': self._safe_str_convert(row.get('school', '未知学校')),
+                'current_class': self._safe_str_convert(row.get('current_class', '')),
+                'grade_level': self._safe_str_convert(row.get('grade_level', '')) if pd.notna(row.get('grade_level')) else None,
+                'subject_combination': subject_combination  # 添加选科组合
+            }
+            students_data.append(student_info)
+            
+            # 成绩信息
+            student_grades = []
+            for col, value in row.items():
+                # 只处理真正的成绩字段，排除排名字段
+                if (col.endswith('_score') or col.endswith('_original_score') or col.endswith('_scaled_score')) and pd.notna(value):
+                    # 确保不是排名字段
+                    if any(rank_word in col for rank_word in ['rank_', '_rank']):
+                        continue
+                        
+                    # 解析科目和成绩类型
+                    if col.endswith('_original_score'):
+                        subject_name = col.replace('_original_score', '')
+                        score_type = 'original'
+                    elif col.endswith('_scaled_score'):
+                        subject_name = col.replace('_scaled_score', '')
+                        score_type = 'scaled'
+                    elif col.endswith('_score'):
+                        subject_name = col.replace('_score', '')
+                        score_type = 'original'  # 默认为原始成绩
+                    else:
+                        continue
+                    
+                    # 转换科目名称
+                    subject_chinese = self._get_chinese_subject_name(subject_name)
+                    
+                    # 跳过无效的科目名称
+                    if subject_chinese == subject_name and subject_name not in ['chinese', 'math', 'english', 'physics', 'chemistry', 'biology', 'history', 'geography', 'politics', 'total_score']:
+                        continue
+                    
+                    grade_info = {
+                        'student_key': f"{student_info['school']}_{student_info['current_class']}_{student_info['name']}",
+                        'subject_name': subject_chinese,
+                        'score_type': score_type,
+                        'score': self._safe_float_convert(value),
+                        # 原始排名
+                        'rank_school': self._get_rank_value(row, f"{subject_name}_rank_school"),
+                        'rank_city': self._get_rank_value(row, f"{subject_name}_rank_city"),
+                        'rank_province': self._get_rank_value(row, f"{subject_name}_rank_province"),
+                        # 赋分排名
+                        'scaled_rank_school': self._get_rank_value(row, f"{subject_name}_scaled_rank_school"),
+                        'scaled_rank_city': self._get_rank_value(row, f"{subject_name}_scaled_rank_city"),
+                        'scaled_rank_province': self._get_rank_value(row, f"{subject_name}_scaled_rank_province")
+                    }
+                    student_grades.append(grade_info)
+            
+            grades_data.extend(student_grades)
+        
+        return {
+            'students': students_data,
+            'grades': grades_data,
+            'total_students': len(students_data),
+            'total_grades': len(grades_data)
+        }
+    
+    def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
+        """数据清洗"""
+        # 创建副本避免修改原始数据
+        df = df.copy()
+        
+        # 去除空行
+        df = df.dropna(how='all')
+        
+        # 简化数据清洗，只处理字符串列
+        try:
+            for col in df.columns:
+                if col in df.columns and hasattr(df[col], 'dtype') and df[col].dtype == 'object':
+                    # 正确地将每个值转换为字符串并去除空格
+                    df[col] = df[col].apply(lambda x: str(x).strip() if pd.notna(x) else x)
+        except Exception as e:
+            print(f"Warning: Data cleaning failed: {e}")
+            # 如果清洗失败，直接返回原数据
+            pass
+        
+        return df
+    
+    def _safe_str_convert(self, value) -> str:
+        """安全的字符串转换"""
+        if pd.isna(value):
+            return ''
+        
+        # 如果是pandas Series，取第一个值
+        if hasattr(value, 'iloc'):
+            value = value.iloc[0] if len(value) > 0 else ''
+        
+        try:
+            return str(value).strip()
+        except (ValueError, TypeError):
+            return ''
+    
+    def _safe_float_convert(self, value) -> Optional[float]:
+        """安全的浮点数转换"""
+        if pd.isna(value):
+            return None
+        
+        try:
+            str_value = str(value).strip()
+            if str_value in ['-', '', 'nan', 'NaN']:
+                return None
+            return float(str_value)
+        except (ValueError, TypeError):
+            return None
+    
+    def _get_rank_value(self, row: pd.Series, rank_field: str) -> Optional[int]:
+        """获取排名值"""
+        if rank_field not in row or pd.isna(row[rank_field]):
+            return None
+        
+        try:
+            rank_str = str(row[rank_field]).strip()
+            if rank_str in ['-', '', 'nan', 'NaN']:
+                return None
+            return int(float(rank_str))
+        except (ValueError, TypeError):
+            return None
+    
+    def _get_chinese_subject_name(self, english_name: str) -> str:
+        """将英文科目名转换为中文"""
+        name_map = {
+            'chinese': '语文',
+            'math': '数学',
+            'english': '英语',
+            'physics': '物理',
+            'chemistry': '化学',
+            'biology': '生物',
+            'history': '历史',
+            'geography': '地理',
+            'politics': '政治',
+            'total_score': '总分'
+        }
+        return name_map.get(english_name, english_name)
+
+def first_column_mapping(column_mapping: Dict[str, str]) -> Dict[str, str]:
+    """同一字段对应多列时只保留第一列"""
+    mapping = {}
+    for column, field in column_mapping.items():
+        if field not in mapping.values():
+            mapping[column] = field
+    return mapping
+
+def compare(service: TemplateService, label: str, df: pd.DataFrame, column_mapping: Dict[str, str]) -> bool:
+    try:
+        start = time.perf_counter()
+        expected = LegacyTemplateTransform().process_template_data(df, column_mapping, '物化生')
+        legacy_time = time.perf_counter() - start
+    except ValueError as e:
+        # 原实现遇到重复列时取到的是Series，无法转换
+        print(f"  {label:<8} 原实现无法处理，跳过: {e}")
+        return True
+
+    start = time.perf_counter()
+    actual = service.process_template_data(df, column_mapping, '物化生')
+    new_time = time.perf_counter() - start
+
+    same = actual == expected
+    print(f"  {label:<8} {'一致' if same else '不一致'}  学生 {actual['total_students']}  成绩 {actual['total_grades']}  "
+          f"原实现 {legacy_time:.3f}s  列式实现 {new_time:.3f}s")
+    if not same:
+        for kind in ('students', 'grades'):
+            for index, (new_row, old_row) in enumerate(zip(actual[kind], expected[kind])):
+                if new_row != old_row:
+                    print(f"    {kind}[{index}]: {new_row} != {old_row}")
+                    break
+    return same
+
+def main():
+    service = TemplateService()
+    excel_service = ExcelService()
+    file_paths = sorted(glob.glob(os.path.join(DATA_DIR, '*.xls*')))
+    if not file_paths:
+        print(f"没有找到样例文件: {DATA_DIR}")
+        return 1
+
+    failures = 0
+    for file_path in file_paths:
+        print(os.path.basename(file_path))
+        # 与导入时相同的读取方式
+        df = pd.concat(list(excel_service.iter_excel_chunks(file_path)))
+        _, column_mapping = service.detect_template_type(df)
+        for label, mapping in (('识别映射', column_mapping), ('去重映射', first_column_mapping(column_mapping))):
+            if not compare(service, label, df, mapping):
+                failures += 1
+
+    assert failures == 0, f"{failures} 组输出不一致"
+    print("全部一致")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -127,6 +127,14 @@ const grades = {
       method: 'POST',
       body: JSON.stringify(gradeData)
     })
+  },
+
+  // 批量手工录入多名学生同一场考试的成绩
+  async manualImportBatch(examId, students) {
+    return request('/grades/manual-import-batch', {
+      method: 'POST',
+      body: JSON.stringify({ exam_id: examId, students })
+    })
   }
 }
 
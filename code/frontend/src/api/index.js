@@ -80,10 +80,14 @@ export default {
       })
     },
 
-    // 导入成绩数据
-    importGrades(file, importData) {
+    // 导入成绩数据，有预览返回的上传令牌时不再重复上传文件
+    importGrades(file, importData, uploadToken) {
       const formData = new FormData()
-      formData.append('file', file)
+      if (uploadToken) {
+        formData.append('upload_token', uploadToken)
+      } else {
+        formData.append('file', file)
+      }
       formData.append('import_data', JSON.stringify(importData))
       return api.post('/exams/import-grades', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
@@ -100,21 +104,69 @@ export default {
       return api.get(`/exams/${examId}/report`)
     },
 
+    // 获取考试各科目的统计（平均分、分位数、分段人数等），scope为exam/school/class
+    getExamStats(examId, params = {}) {
+      return api.get(`/exams/${examId}/stats`, { params })
+    },
+
+    // 获取考试某科目的成绩分布，params可指定subject、score_type、bins（分段边界）、bin_width、group_by
+    getScoreDistribution(examId, params = {}) {
+      return api.get(`/exams/${examId}/distribution`, { params })
+    },
+
+    // 获取考试成绩单（每名学生一行），服务端筛选、排序并按游标分页
+    getScoreSheet(examId, params = {}) {
+      return api.get(`/exams/${examId}/score-sheet`, { params })
+    },
+
+    // 与上一次（或指定的）考试对比，返回学生各科的分数和排名变化及班级平均变化
+    getExamComparison(examId, params = {}) {
+      return api.get(`/exams/${examId}/comparison`, { params })
+    },
+
     // 删除考试
     deleteExam(examId) {
       return api.delete(`/exams/${examId}`)
     },
 
-    // 标准模板导入
-    importStandardTemplate(file, importData) {
+    // 标准模板导入，有预览返回的上传令牌时不再重复上传文件
+    importStandardTemplate(file, importData, uploadToken) {
       const formData = new FormData()
-      formData.append('file', file)
+      if (uploadToken) {
+        formData.append('upload_token', uploadToken)
+      } else {
+        formData.append('file', file)
+      }
       formData.append('import_data', JSON.stringify(importData))
       return api.post('/exams/import-standard-template', formData, {
         headers: { 'Content-Type': 'multipart/form-data' }
       })
     },
 
+    // 试运行标准模板校验，返回逐单元格的错误表，不导入数据
+    validateStandardTemplate(file, uploadToken, maxErrors) {
+      const formData = new FormData()
+      if (uploadToken) {
+        formData.append('upload_token', uploadToken)
+      } else {
+        formData.append('file', file)
+      }
+      return api.post('/exams/validate-standard-template', formData, {
+        headers: { 'Content-Type': 'multipart/form-data' },
+        params: maxErrors ? { max_errors: maxErrors } : undefined
+      })
+    },
+
+    // 批量导入多工作表Excel或ZIP压缩包，每个工作表或文件为一场考试
+    importBatch(file, importData) {
+      const formData = new FormData()
+      formData.append('file', file)
+      formData.append('import_data', JSON.stringify(importData))
+      return api.post('/exams/import-batch', formData, {
+        headers: { 'Content-Type': 'multipart/form-data' }
+      })
+    },
+
     // 获取模板示例
     getTemplateExample(examType) {
       return api.get(`/exams/template-example/${examType}`)
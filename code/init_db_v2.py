@@ -9,13 +9,13 @@ import os
 # 添加backend目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
 
-from backend.app.database import create_tables
+from backend.app.database import run_migrations
 
 async def init_database():
-    """初始化数据库表"""
+    """初始化数据库表，执行尚未应用的迁移"""
     print("正在创建数据库表...")
-    await create_tables()
-    print("数据库表创建完成!")
+    applied = await run_migrations()
+    print(f"数据库表创建完成! 本次应用的迁移版本: {applied or '无'}")
 
 if __name__ == "__main__":
     asyncio.run(init_database())
\ No newline at end of file